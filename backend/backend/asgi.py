@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Load models only in server processes, not for every management command.
+from mlapi.warmup import preload_for_server  # noqa: E402
+
+preload_for_server()
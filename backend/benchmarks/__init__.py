@@ -0,0 +1,18 @@
+"""Benchmarks for the mlapi endpoints.
+
+* ``bench_micro.py`` - pytest-benchmark microbenchmarks of the in-process
+  hot paths (image decode/resize, fallback prediction, response formatting,
+  Google ID token verification)::
+
+	pip install -r benchmarks/requirements.txt
+	python -m pytest -c benchmarks/pytest.ini benchmarks
+
+* ``loadgen.py`` - end-to-end load test. Starts a stub for the Gemini and
+  Google OAuth APIs, generates a tiny Keras model, runs the app under uvicorn
+  against a scratch SQLite database and reports p50/p95/p99 latency, RPS and
+  server RSS per endpoint. Google sign-in verifies stub-signed ID tokens
+  locally unless ``--google-verification tokeninfo`` is given::
+
+	python -m benchmarks.loadgen --save benchmarks/baseline.json
+	python -m benchmarks.loadgen --compare benchmarks/baseline.json
+"""
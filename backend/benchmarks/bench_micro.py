@@ -0,0 +1,74 @@
+"""Microbenchmarks of the in-process predict and sign-in hot paths.
+
+Run with ``python -m pytest -c benchmarks/pytest.ini benchmarks``; add
+``--benchmark-save=<name>`` and later ``--benchmark-compare`` to track
+changes between commits.
+"""
+
+import io
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.make_model import make_images
+from benchmarks.stub_upstream import SigningKey
+from mlapi import google_tokens, predictions, views
+from mlapi.preprocessing import decode_image
+from mlapi.registry import ModelSpec
+
+
+FLOWER = ModelSpec(
+	"flower",
+	"flowers_mobilenet",
+	class_names=["Daisy", "Dandelion", "Roses", "Sunflowers", "Tulips"],
+)
+ANIMAL = ModelSpec("animal", "animal_mobilenet", class_names=[f"class {i}" for i in range(37)])
+
+
+@pytest.fixture(scope="module")
+def photo():
+	return make_images(count=1, size=(1024, 768))[0]
+
+
+@pytest.fixture(scope="module")
+def animal_result():
+	rng = np.random.default_rng(0)
+	scores = rng.random(37).astype(np.float32)
+	return predictions.prediction_payload(scores / scores.sum())
+
+
+def bench_decode_resize_224(benchmark, photo):
+	benchmark(lambda: decode_image(io.BytesIO(photo), (224, 224), FLOWER))
+
+
+def bench_decode_resize_into_buffer(benchmark, photo):
+	out = np.empty((224, 224, 3), dtype=np.float32)
+	benchmark(lambda: decode_image(io.BytesIO(photo), (224, 224), FLOWER, out=out))
+
+
+def bench_fallback_prediction(benchmark, photo):
+	benchmark(lambda: predictions.fallback_prediction(io.BytesIO(photo), ANIMAL.class_names))
+
+
+def bench_prediction_payload(benchmark):
+	preds = np.random.default_rng(0).random(37).astype(np.float32)
+	benchmark(lambda: predictions.prediction_payload(preds))
+
+
+@pytest.mark.parametrize("prediction_format,top_k", [("full", None), ("topk", 5), ("compact", None)])
+def bench_format_and_serialize(benchmark, animal_result, prediction_format, top_k):
+	benchmark(lambda: views._dumps(predictions.format_prediction(ANIMAL, animal_result, prediction_format, top_k)))
+
+
+def bench_verify_google_id_token(benchmark):
+	key = SigningKey()
+	keys = google_tokens.StaticKeySource({"keys": [key.jwk()]})
+	token = key.sign({
+		"iss": "https://accounts.google.com",
+		"aud": "benchmark-client-id",
+		"sub": "1",
+		"email": "someone@example.com",
+		"exp": int(time.time()) + 3600,
+	})
+	benchmark(lambda: google_tokens.verify_id_token(token, "benchmark-client-id", keys))
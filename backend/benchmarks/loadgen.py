@@ -0,0 +1,350 @@
+"""End-to-end load generator for the mlapi endpoints.
+
+Starts the stub upstream, a tiny generated Keras model (skipped, along with
+the predict scenarios, when TensorFlow is not installed), a scratch SQLite
+database and the app under uvicorn, then drives each scenario with
+``--concurrency`` asyncio workers for ``--duration`` seconds. Rate limiting
+and the prediction/chat caches are switched off so every request does the
+real work. ``google_auth`` verifies stub-signed ID tokens against the stub's
+JWKS, as in production; ``--google-verification tokeninfo`` measures the
+per-login tokeninfo round-trip instead.
+
+Reports p50/p95/p99 latency, requests per second, error count and the
+server's peak RSS per scenario. ``--save`` stores the report as a baseline;
+``--compare`` flags scenarios whose p95 or RPS regressed by more than
+``--tolerance`` against one and exits non-zero.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from .stub_upstream import SigningKey, StubUpstream
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+CLIENT_ID = "benchmark-client-id"
+PASSWORD = "benchmark-password"
+
+
+def _free_port():
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+	try:
+		with open(f"/proc/{pid}/status", encoding="ascii") as handle:
+			for line in handle:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	try:
+		import psutil
+
+		return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+	except Exception:
+		return None
+
+
+def _percentile(values, fraction):
+	if not values:
+		return None
+	return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def scenarios(images, model, google_tokens):
+	"""Return ``{name: request_builder}``; builders map ``i`` to httpx request kwargs.
+
+	``google_tokens`` are the ID tokens the ``google_auth`` scenario cycles through.
+	"""
+	def multipart(i, count=1):
+		return [
+			("files" if count > 1 else "file", (f"{i}-{n}.jpg", images[(i + n) % len(images)], "image/jpeg"))
+			for n in range(count)
+		]
+
+	defined = {
+		"ready": lambda i: {"method": "GET", "url": "/api/ready/"},
+		"metrics": lambda i: {"method": "GET", "url": "/api/metrics/"},
+		"signup": lambda i: {
+			"method": "POST",
+			"url": "/api/signup/",
+			"json": {"email": f"bench-{uuid.uuid4().hex}@example.com", "password": PASSWORD},
+		},
+		"login": lambda i: {
+			"method": "POST",
+			"url": "/api/login/",
+			"json": {"email": "bench-login@example.com", "password": PASSWORD},
+		},
+		"google_auth": lambda i: {
+			"method": "POST",
+			"url": "/api/google-auth/",
+			"json": {"token": google_tokens[i % len(google_tokens)]},
+		},
+		"chat": lambda i: {
+			"method": "POST",
+			"url": "/api/chat/",
+			"json": {"message": f"Benchmark question number {i}"},
+		},
+		"chat_stream": lambda i: {
+			"method": "POST",
+			"url": "/api/chat/",
+			"json": {"message": f"Benchmark streamed question {i}", "stream": True},
+		},
+	}
+	if model:
+		defined.update({
+			"predict": lambda i: {
+				"method": "POST", "url": f"/api/{model}/predict/", "files": multipart(i),
+			},
+			"predict_topk": lambda i: {
+				"method": "POST", "url": f"/api/{model}/predict/?top_k=3", "files": multipart(i),
+			},
+			"predict_batch": lambda i: {
+				"method": "POST", "url": f"/api/{model}/predict/batch/", "files": multipart(i, 8),
+			},
+			"job_submit": lambda i: {
+				"method": "POST", "url": f"/api/jobs/?model={model}", "files": multipart(i, 8),
+			},
+		})
+	return defined
+
+
+async def run_scenario(client, build, duration, concurrency, pid):
+	latencies = []
+	errors = 0
+	counter = 0
+	rss_peak = None
+	deadline = time.perf_counter() + duration
+
+	async def worker():
+		nonlocal counter, errors
+		while time.perf_counter() < deadline:
+			counter += 1
+			started = time.perf_counter()
+			try:
+				# Read the whole body so streamed responses are timed to completion.
+				response = await client.request(**build(counter))
+				await response.aread()
+				if response.status_code >= 400:
+					errors += 1
+			except httpx.HTTPError:
+				errors += 1
+			latencies.append(time.perf_counter() - started)
+
+	async def sample_rss():
+		nonlocal rss_peak
+		while time.perf_counter() < deadline:
+			rss = _rss_mb(pid)
+			if rss is not None:
+				rss_peak = max(rss_peak or 0.0, rss)
+			await asyncio.sleep(0.2)
+
+	started = time.perf_counter()
+	await asyncio.gather(sample_rss(), *(worker() for _ in range(concurrency)))
+	elapsed = time.perf_counter() - started
+
+	latencies.sort()
+	as_ms = lambda value: round(value * 1000, 2) if value is not None else None  # noqa: E731
+	return {
+		"requests": len(latencies),
+		"errors": errors,
+		"rps": round(len(latencies) / elapsed, 2),
+		"p50_ms": as_ms(_percentile(latencies, 0.50)),
+		"p95_ms": as_ms(_percentile(latencies, 0.95)),
+		"p99_ms": as_ms(_percentile(latencies, 0.99)),
+		"rss_mb_peak": round(rss_peak, 1) if rss_peak is not None else None,
+	}
+
+
+def compare(report, baseline, tolerance):
+	"""Return human-readable regressions of ``report`` against ``baseline``."""
+	regressions = []
+	for name, current in report["scenarios"].items():
+		previous = baseline.get("scenarios", {}).get(name)
+		if not previous:
+			continue
+		if previous.get("p95_ms") and current["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+			regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+		if previous.get("rps") and current["rps"] < previous["rps"] * (1 - tolerance):
+			regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+	return regressions
+
+
+def _start_server(env, port):
+	subprocess.run(
+		[sys.executable, "manage.py", "migrate", "--noinput", "-v", "0"],
+		cwd=BACKEND_DIR, env=env, check=True,
+	)
+	return subprocess.Popen(
+		[
+			sys.executable, "-m", "uvicorn", "backend.asgi:application",
+			"--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+		],
+		cwd=BACKEND_DIR, env=env,
+	)
+
+
+async def _wait_ready(base_url, server, timeout=180.0):
+	deadline = time.monotonic() + timeout
+	async with httpx.AsyncClient(base_url=base_url) as client:
+		while time.monotonic() < deadline:
+			if server.poll() is not None:
+				raise RuntimeError("Server exited during startup")
+			try:
+				if (await client.get("/api/ready/")).status_code == 200:
+					return
+			except httpx.HTTPError:
+				pass
+			await asyncio.sleep(0.25)
+	raise RuntimeError("Server did not become ready in time")
+
+
+async def _run(args, base_url, server, selected):
+	await _wait_ready(base_url, server)
+	limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+	async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+		await client.post("/api/signup/", json={"email": "bench-login@example.com", "password": PASSWORD})
+
+		results = {}
+		for name, build in selected.items():
+			await client.request(**build(0))  # warm-up
+			results[name] = await run_scenario(client, build, args.duration, args.concurrency, server.pid)
+			row = results[name]
+			print(
+				f"{name:<14} {row['rps']:>8.1f} rps  p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms"
+				f"  p99 {row['p99_ms']:>8} ms  errors {row['errors']:>4}  rss {row['rss_mb_peak']} MB",
+				flush=True,
+			)
+		return results
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("scenarios", nargs="*", help="Scenarios to run (default: all).")
+	parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario.")
+	parser.add_argument("--concurrency", type=int, default=8)
+	parser.add_argument("--upstream-latency", type=float, default=0.05, help="Stub reply delay in seconds.")
+	parser.add_argument("--no-model", action="store_true", help="Skip model generation and predict scenarios.")
+	parser.add_argument(
+		"--google-verification", choices=("local", "tokeninfo"), default="local",
+		help="How google_auth verifies ID tokens (default: local JWKS, as in production).",
+	)
+	parser.add_argument("--save", help="Write the report here as the new baseline.")
+	parser.add_argument("--compare", help="Baseline report to compare against.")
+	parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression (0.2 = 20%%).")
+	parser.add_argument("--keep", action="store_true", help="Keep the scratch directory.")
+	args = parser.parse_args(argv)
+
+	workdir = Path(tempfile.mkdtemp(prefix="mlapi-bench-"))
+	local_tokens = args.google_verification == "local"
+	stub = StubUpstream(
+		latency=args.upstream_latency,
+		client_id=CLIENT_ID,
+		signing_key=SigningKey() if local_tokens else None,
+	).start()
+	server = None
+	try:
+		model = None
+		manifest = ""
+		images = []
+		if not args.no_model:
+			try:
+				from .make_model import make_images, make_model
+
+				manifest = str(make_model(workdir / "models"))
+				images = make_images()
+				model = "bench"
+			except ImportError as error:
+				print(f"Skipping predict scenarios: {error}", file=sys.stderr)
+
+		if local_tokens:
+			google_tokens = [stub.id_token(str(user)) for user in range(100)]
+		else:
+			google_tokens = [f"stub-{user}" for user in range(100)]
+		available = scenarios(images, model, google_tokens)
+		unknown = [name for name in args.scenarios if name not in available]
+		if unknown:
+			parser.error(f"unknown or unavailable scenarios: {', '.join(unknown)}")
+		selected = {name: available[name] for name in (args.scenarios or available)}
+
+		port = _free_port()
+		env = {
+			**os.environ,
+			"DEBUG": "False",
+			"ALLOWED_HOSTS": "127.0.0.1,localhost",
+			"DATABASE_URL": f"sqlite:///{workdir / 'bench.sqlite3'}",
+			"GEMINI_API_BASE": stub.url,
+			"GOOGLE_OAUTH_BASE": stub.url,
+			"GOOGLE_TOKEN_VERIFICATION": args.google_verification,
+			"GOOGLE_JWKS_URL": f"{stub.url}/certs",
+			"GOOGLE_CLIENT_ID": CLIENT_ID,
+			"GOOGLE_CLIENT_SECRET": "benchmark-secret",
+			"CHAT_API_KEY": "benchmark-key",
+			"MLAPI_MODEL_MANIFEST": manifest,
+			"MLAPI_PRELOAD_MODELS": "True" if model else "False",
+			"MLAPI_PRELOAD_BACKGROUND": "True",
+			"MLAPI_ADMISSION_ENABLED": "False",
+			"MLAPI_PREDICTION_CACHE_ENABLED": "False",
+			"CHAT_CACHE_ENABLED": "False",
+		}
+		server = _start_server(env, port)
+		results = asyncio.run(_run(args, f"http://127.0.0.1:{port}", server, selected))
+
+		report = {
+			"meta": {
+				"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+				"python": platform.python_version(),
+				"platform": platform.platform(),
+				"cpu_count": os.cpu_count(),
+				"duration": args.duration,
+				"concurrency": args.concurrency,
+				"upstream_latency": args.upstream_latency,
+				"google_verification": args.google_verification,
+			},
+			"scenarios": results,
+		}
+		if args.save:
+			Path(args.save).write_text(json.dumps(report, indent=2), encoding="utf-8")
+			print(f"Saved baseline to {args.save}")
+		if args.compare:
+			baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+			mode = baseline.get("meta", {}).get("google_verification", "tokeninfo")
+			if mode != args.google_verification:
+				print(f"Note: baseline used --google-verification {mode}", file=sys.stderr)
+			regressions = compare(report, baseline, args.tolerance)
+			for line in regressions:
+				print(f"REGRESSION {line}", file=sys.stderr)
+			if regressions:
+				return 1
+			print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+		return 0
+	finally:
+		if server is not None:
+			server.terminate()
+			try:
+				server.wait(timeout=10)
+			except subprocess.TimeoutExpired:
+				server.kill()
+		stub.stop()
+		if not args.keep:
+			shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,69 @@
+"""Generate a tiny Keras classifier and a manifest that serves it.
+
+The model is a couple of convolutions over a 64x64 input: small enough to
+build in seconds, but it still exercises TensorFlow, the micro-batcher and
+the full preprocessing path. Point ``MLAPI_MODEL_MANIFEST`` at the written
+manifest to serve it.
+"""
+
+import json
+from pathlib import Path
+
+
+CLASS_NAMES = ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+INPUT_SIZE = (64, 64)
+
+
+def make_model(directory, name="bench", classes=CLASS_NAMES, input_size=INPUT_SIZE):
+	"""Write ``<directory>/<name>.keras`` and ``manifest.json``; return the manifest path."""
+	from tensorflow import keras
+
+	directory = Path(directory)
+	directory.mkdir(parents=True, exist_ok=True)
+	width, height = input_size
+
+	keras.utils.set_random_seed(0)
+	model = keras.Sequential([
+		keras.Input(shape=(height, width, 3)),
+		keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+		keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+		keras.layers.GlobalAveragePooling2D(),
+		keras.layers.Dense(len(classes), activation="softmax"),
+	])
+	model.save(directory / f"{name}.keras")
+
+	manifest = directory / "manifest.json"
+	manifest.write_text(json.dumps({
+		"models": [{
+			"name": name,
+			"file": name,
+			"title": "Benchmark",
+			"class_names": list(classes),
+			"input_size": [width, height],
+			"preprocessing": "rescale",
+		}],
+	}, indent="\t"), encoding="utf-8")
+	return manifest
+
+
+def make_images(count=32, size=(320, 240), seed=0):
+	"""Return ``count`` distinct JPEG-encoded noise images as bytes."""
+	import io
+
+	import numpy as np
+	from PIL import Image
+
+	rng = np.random.default_rng(seed)
+	images = []
+	for _ in range(count):
+		pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+		buffer = io.BytesIO()
+		Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+		images.append(buffer.getvalue())
+	return images
+
+
+if __name__ == "__main__":
+	import sys
+
+	print(make_model(sys.argv[1] if len(sys.argv) > 1 else "bench-models"))
@@ -0,0 +1,282 @@
+"""Local stand-in for the Gemini and Google OAuth HTTP APIs.
+
+Point ``GEMINI_API_BASE`` and ``GOOGLE_OAUTH_BASE`` at ``server.url``. For
+``GOOGLE_TOKEN_VERIFICATION=tokeninfo`` any ``stub-<n>`` token is accepted;
+for local verification pass a :class:`SigningKey`, point ``GOOGLE_JWKS_URL``
+at ``server.url + "/certs"`` and log in with :meth:`StubUpstream.id_token`.
+Every reply is delayed by
+``latency`` seconds to mimic upstream round-trips; :meth:`StubUpstream.script`
+queues per-request statuses and delays for ``:generateContent`` and
+:meth:`StubUpstream.drop_streams` cuts streamed replies short, so tests can
+exercise retries, the circuit breaker and hedging.
+"""
+
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+REPLY_TEXT = "This is a canned benchmark reply from the stub Gemini server."
+STREAM_CHUNKS = 8
+
+
+def _user_claims(client_id, user):
+	return {
+		"aud": client_id,
+		"sub": f"stub-{user}",
+		"email": f"google-{user}@example.com",
+		"name": f"Benchmark User {user}",
+	}
+
+
+def _candidate(text):
+	return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def _b64(data):
+	return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64int(value):
+	return _b64(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def _probable_prime(bits, rng):
+	small = (3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47)
+	while True:
+		candidate = rng.getrandbits(bits) | (3 << (bits - 2)) | 1
+		if any(candidate % p == 0 for p in small):
+			continue
+		d, r = candidate - 1, 0
+		while d % 2 == 0:
+			d, r = d // 2, r + 1
+		for _ in range(40):
+			x = pow(rng.randrange(2, candidate - 1), d, candidate)
+			if x in (1, candidate - 1):
+				continue
+			for _ in range(r - 1):
+				x = pow(x, 2, candidate)
+				if x == candidate - 1:
+					break
+			else:
+				break
+		else:
+			return candidate
+
+
+class SigningKey:
+	"""Throwaway RSA key that signs RS256 ID tokens and publishes itself as a JWK.
+
+	Pure Python so the benchmarks and tests need no crypto library; fine for a
+	stand-in key, not for anything real.
+	"""
+
+	def __init__(self, kid="stub-key", bits=2048):
+		rng = random.SystemRandom()
+		self.kid = kid
+		self.e = 65537
+		while True:
+			p, q = _probable_prime(bits // 2, rng), _probable_prime(bits // 2, rng)
+			phi = (p - 1) * (q - 1)
+			if p != q and phi % self.e:
+				break
+		self.n = p * q
+		self._d = pow(self.e, -1, phi)
+
+	def jwk(self):
+		return {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": self.kid, "n": _b64int(self.n), "e": _b64int(self.e)}
+
+	def sign(self, claims, kid=None):
+		"""Return a compact RS256 JWS of ``claims`` (``kid`` overrides the header)."""
+		header = {"alg": "RS256", "typ": "JWT", "kid": kid or self.kid}
+		signing_input = ".".join(
+			_b64(json.dumps(part, separators=(",", ":")).encode("utf-8")) for part in (header, claims)
+		).encode("ascii")
+		size = (self.n.bit_length() + 7) // 8
+		digest_info = bytes.fromhex("3031300d060960864801650304020105000420") + hashlib.sha256(signing_input).digest()
+		padded = b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+		signature = pow(int.from_bytes(padded, "big"), self._d, self.n).to_bytes(size, "big")
+		return f"{signing_input.decode('ascii')}.{_b64(signature)}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def log_message(self, format, *args):
+		pass
+
+	def _send_json(self, payload, status=200):
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _read_body(self):
+		length = int(self.headers.get("Content-Length") or 0)
+		return self.rfile.read(length) if length else b""
+
+	def do_POST(self):
+		self._read_body()
+		path = urlsplit(self.path).path
+
+		if path.endswith(":generateContent"):
+			status, delay = self.server.next_reply()
+			time.sleep(delay)
+			if status >= 400:
+				self._send_json({"error": {"code": status}}, status=status)
+			else:
+				self._send_json(_candidate(REPLY_TEXT))
+			return
+		time.sleep(self.server.latency)
+		if path.endswith(":streamGenerateContent"):
+			drop_after = self.server.next_stream()
+			words = REPLY_TEXT.split()
+			step = max(len(words) // STREAM_CHUNKS, 1)
+			events = [
+				f"data: {json.dumps(_candidate(' '.join(words[start:start + step]) + ' '))}\r\n\r\n".encode("utf-8")
+				for start in range(0, len(words), step)
+			]
+			self.send_response(200)
+			self.send_header("Content-Type", "text/event-stream")
+			self.send_header("Connection", "close")
+			if drop_after is not None:
+				# Promise the whole body, then hang up early: a dropped connection.
+				self.send_header("Content-Length", str(sum(map(len, events))))
+				events = events[:drop_after]
+			self.end_headers()
+			for event in events:
+				self.wfile.write(event)
+				self.wfile.flush()
+			self.close_connection = True
+			return
+		if path.endswith("/token"):
+			id_token = self.server.id_token("0") if self.server.signing_key else "stub-id-token"
+			self._send_json({"id_token": id_token, "access_token": "stub", "expires_in": 3600})
+			return
+		self._send_json({"error": "not found"}, status=404)
+
+	def do_GET(self):
+		parts = urlsplit(self.path)
+		time.sleep(self.server.latency)
+
+		if parts.path.endswith("/tokeninfo"):
+			token = parse_qs(parts.query).get("id_token", [""])[0]
+			user = token.rsplit("-", 1)[-1] or "0"
+			self._send_json({**_user_claims(self.server.client_id, user), "email_verified": "true"})
+			return
+		if parts.path.endswith("/certs"):
+			key = self.server.signing_key
+			self._send_json({"keys": [key.jwk()] if key else []})
+			return
+		self._send_json({"error": "not found"}, status=404)
+
+
+class _Server(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def handle_error(self, request, client_address):
+		# Cancelled and hedged-away clients hang up mid-reply; that is expected.
+		pass
+
+
+class StubUpstream:
+	"""Threaded HTTP stub; use as a context manager or call ``start``/``stop``."""
+
+	def __init__(self, host="127.0.0.1", port=0, latency=0.05, client_id="benchmark-client-id", signing_key=None):
+		self._server = _Server((host, port), _Handler)
+		self._server.latency = latency
+		self._server.client_id = client_id
+		self._server.signing_key = signing_key
+		self._server.id_token = self.id_token
+		self._server.script = deque()
+		self._server.calls = 0
+		self._server.lock = threading.Lock()
+		self._server.next_reply = self._next_reply
+		self._server.stream_drops = deque()
+		self._server.stream_calls = 0
+		self._server.next_stream = self._next_stream
+		self._thread = None
+
+	def _next_reply(self):
+		with self._server.lock:
+			self._server.calls += 1
+			if self._server.script:
+				return self._server.script.popleft()
+		return 200, self._server.latency
+
+	def _next_stream(self):
+		with self._server.lock:
+			self._server.stream_calls += 1
+			if self._server.stream_drops:
+				return self._server.stream_drops.popleft()
+		return None
+
+	def drop_streams(self, *after):
+		"""Cut the next ``:streamGenerateContent`` replies after that many events each."""
+		with self._server.lock:
+			self._server.stream_drops.extend(after)
+
+	def script(self, *replies):
+		"""Queue ``(status, delay)`` replies for the next ``:generateContent`` calls."""
+		with self._server.lock:
+			self._server.script.extend(replies)
+
+	def id_token(self, user, lifetime=3600):
+		"""Google-style ID token for benchmark user ``user``, signed with ``signing_key``."""
+		claims = {
+			**_user_claims(self._server.client_id, user),
+			"iss": "https://accounts.google.com",
+			"email_verified": True,
+			"iat": int(time.time()),
+			"exp": int(time.time()) + lifetime,
+		}
+		return self._server.signing_key.sign(claims)
+
+	@property
+	def calls(self):
+		"""Number of ``:generateContent`` requests received so far."""
+		return self._server.calls
+
+	@property
+	def url(self):
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def start(self):
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+
+if __name__ == "__main__":
+	import argparse
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--latency", type=float, default=0.05)
+	args = parser.parse_args()
+	with StubUpstream(port=args.port, latency=args.latency) as stub:
+		print(f"Stub upstream listening on {stub.url}")
+		try:
+			while True:
+				time.sleep(3600)
+		except KeyboardInterrupt:
+			pass
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the backend.
+
+Two ways to avoid holding one copy of every model per worker:
+
+* MLAPI_INFERENCE_SOCKET=/tmp/synexis-inference.sock with
+  `python manage.py inference_server` running alongside gunicorn. Workers
+  never load TensorFlow; this is the safest option.
+* MLAPI_PREFORK_MODELS=True loads the models once in the master before
+  forking (copy-on-write). TensorFlow's thread pools are not fork-safe, so
+  only use this with models that have been verified to work after fork.
+"""
+
+import os
+
+wsgi_app = 'backend.wsgi:application'
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+
+if os.getenv('MLAPI_PREFORK_MODELS', 'False') == 'True':
+    os.environ['MLAPI_PRELOAD_MODELS'] = 'True'
+    os.environ['MLAPI_PRELOAD_BACKGROUND'] = 'False'
+    preload_app = True
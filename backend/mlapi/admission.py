@@ -0,0 +1,342 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import auth_tokens, metrics
+
+
+INTERACTIVE = 0
+BULK = 1
+
+
+class Overloaded(Exception):
+	"""Raised when no admission slot frees up in time or the queue is full."""
+
+	def __init__(self, message, retry_after):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+	"""Token buckets keyed by ``(scope, identity)``.
+
+	``rates`` maps a scope to ``(tokens_per_second, burst)``; a rate of 0
+	disables limiting for that scope. Buckets live in a bounded in-process
+	LRU, or in the Django cache ``alias`` to share them between workers (the
+	read-modify-write there is not atomic, so concurrent workers can let a
+	few extra requests through at the boundary).
+	"""
+
+	def __init__(self, rates, alias="", max_keys=10000):
+		self.rates = dict(rates)
+		self.alias = alias
+		self.max_keys = max(int(max_keys), 1)
+		self._buckets = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _load(self, key):
+		if self.alias:
+			from django.core.cache import caches
+
+			return caches[self.alias].get(key)
+		bucket = self._buckets.get(key)
+		if bucket is not None:
+			self._buckets.move_to_end(key)
+		return bucket
+
+	def _store(self, key, bucket, ttl):
+		if self.alias:
+			from django.core.cache import caches
+
+			caches[self.alias].set(key, bucket, timeout=ttl)
+			return
+		self._buckets[key] = bucket
+		self._buckets.move_to_end(key)
+		while len(self._buckets) > self.max_keys:
+			self._buckets.popitem(last=False)
+
+	def consume(self, scope, identity, cost=1.0):
+		"""Take ``cost`` tokens; return 0 if allowed, else seconds until it would be."""
+		rate, burst = self.rates.get(scope, (0, 0))
+		if rate <= 0:
+			return 0.0
+
+		key = f"mlapi:rate:{scope}:{identity}"
+		now = time.time()
+		with self._lock:
+			tokens, updated = self._load(key) or (float(burst), now)
+			tokens = min(float(burst), tokens + (now - updated) * rate)
+			if tokens >= cost:
+				tokens -= cost
+				wait = 0.0
+			else:
+				wait = (cost - tokens) / rate
+			self._store(key, (tokens, now), ttl=math.ceil(burst / rate) + 1)
+		return wait
+
+
+class _Waiter:
+	__slots__ = ("granted", "cancelled", "wake")
+
+	def __init__(self, wake):
+		self.granted = False
+		self.cancelled = False
+		self.wake = wake
+
+
+class AdmissionController:
+	"""Caps concurrent calls per process and queues the rest by priority.
+
+	Waiters are served lowest ``priority`` first (``INTERACTIVE`` before
+	``BULK``), FIFO within a priority. A waiter gives up with ``Overloaded``
+	once its deadline passes, and new arrivals are shed immediately while
+	``max_queue`` callers are already waiting. Sync and async callers share
+	the same slots.
+	"""
+
+	def __init__(self, name, capacity=4, max_queue=64, timeout=10.0):
+		self.name = name
+		self.capacity = max(int(capacity), 1)
+		self.max_queue = max(int(max_queue), 0)
+		self.timeout = max(float(timeout), 0.0)
+		self._in_use = 0
+		self._queue = []
+		self._order = itertools.count()
+		self._lock = threading.Lock()
+
+	def _try_enter(self, priority, wake):
+		with self._lock:
+			if self._in_use < self.capacity and not self._queue:
+				self._in_use += 1
+				return None
+			if len(self._queue) >= self.max_queue:
+				raise Overloaded(f"{self.name} queue is full", self.timeout or 1.0)
+			waiter = _Waiter(wake)
+			heapq.heappush(self._queue, (priority, next(self._order), waiter))
+			return waiter
+
+	def _give_up(self, waiter):
+		"""Leave the queue; returns True if a slot was granted meanwhile."""
+		with self._lock:
+			if waiter.granted:
+				return True
+			waiter.cancelled = True
+			return False
+
+	def acquire(self, priority=INTERACTIVE, timeout=None):
+		event = threading.Event()
+		waiter = self._try_enter(priority, event.set)
+		if waiter is None:
+			return
+		if event.wait(self.timeout if timeout is None else timeout) or self._give_up(waiter):
+			return
+		raise Overloaded(f"Timed out waiting for a {self.name} slot", self.timeout or 1.0)
+
+	async def aacquire(self, priority=INTERACTIVE, timeout=None):
+		loop = asyncio.get_running_loop()
+		event = asyncio.Event()
+		waiter = self._try_enter(priority, lambda: loop.call_soon_threadsafe(event.set))
+		if waiter is None:
+			return
+		try:
+			await asyncio.wait_for(event.wait(), self.timeout if timeout is None else timeout)
+		except asyncio.TimeoutError:
+			if self._give_up(waiter):
+				return
+			raise Overloaded(f"Timed out waiting for a {self.name} slot", self.timeout or 1.0)
+		except asyncio.CancelledError:
+			if self._give_up(waiter):
+				self.release()
+			raise
+
+	def release(self):
+		with self._lock:
+			while self._queue:
+				_, _, waiter = heapq.heappop(self._queue)
+				if waiter.cancelled:
+					continue
+				waiter.granted = True
+				waiter.wake()
+				return
+			self._in_use -= 1
+
+	def stats(self):
+		with self._lock:
+			return {
+				"in_use": self._in_use,
+				"queued": sum(1 for _, _, waiter in self._queue if not waiter.cancelled),
+				"capacity": self.capacity,
+			}
+
+
+_LIMITER = None
+_CONTROLLERS = {}
+_STATE_LOCK = threading.Lock()
+
+
+def get_limiter():
+	global _LIMITER
+	if _LIMITER is None:
+		with _STATE_LOCK:
+			if _LIMITER is None:
+				_LIMITER = TokenBucketLimiter(
+					getattr(settings, "MLAPI_RATE_LIMITS", {}),
+					alias=getattr(settings, "MLAPI_RATE_LIMIT_ALIAS", ""),
+				)
+	return _LIMITER
+
+
+def get_controller(name):
+	controller = _CONTROLLERS.get(name)
+	if controller is None:
+		with _STATE_LOCK:
+			controller = _CONTROLLERS.get(name)
+			if controller is None:
+				config = getattr(settings, "MLAPI_ADMISSION", {}).get(name, {})
+				controller = _CONTROLLERS[name] = AdmissionController(name, **config)
+	return controller
+
+
+def client_identity(request):
+	"""User from a signed auth token, else client IP.
+
+	Only server-verified identities count: client-supplied headers such as
+	``X-Api-Key`` or ``X-User-Email`` would let a caller rotate them to dodge
+	the limit, or spend someone else's bucket.
+	"""
+	email = auth_tokens.authenticated_email(request)
+	if email:
+		return "user:" + email.lower()
+	address = request.META.get("REMOTE_ADDR", "")
+	if getattr(settings, "MLAPI_TRUST_X_FORWARDED_FOR", False):
+		forwarded = request.headers.get("X-Forwarded-For", "")
+		address = forwarded.split(",")[0].strip() or address
+	return "ip:" + address
+
+
+def _request_priority(request, priority):
+	# Clients may demote their own traffic, never promote it.
+	if request.headers.get("X-Priority", "").strip().lower() == "bulk":
+		return BULK
+	return priority
+
+
+def _rejected(message, retry_after, status):
+	retry_after = max(math.ceil(retry_after), 1)
+	response = JsonResponse({"error": message, "retry_after": retry_after}, status=status)
+	response["Retry-After"] = str(retry_after)
+	return response
+
+
+def _rate_limited(scope, request):
+	if not scope:
+		return None
+	wait = get_limiter().consume(scope, client_identity(request))
+	if not wait:
+		return None
+	metrics.inc("mlapi_rate_limited_total", help="Requests rejected by the per-client rate limiter.", scope=scope)
+	return _rejected("Rate limit exceeded", wait, 429)
+
+
+def _overloaded(controller, error):
+	metrics.inc(
+		"mlapi_admission_rejected_total",
+		help="Requests shed because no admission slot was free in time.",
+		controller=controller,
+	)
+	return _rejected(str(error), error.retry_after, 503)
+
+
+def _release_after_stream(response, controller):
+	"""Hold the slot until a streaming response has been fully sent."""
+	content = response.streaming_content
+	if response.is_async:
+		async def wrapped():
+			try:
+				async for chunk in content:
+					yield chunk
+			finally:
+				controller.release()
+	else:
+		def wrapped():
+			try:
+				yield from content
+			finally:
+				controller.release()
+	response.streaming_content = wrapped()
+	return response
+
+
+def admit(scope=None, controller=None, priority=INTERACTIVE):
+	"""Rate-limit a view by ``scope`` and run it under ``controller``'s admission.
+
+	Rate-limited requests get 429, requests that cannot be admitted in time get
+	503, both with ``Retry-After``. Works on sync and async views; for
+	streaming responses the slot is held until the stream is closed.
+	"""
+	def decorator(view):
+		if iscoroutinefunction(view):
+			@functools.wraps(view)
+			async def async_wrapper(request, *args, **kwargs):
+				if not getattr(settings, "MLAPI_ADMISSION_ENABLED", True):
+					return await view(request, *args, **kwargs)
+				rejected = await sync_to_async(_rate_limited)(scope, request) if scope else None
+				if rejected is not None:
+					return rejected
+				if controller is None:
+					return await view(request, *args, **kwargs)
+
+				slots = get_controller(controller)
+				try:
+					await slots.aacquire(_request_priority(request, priority))
+				except Overloaded as error:
+					return _overloaded(controller, error)
+				try:
+					response = await view(request, *args, **kwargs)
+				except BaseException:
+					slots.release()
+					raise
+				if response.streaming:
+					return _release_after_stream(response, slots)
+				slots.release()
+				return response
+
+			return async_wrapper
+
+		@functools.wraps(view)
+		def wrapper(request, *args, **kwargs):
+			if not getattr(settings, "MLAPI_ADMISSION_ENABLED", True):
+				return view(request, *args, **kwargs)
+			rejected = _rate_limited(scope, request)
+			if rejected is not None:
+				return rejected
+			if controller is None:
+				return view(request, *args, **kwargs)
+
+			slots = get_controller(controller)
+			try:
+				slots.acquire(_request_priority(request, priority))
+			except Overloaded as error:
+				return _overloaded(controller, error)
+			try:
+				response = view(request, *args, **kwargs)
+			except BaseException:
+				slots.release()
+				raise
+			if response.streaming:
+				return _release_after_stream(response, slots)
+			slots.release()
+			return response
+
+		return wrapper
+
+	return decorator
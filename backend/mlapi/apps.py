@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MlapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mlapi'
+
+    def ready(self):
+        if getattr(settings, 'MLAPI_METRICS_ENABLED', True):
+            from django.db.backends.signals import connection_created
+
+            from .metrics import instrument_connection
+
+            connection_created.connect(instrument_connection, dispatch_uid='mlapi_metrics')
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core import signing
+
+
+_SALT = "mlapi.auth-token"
+
+
+def issue_token(email):
+	"""Signed, timestamped bearer token for ``email``, returned by login."""
+	return signing.dumps({"email": email}, salt=_SALT, compress=True)
+
+
+def authenticated_email(request):
+	"""Email from a valid ``Authorization: Bearer`` token, or ``None``.
+
+	Tokens expire after ``MLAPI_AUTH_TOKEN_MAX_AGE`` seconds.
+	"""
+	scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+	if scheme.lower() != "bearer" or not token.strip():
+		return None
+	try:
+		payload = signing.loads(
+			token.strip(),
+			salt=_SALT,
+			max_age=getattr(settings, "MLAPI_AUTH_TOKEN_MAX_AGE", 7 * 24 * 3600),
+		)
+	except signing.BadSignature:
+		return None
+	email = payload.get("email") if isinstance(payload, dict) else None
+	return email or None
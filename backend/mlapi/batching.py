@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from . import metrics
+
+
+_STOP = object()
+
+
+class BatcherClosed(RuntimeError):
+	"""Raised by :meth:`MicroBatcher.submit` once the batcher has been closed."""
+
+
+class MicroBatcher:
+	"""Collects single-image requests for one model and runs them as a batch.
+
+	Requests are queued until either ``max_batch_size`` items are waiting or
+	``max_wait_ms`` has passed since the first one arrived, then a single
+	``predict_fn(model, batch)`` call runs on the stacked batch and each caller
+	gets its own row of the result.
+	"""
+
+	def __init__(self, model, predict_fn, max_batch_size=16, max_wait_ms=5.0, name="model"):
+		self.model = model
+		self.predict_fn = predict_fn
+		self.max_batch_size = max(int(max_batch_size), 1)
+		self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+		self.name = name
+		self._queue = queue.Queue()
+		self._worker = None
+		self._closed = False
+		self._lock = threading.Lock()
+
+	def _ensure_worker(self):
+		# Called with self._lock held.
+		if self._worker is not None and self._worker.is_alive():
+			return
+		self._worker = threading.Thread(
+			target=self._run,
+			name=f"mlapi-batcher-{self.name}",
+			daemon=True,
+		)
+		self._worker.start()
+
+	def submit(self, array):
+		# Queueing and close() are serialised, so every accepted item is ahead
+		# of _STOP in the queue and a live worker will get to it.
+		future = Future()
+		with self._lock:
+			if self._closed:
+				raise BatcherClosed(f"Batcher for {self.name} is closed")
+			self._queue.put((array, future))
+			self._ensure_worker()
+		return future
+
+	def predict(self, array, timeout=None):
+		return self.submit(array).result(timeout=timeout)
+
+	def close(self):
+		"""Stop accepting work; items already queued are still run."""
+		with self._lock:
+			if self._closed:
+				return
+			self._closed = True
+			self._queue.put(_STOP)
+
+	def _collect(self):
+		first = self._queue.get()
+		if first is _STOP:
+			return None
+
+		items = [first]
+		deadline = time.monotonic() + self.max_wait
+		while len(items) < self.max_batch_size:
+			remaining = deadline - time.monotonic()
+			try:
+				if remaining <= 0:
+					item = self._queue.get_nowait()
+				else:
+					item = self._queue.get(timeout=remaining)
+			except queue.Empty:
+				break
+			if item is _STOP:
+				# Finish what is already queued, then let the thread exit.
+				self._queue.put(_STOP)
+				break
+			items.append(item)
+		return items
+
+	def _run(self):
+		import numpy as np
+
+		while True:
+			collected = self._collect()
+			if collected is None:
+				return
+
+			items = [
+				(array, future)
+				for array, future in collected
+				if future.set_running_or_notify_cancel()
+			]
+			if not items:
+				continue
+
+			arrays = [array for array, _ in items]
+			futures = [future for _, future in items]
+			try:
+				with metrics.span("model_predict", model=self.name):
+					preds = self.predict_fn(self.model, np.stack(arrays, axis=0))
+				preds = np.asarray(preds).reshape(len(arrays), -1)
+			except Exception as exc:
+				for future in futures:
+					future.set_exception(exc)
+				continue
+
+			for row, future in zip(preds, futures):
+				future.set_result(row)
+
+
+_BATCHERS = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_batcher(name, model, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+	batcher = _BATCHERS.get(name)
+	if batcher is not None and batcher.model is model:
+		return batcher
+
+	with _BATCHERS_LOCK:
+		batcher = _BATCHERS.get(name)
+		if batcher is None or batcher.model is not model:
+			if batcher is not None:
+				batcher.close()
+			batcher = MicroBatcher(
+				model,
+				predict_fn,
+				max_batch_size=max_batch_size,
+				max_wait_ms=max_wait_ms,
+				name=name,
+			)
+			_BATCHERS[name] = batcher
+	return batcher
+
+
+def discard_batcher(name):
+	with _BATCHERS_LOCK:
+		batcher = _BATCHERS.pop(name, None)
+	if batcher is not None:
+		batcher.close()
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class LRUCache:
+	"""Thread-safe in-process LRU with a per-entry TTL (``ttl=0`` never expires)."""
+
+	def __init__(self, max_entries=1024, ttl=0):
+		self.max_entries = max(int(max_entries), 0)
+		self.ttl = max(float(ttl), 0.0)
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		with self._lock:
+			entry = self._entries.get(key, _MISSING)
+			if entry is _MISSING:
+				return default
+
+			expires_at, value = entry
+			if expires_at and expires_at < time.monotonic():
+				del self._entries[key]
+				return default
+
+			self._entries.move_to_end(key)
+			return value
+
+	def set(self, key, value, ttl=None):
+		if not self.max_entries:
+			return
+
+		ttl = self.ttl if ttl is None else ttl
+		expires_at = time.monotonic() + ttl if ttl else 0
+		with self._lock:
+			self._entries[key] = (expires_at, value)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def delete(self, key):
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def __len__(self):
+		return len(self._entries)
+
+
+class TieredCache:
+	"""An in-process :class:`LRUCache` in front of an optional Django cache alias.
+
+	Shared-tier hits are copied into the local tier. ``stats()`` reports hits
+	per tier and misses since startup.
+	"""
+
+	def __init__(self, prefix, max_entries=1024, ttl=0, shared_alias=""):
+		self.prefix = prefix
+		self.ttl = ttl
+		self.local = LRUCache(max_entries=max_entries, ttl=ttl)
+		self.shared_alias = shared_alias
+		self._counts = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+		self._counts_lock = threading.Lock()
+
+	def _count(self, name):
+		with self._counts_lock:
+			self._counts[name] += 1
+
+	def _shared(self):
+		if not self.shared_alias:
+			return None
+		from django.core.cache import caches
+
+		return caches[self.shared_alias]
+
+	def _shared_key(self, key):
+		return f"{self.prefix}:{key}"
+
+	def get(self, key):
+		value = self.local.get(key, _MISSING)
+		if value is not _MISSING:
+			self._count("local_hits")
+			return value
+
+		shared = self._shared()
+		if shared is not None:
+			try:
+				value = shared.get(self._shared_key(key), _MISSING)
+			except Exception:
+				value = _MISSING
+			if value is not _MISSING:
+				self.local.set(key, value)
+				self._count("shared_hits")
+				return value
+
+		self._count("misses")
+		return None
+
+	def set(self, key, value):
+		self.local.set(key, value)
+		shared = self._shared()
+		if shared is not None:
+			try:
+				shared.set(self._shared_key(key), value, timeout=self.ttl or None)
+			except Exception:
+				pass
+
+	def clear(self):
+		self.local.clear()
+
+	def stats(self):
+		with self._counts_lock:
+			counts = dict(self._counts)
+		lookups = sum(counts.values())
+		hits = counts["local_hits"] + counts["shared_hits"]
+		counts["entries"] = len(self.local)
+		counts["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+		return counts
+
+
+def content_hash(file_obj):
+	"""SHA-256 hex digest of an upload, read in chunks and rewound afterwards.
+
+	Uploads received by ``uploads.ImageUploadHandler`` were hashed on arrival.
+	"""
+	import hashlib
+
+	precomputed = getattr(file_obj, "sha256", None)
+	if precomputed:
+		return precomputed
+
+	digest = hashlib.sha256()
+	file_obj.seek(0)
+	if hasattr(file_obj, "chunks"):
+		chunks = file_obj.chunks()
+	else:
+		chunks = iter(lambda: file_obj.read(65536), b"")
+	for chunk in chunks:
+		digest.update(chunk)
+	file_obj.seek(0)
+	return digest.hexdigest()
+
+
+def prediction_cache_key(spec, file_obj):
+	# "scores": entries hold raw class scores, rendered per request format.
+	return f"{spec.name}:{spec.version()}:scores:{content_hash(file_obj)}"
+
+
+_PREDICTION_CACHE = None
+_PREDICTION_CACHE_LOCK = threading.Lock()
+
+
+def get_prediction_cache():
+	"""Return the shared prediction cache, or ``None`` when it is disabled."""
+	global _PREDICTION_CACHE
+	from django.conf import settings
+
+	if not getattr(settings, "MLAPI_PREDICTION_CACHE_ENABLED", True):
+		return None
+
+	if _PREDICTION_CACHE is None:
+		with _PREDICTION_CACHE_LOCK:
+			if _PREDICTION_CACHE is None:
+				_PREDICTION_CACHE = TieredCache(
+					"mlapi:prediction",
+					max_entries=getattr(settings, "MLAPI_PREDICTION_CACHE_SIZE", 1024),
+					ttl=getattr(settings, "MLAPI_PREDICTION_CACHE_TTL", 3600),
+					shared_alias=getattr(settings, "MLAPI_PREDICTION_CACHE_ALIAS", ""),
+				)
+	return _PREDICTION_CACHE
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .cache import LRUCache
+
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+	text = _PUNCTUATION.sub(" ", str(text).lower())
+	return _WHITESPACE.sub(" ", text).strip()
+
+
+def _trigrams(text):
+	padded = f"  {text} "
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(left, right):
+	if not left or not right:
+		return 0.0
+	return len(left & right) / len(left | right)
+
+
+def _digest(value):
+	return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def normalized_window(contents, window=None):
+	"""``[(role, normalized text), ...]`` for the last ``window`` Gemini turns."""
+	selected = contents[-window:] if window else contents
+	return [(item["role"], normalize_text(item["parts"][0]["text"])) for item in selected]
+
+
+def conversation_key(system_prompt, language, contents, window=None):
+	"""Canonical key for a chat request: prompt, language and normalized turns."""
+	return _digest([system_prompt, language] + normalized_window(contents, window))
+
+
+class ChatResponseCache:
+	"""Server-side cache of chat replies shared through a Django cache alias.
+
+	Entries are keyed on the system prompt, language and the last ``window``
+	turns after normalisation. With ``similarity`` > 0, a reply is also reused
+	when the same context ends in a user message whose character-trigram
+	Jaccard similarity to a cached one reaches that threshold.
+	"""
+
+	def __init__(self, alias="default", ttl=3600, window=6, similarity=0.0,
+			max_local_entries=512, max_bucket_entries=50):
+		self.alias = alias
+		self.ttl = ttl
+		self.window = max(int(window), 1)
+		self.similarity = float(similarity)
+		self.max_bucket_entries = max_bucket_entries
+		self.local = LRUCache(max_entries=max_local_entries, ttl=ttl)
+		self._counts = {"hits": 0, "near_hits": 0, "misses": 0}
+		self._counts_lock = threading.Lock()
+
+	def _shared(self):
+		from django.core.cache import caches
+
+		return caches[self.alias]
+
+	def _count(self, name):
+		with self._counts_lock:
+			self._counts[name] += 1
+
+	def keys(self, system_prompt, language, contents):
+		"""Return ``(exact_key, context_key, last_user_text)`` for a Gemini ``contents`` list."""
+		window = normalized_window(contents, self.window)
+		last_user = window[-1][1] if window and window[-1][0] == "user" else ""
+		prefix = [system_prompt, language]
+		exact_key = "mlapi:chat:" + _digest(prefix + window)
+		context_key = "mlapi:chat:similar:" + _digest(prefix + window[:-1])
+		return exact_key, context_key, last_user
+
+	def get(self, system_prompt, language, contents):
+		exact_key, context_key, last_user = self.keys(system_prompt, language, contents)
+
+		entry = self._lookup(exact_key)
+		if entry is not None:
+			self._count("hits")
+			self._record_hit(exact_key)
+			return entry["text"]
+
+		if self.similarity > 0 and last_user:
+			candidate = self._nearest(context_key, last_user)
+			if candidate is not None:
+				entry = self._lookup(candidate)
+				if entry is not None:
+					self._count("near_hits")
+					self._record_hit(candidate)
+					return entry["text"]
+
+		self._count("misses")
+		return None
+
+	def set(self, system_prompt, language, contents, text):
+		exact_key, context_key, last_user = self.keys(system_prompt, language, contents)
+		entry = {"text": text, "created": time.time()}
+		self.local.set(exact_key, entry)
+		try:
+			shared = self._shared()
+			shared.set(exact_key, entry, timeout=self.ttl or None)
+			if self.similarity > 0 and last_user:
+				bucket = shared.get(context_key) or []
+				bucket = [item for item in bucket if item[0] != exact_key]
+				bucket.append((exact_key, last_user))
+				shared.set(context_key, bucket[-self.max_bucket_entries:], timeout=self.ttl or None)
+		except Exception:
+			pass
+
+	def _lookup(self, key):
+		entry = self.local.get(key)
+		if entry is not None:
+			return entry
+		try:
+			entry = self._shared().get(key)
+		except Exception:
+			return None
+		if entry is not None:
+			self.local.set(key, entry)
+		return entry
+
+	def _nearest(self, context_key, last_user):
+		try:
+			bucket = self._shared().get(context_key) or []
+		except Exception:
+			return None
+
+		wanted = _trigrams(last_user)
+		best_key, best_score = None, 0.0
+		for key, text in bucket:
+			score = _similarity(wanted, _trigrams(text))
+			if score > best_score:
+				best_key, best_score = key, score
+		return best_key if best_score >= self.similarity else None
+
+	def _record_hit(self, key):
+		try:
+			shared = self._shared()
+			hits_key = f"{key}:hits"
+			if not shared.add(hits_key, 1, timeout=self.ttl or None):
+				shared.incr(hits_key)
+		except Exception:
+			pass
+
+	def entry_hits(self, system_prompt, language, contents):
+		exact_key, _, _ = self.keys(system_prompt, language, contents)
+		try:
+			return self._shared().get(f"{exact_key}:hits", 0)
+		except Exception:
+			return 0
+
+	def stats(self):
+		with self._counts_lock:
+			counts = dict(self._counts)
+		lookups = sum(counts.values())
+		counts["hit_rate"] = (
+			round((counts["hits"] + counts["near_hits"]) / lookups, 4) if lookups else 0.0
+		)
+		return counts
+
+
+_CHAT_CACHE = None
+_CHAT_CACHE_LOCK = threading.Lock()
+
+
+def get_chat_cache():
+	"""Return the shared chat cache, or ``None`` when CHAT_CACHE_ENABLED is off."""
+	global _CHAT_CACHE
+	if not getattr(settings, "CHAT_CACHE_ENABLED", True):
+		return None
+
+	if _CHAT_CACHE is None:
+		with _CHAT_CACHE_LOCK:
+			if _CHAT_CACHE is None:
+				_CHAT_CACHE = ChatResponseCache(
+					alias=getattr(settings, "CHAT_CACHE_ALIAS", "default"),
+					ttl=getattr(settings, "CHAT_CACHE_TTL", 3600),
+					window=getattr(settings, "CHAT_CACHE_WINDOW", 6),
+					similarity=getattr(settings, "CHAT_CACHE_SIMILARITY", 0.0),
+				)
+	return _CHAT_CACHE
@@ -0,0 +1,133 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, ConversationTurn, UserCredential
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+	"""Rough token count (about four characters per token for English text)."""
+	return max(len(text) // 4, 1) if text else 0
+
+
+def _digest_line(role, content, max_chars=200):
+	first = _SENTENCE_END.split(" ".join(content.split()), maxsplit=1)[0]
+	if len(first) > max_chars:
+		first = first[:max_chars - 1].rstrip() + "…"
+	return f"{'User' if role == 'user' else 'Assistant'}: {first}"
+
+
+def fold_into_digest(digest, turns, max_tokens):
+	"""Append one line per turn to ``digest``, dropping the oldest lines over budget.
+
+	This is truncation, not summarisation: each line is just the first
+	sentence of the turn (at most 200 characters), so no model call is made.
+	"""
+	lines = [line for line in digest.splitlines() if line]
+	lines.extend(_digest_line(turn.role, turn.content) for turn in turns)
+
+	while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+		lines.pop(0)
+	return "\n".join(lines)
+
+
+def get_or_create_conversation(conversation_id, user_email, seed_messages=None):
+	"""Return the caller's conversation, creating (and optionally seeding) a new one.
+
+	``user_email`` must come from a verified credential (see
+	:func:`auth_tokens.authenticated_email`), never from the request body.
+	Raises ``Conversation.DoesNotExist`` for an unknown id or one owned by
+	another user.
+	"""
+	user = None
+	if user_email:
+		user = UserCredential.objects.filter(email=user_email.strip().lower()).first()
+
+	if conversation_id:
+		conversation = Conversation.objects.get(pk=conversation_id)
+		if conversation.user_id is not None and (user is None or conversation.user_id != user.pk):
+			raise Conversation.DoesNotExist
+		return conversation
+
+	with transaction.atomic():
+		conversation = Conversation.objects.create(user=user)
+		turns = []
+		for item in seed_messages or []:
+			role = "user" if str(item.get("role", "")).lower() == "user" else "model"
+			content = str(item.get("content", "")).strip()
+			if content:
+				turns.append(ConversationTurn(
+					conversation=conversation,
+					position=len(turns),
+					role=role,
+					content=content,
+					tokens=estimate_tokens(content),
+				))
+		if turns:
+			ConversationTurn.objects.bulk_create(turns)
+			conversation.turn_count = len(turns)
+			conversation.save(update_fields=["turn_count"])
+	return conversation
+
+
+def build_context(conversation, message):
+	"""Return ``(messages, digest)`` for the next Gemini request.
+
+	The newest turns are kept verbatim within CHAT_CONTEXT_TOKEN_BUDGET; older
+	turns that are not in the digest yet are folded into it (see
+	:func:`fold_into_digest`), which is saved so later requests never reload
+	them.
+	"""
+	budget = getattr(settings, "CHAT_CONTEXT_TOKEN_BUDGET", 2000)
+	digest_budget = getattr(settings, "CHAT_DIGEST_TOKEN_BUDGET", 300)
+
+	turns = list(conversation.turns.filter(position__gte=conversation.digested_through))
+
+	used = estimate_tokens(message)
+	keep_from = len(turns)
+	while keep_from > 0 and used + turns[keep_from - 1].tokens <= budget:
+		keep_from -= 1
+		used += turns[keep_from].tokens
+
+	overflow = turns[:keep_from]
+	if overflow:
+		conversation.digest = fold_into_digest(conversation.digest, overflow, digest_budget)
+		conversation.digested_through = overflow[-1].position + 1
+		conversation.save(update_fields=["digest", "digested_through", "updated_at"])
+
+	messages = [{"role": turn.role, "content": turn.content} for turn in turns[keep_from:]]
+	messages.append({"role": "user", "content": message})
+	return messages, conversation.digest
+
+
+def record_exchange(conversation, message, reply):
+	"""Store a user message and the model's reply as the next two turns."""
+	with transaction.atomic():
+		conversation = Conversation.objects.select_for_update().get(pk=conversation.pk)
+		position = conversation.turn_count
+		ConversationTurn.objects.bulk_create([
+			ConversationTurn(
+				conversation=conversation,
+				position=position,
+				role="user",
+				content=message,
+				tokens=estimate_tokens(message),
+			),
+			ConversationTurn(
+				conversation=conversation,
+				position=position + 1,
+				role="model",
+				content=reply,
+				tokens=estimate_tokens(reply),
+			),
+		])
+		Conversation.objects.filter(pk=conversation.pk).update(
+			turn_count=F("turn_count") + 2,
+			updated_at=timezone.now(),
+		)
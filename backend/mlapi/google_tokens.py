@@ -0,0 +1,161 @@
+import base64
+import json
+import re
+import threading
+import time
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from django.conf import settings
+
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class TokenError(Exception):
+	"""Raised when an ID token is malformed, badly signed or has invalid claims."""
+
+
+def _b64decode(segment):
+	return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64int(segment):
+	return int.from_bytes(_b64decode(segment), "big")
+
+
+def _parse_jwks(jwks):
+	keys = {}
+	for key in jwks.get("keys", []):
+		if key.get("kty") == "RSA" and key.get("kid"):
+			numbers = rsa.RSAPublicNumbers(_b64int(key["e"]), _b64int(key["n"]))
+			keys[key["kid"]] = numbers.public_key()
+	return keys
+
+
+class StaticKeySource:
+	"""A fixed JWKS document, e.g. a local key set for tests or air-gapped setups."""
+
+	def __init__(self, jwks):
+		self.keys = _parse_jwks(jwks)
+
+	@classmethod
+	def from_file(cls, path):
+		with open(path, "r", encoding="utf-8") as handle:
+			return cls(json.load(handle))
+
+	def get(self, kid):
+		return self.keys.get(kid)
+
+
+class JWKSKeySource:
+	"""Google's signing keys, fetched over HTTP and cached for their ``max-age``.
+
+	An unknown ``kid`` (Google has rotated keys) triggers a refetch, at most
+	once per ``min_refresh`` seconds.
+	"""
+
+	def __init__(self, url, default_max_age=3600, min_refresh=30.0):
+		self.url = url
+		self.default_max_age = default_max_age
+		self.min_refresh = min_refresh
+		self.keys = {}
+		self._expires_at = 0.0
+		self._fetched_at = 0.0
+		self._lock = threading.Lock()
+
+	def _max_age(self, response):
+		match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+		max_age = int(match.group(1)) if match else self.default_max_age
+		age = response.headers.get("Age", "")
+		return max(max_age - (int(age) if age.isdigit() else 0), 0)
+
+	def _refresh(self):
+		from . import upstream
+
+		response = upstream.request_sync("google_oauth", "GET", self.url)
+		self.keys = _parse_jwks(response.json())
+		self._fetched_at = time.monotonic()
+		self._expires_at = self._fetched_at + self._max_age(response)
+
+	def get(self, kid):
+		now = time.monotonic()
+		key = self.keys.get(kid)
+		if key is not None and now < self._expires_at:
+			return key
+
+		with self._lock:
+			key = self.keys.get(kid)
+			expired = time.monotonic() >= self._expires_at
+			if expired or (key is None and time.monotonic() - self._fetched_at >= self.min_refresh):
+				self._refresh()
+				key = self.keys.get(kid)
+		return key
+
+
+def verify_id_token(token, audience, key_source, issuers=GOOGLE_ISSUERS, leeway=60):
+	"""Verify an RS256 ID token's signature and ``aud``/``iss``/``exp``; return its claims."""
+	try:
+		header_segment, payload_segment, signature_segment = token.split(".")
+		header = json.loads(_b64decode(header_segment))
+		claims = json.loads(_b64decode(payload_segment))
+		signature = _b64decode(signature_segment)
+	except (ValueError, TypeError) as exc:
+		raise TokenError("Malformed token") from exc
+	if not isinstance(header, dict) or not isinstance(claims, dict):
+		raise TokenError("Malformed token")
+
+	if header.get("alg") != "RS256":
+		raise TokenError("Unsupported token algorithm")
+
+	key = key_source.get(header.get("kid"))
+	if key is None:
+		raise TokenError("Unknown signing key")
+
+	signed = f"{header_segment}.{payload_segment}".encode("ascii")
+	try:
+		key.verify(signature, signed, padding.PKCS1v15(), hashes.SHA256())
+	except InvalidSignature as exc:
+		raise TokenError("Invalid token signature") from exc
+
+	aud = claims.get("aud")
+	if audience not in (aud if isinstance(aud, list) else [aud]):
+		raise TokenError("Token audience mismatch")
+	if claims.get("iss") not in issuers:
+		raise TokenError("Invalid token issuer")
+	try:
+		expires_at = float(claims["exp"])
+	except (KeyError, TypeError, ValueError) as exc:
+		raise TokenError("Token has no expiry") from exc
+	if expires_at + leeway < time.time():
+		raise TokenError("Token has expired")
+
+	return claims
+
+
+_KEY_SOURCE = None
+_KEY_SOURCE_LOCK = threading.Lock()
+
+
+def get_key_source():
+	"""Return the process-wide key source: GOOGLE_JWKS_FILE if set, else GOOGLE_JWKS_URL."""
+	global _KEY_SOURCE
+	if _KEY_SOURCE is None:
+		with _KEY_SOURCE_LOCK:
+			if _KEY_SOURCE is None:
+				jwks_file = getattr(settings, "GOOGLE_JWKS_FILE", "")
+				if jwks_file:
+					_KEY_SOURCE = StaticKeySource.from_file(jwks_file)
+				else:
+					_KEY_SOURCE = JWKSKeySource(settings.GOOGLE_JWKS_URL)
+	return _KEY_SOURCE
+
+
+def set_key_source(source):
+	"""Replace the key source (``None`` resets to the configured default)."""
+	global _KEY_SOURCE
+	with _KEY_SOURCE_LOCK:
+		_KEY_SOURCE = source
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+from .batching import BatcherClosed, get_batcher
+from .registry import ModelUnavailable, get_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceError(RuntimeError):
+	"""Raised in a Django worker when the shared inference process fails a call."""
+
+
+def predict_batch(model, batch):
+	import numpy as np
+
+	model_inputs = getattr(model, "inputs", None)
+	if isinstance(model_inputs, (list, tuple)) and len(model_inputs) > 1:
+		model_payload = [batch for _ in range(len(model_inputs))]
+	else:
+		model_payload = batch
+
+	preds = model.predict(model_payload)
+	if isinstance(preds, (list, tuple)):
+		preds = preds[0]
+	return np.asarray(preds).reshape(len(batch), -1)
+
+
+def predict_local(name, array):
+	"""Run one preprocessed image through model ``name`` in this process."""
+	import numpy as np
+
+	model, _ = get_registry().get(name)
+	if not getattr(settings, "MLAPI_BATCHING_ENABLED", True):
+		with metrics.span("model_predict", model=name):
+			return predict_batch(model, np.expand_dims(array, axis=0))[0]
+
+	batcher = get_batcher(
+		name,
+		model,
+		predict_batch,
+		max_batch_size=getattr(settings, "MLAPI_BATCH_MAX_SIZE", 16),
+		max_wait_ms=getattr(settings, "MLAPI_BATCH_MAX_WAIT_MS", 5.0),
+	)
+	try:
+		return batcher.predict(array, timeout=getattr(settings, "MLAPI_BATCH_TIMEOUT", 30.0))
+	except BatcherClosed:
+		# The model was evicted between get() and submit(); run this one alone.
+		with metrics.span("model_predict", model=name):
+			return predict_batch(model, np.expand_dims(array, axis=0))[0]
+
+
+def predict_many_local(name, batch):
+	"""Run an already stacked batch through model ``name`` as one call.
+
+	This deliberately bypasses the micro-batcher: batch and job callers
+	already bring a full batch, and queueing it behind single requests would
+	only add latency to both.
+	"""
+	model, _ = get_registry().get(name)
+	with metrics.span("model_predict", model=name):
+		return predict_batch(model, batch)
+
+
+def _endpoint(address):
+	"""Return ``(address, authkey)`` for an ``MLAPI_INFERENCE_SOCKET`` value.
+
+	Messages are pickled, so anything that can authenticate can run code in
+	the inference process. A Unix socket path (created owner-only) uses a key
+	derived from ``SECRET_KEY``. ``"host:port"`` (TCP) is refused unless a
+	dedicated ``MLAPI_INFERENCE_AUTHKEY`` of at least 32 characters, distinct
+	from ``SECRET_KEY``, is configured.
+	"""
+	host, sep, port = address.rpartition(":")
+	if not (sep and host and port.isdigit()):
+		return address, _authkey(settings.SECRET_KEY)
+
+	secret = getattr(settings, "MLAPI_INFERENCE_AUTHKEY", "")
+	if len(secret) < 32 or secret == settings.SECRET_KEY:
+		raise ImproperlyConfigured(
+			"A TCP MLAPI_INFERENCE_SOCKET needs MLAPI_INFERENCE_AUTHKEY set to a dedicated "
+			"secret of at least 32 characters; use a Unix socket path otherwise"
+		)
+	return (host, int(port)), _authkey(secret)
+
+
+def _authkey(secret):
+	return hashlib.sha256(f"mlapi-inference:{secret}".encode("utf-8")).digest()
+
+
+class InferenceServer:
+	"""Holds the only copy of every model and serves predictions over a socket.
+
+	Each client connection gets its own thread, so requests from different
+	Django workers still meet in the per-model micro-batcher.
+	"""
+
+	def __init__(self, address, authkey=None):
+		self.address, default_authkey = _endpoint(address)
+		self.authkey = authkey or default_authkey
+		self._listener = None
+
+	def serve_forever(self):
+		self._listener = Listener(self.address, authkey=self.authkey)
+		if isinstance(self.address, str):
+			os.chmod(self.address, 0o600)
+		logger.info("Inference server listening on %s", self.address)
+		try:
+			while True:
+				try:
+					conn = self._listener.accept()
+				except OSError:
+					break
+				except Exception as exc:
+					logger.warning("Rejected inference client: %s", exc)
+					continue
+				threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+		finally:
+			self.close()
+
+	def close(self):
+		if self._listener is not None:
+			self._listener.close()
+			self._listener = None
+
+	def _handle(self, conn):
+		with conn:
+			while True:
+				try:
+					message = conn.recv()
+				except (EOFError, OSError):
+					return
+
+				try:
+					conn.send(("ok", self._dispatch(message)))
+				except (EOFError, OSError):
+					return
+				except Exception as exc:
+					conn.send(("error", type(exc).__name__, str(exc), getattr(exc, "retry_after", None)))
+
+	def _dispatch(self, message):
+		command, *args = message
+		if command == "input_size":
+			_, input_size = get_registry().get(args[0])
+			return input_size
+		if command == "predict":
+			return predict_local(args[0], args[1])
+		if command == "predict_many":
+			return predict_many_local(args[0], args[1])
+		raise ValueError(f"Unknown inference command '{command}'")
+
+
+class InferenceClient:
+	"""Pooled connections from a Django worker to the shared inference server."""
+
+	def __init__(self, address, authkey=None, pool_size=8):
+		self.address, default_authkey = _endpoint(address)
+		self.authkey = authkey or default_authkey
+		self._pool = queue.LifoQueue(maxsize=max(int(pool_size), 1))
+		self._input_sizes = {}
+
+	def _call(self, *message):
+		try:
+			conn = self._pool.get_nowait()
+		except queue.Empty:
+			conn = Client(self.address, authkey=self.authkey)
+
+		try:
+			with metrics.span("inference_rpc", op=message[0]):
+				conn.send(message)
+				reply = conn.recv()
+		except Exception:
+			conn.close()
+			raise
+
+		try:
+			self._pool.put_nowait(conn)
+		except queue.Full:
+			conn.close()
+
+		if reply[0] == "ok":
+			return reply[1]
+
+		_, error_type, error_message, *extra = reply
+		if error_type == "KeyError":
+			raise KeyError(error_message)
+		if error_type == "FileNotFoundError":
+			raise FileNotFoundError(error_message)
+		if error_type == "ModelUnavailable":
+			raise ModelUnavailable(error_message, retry_after=extra[0] if extra else None)
+		raise InferenceError(f"{error_type}: {error_message}")
+
+	def input_size(self, name):
+		size = self._input_sizes.get(name)
+		if size is None:
+			size = tuple(self._call("input_size", name))
+			self._input_sizes[name] = size
+		return size
+
+	def predict(self, name, array):
+		return self._call("predict", name, array)
+
+	def predict_many(self, name, batch):
+		return self._call("predict_many", name, batch)
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_inference_client():
+	"""Return the shared client when MLAPI_INFERENCE_SOCKET is set, else ``None``."""
+	global _CLIENT
+	address = getattr(settings, "MLAPI_INFERENCE_SOCKET", "")
+	if not address:
+		return None
+
+	if _CLIENT is None:
+		with _CLIENT_LOCK:
+			if _CLIENT is None:
+				_CLIENT = InferenceClient(
+					address,
+					pool_size=getattr(settings, "MLAPI_INFERENCE_POOL_SIZE", 8),
+				)
+	return _CLIENT
+
+
+def model_input_size(name):
+	client = get_inference_client()
+	if client is not None:
+		return client.input_size(name)
+	_, input_size = get_registry().get(name)
+	return input_size
+
+
+def predict(name, array):
+	client = get_inference_client()
+	if client is not None:
+		return client.predict(name, array)
+	return predict_local(name, array)
+
+
+def predict_many(name, batch):
+	client = get_inference_client()
+	if client is not None:
+		return client.predict_many(name, batch)
+	return predict_many_local(name, batch)
@@ -0,0 +1,256 @@
+import logging
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import inference, metrics, predictions, upstream
+from .models import PredictionJob, PredictionJobImage
+from .registry import get_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+def check_callback_url(url):
+	"""Return why ``url`` may not be used as a job callback, or ``None``.
+
+	Only plain http(s) URLs on ``MLAPI_JOB_CALLBACK_HOSTS`` are allowed, so a
+	job cannot make the worker call arbitrary hosts.
+	"""
+	parts = urlsplit(url)
+	if parts.scheme not in ("http", "https") or not parts.hostname:
+		return "callback_url must be an http(s) URL"
+	allowed = getattr(settings, "MLAPI_JOB_CALLBACK_HOSTS", ["localhost", "127.0.0.1", "::1"])
+	if parts.hostname.lower() not in allowed:
+		return f"callback_url host must be one of: {', '.join(allowed)}"
+	return None
+
+
+def submit(spec, uploads, options, callback_url=""):
+	"""Queue ``uploads`` (a list of ``(name, bytes)``) for ``spec``; returns the job."""
+	prediction_format, top_k = options
+	with transaction.atomic():
+		job = PredictionJob.objects.create(
+			model_name=spec.name,
+			prediction_format=prediction_format,
+			top_k=top_k,
+			callback_url=callback_url,
+			available_at=timezone.now(),
+		)
+		PredictionJobImage.objects.bulk_create(
+			[
+				PredictionJobImage(job=job, position=position, name=name[:255], data=data)
+				for position, (name, data) in enumerate(uploads)
+			],
+			batch_size=100,
+		)
+	metrics.inc("mlapi_jobs_submitted_total", help="Prediction jobs queued.", model=spec.name)
+	return job
+
+
+def job_document(job):
+	"""The job as served by ``GET /api/jobs/<id>/`` and sent to its callback."""
+	document = {
+		"id": str(job.id),
+		"model": job.model_name,
+		"status": job.status,
+		"attempts": job.attempts,
+		"created_at": job.created_at.isoformat(),
+		"started_at": job.started_at.isoformat() if job.started_at else None,
+		"finished_at": job.finished_at.isoformat() if job.finished_at else None,
+	}
+	if job.error:
+		document["error"] = job.error
+	if job.status != PredictionJob.DONE:
+		document["images"] = job.images.count()
+		return document
+
+	spec = get_registry().spec(job.model_name)
+	results = []
+	for image in job.images.only("position", "name", "result"):
+		result = image.result or {"error": "No result"}
+		if "error" not in result and spec is not None:
+			result = predictions.format_prediction(spec, result, job.prediction_format, job.top_k)
+		results.append({"index": image.position, "name": image.name, **result})
+	document["images"] = len(results)
+	document["results"] = results
+	return document
+
+
+def claim(limit, lease):
+	"""Mark up to ``limit`` due jobs for one model as running and return them.
+
+	Jobs are taken oldest first, all for the model of the oldest one so they
+	can share model calls. Rows locked by another worker are skipped where
+	the database supports it; SQLite serialises the claim through its write
+	lock instead.
+	"""
+	now = timezone.now()
+	with transaction.atomic():
+		due = PredictionJob.objects.select_for_update(skip_locked=True).filter(
+			status=PredictionJob.QUEUED, available_at__lte=now
+		).order_by("available_at", "created_at")
+		head = due.values_list("model_name", flat=True).first()
+		if head is None:
+			return []
+		ids = list(due.filter(model_name=head).values_list("pk", flat=True)[:limit])
+		PredictionJob.objects.filter(pk__in=ids).update(
+			status=PredictionJob.RUNNING,
+			attempts=F("attempts") + 1,
+			started_at=now,
+			lease_until=now + timedelta(seconds=lease),
+		)
+	return list(PredictionJob.objects.filter(pk__in=ids).order_by("created_at"))
+
+
+def _finish(jobs, status, error=""):
+	now = timezone.now()
+	for job in jobs:
+		job.status = status
+		job.error = error
+		job.finished_at = now
+		job.lease_until = None
+	PredictionJob.objects.bulk_update(jobs, ["status", "error", "finished_at", "lease_until"])
+	metrics.inc(
+		"mlapi_jobs_finished_total",
+		amount=len(jobs),
+		help="Prediction jobs finished, by model and status.",
+		model=jobs[0].model_name,
+		status=status,
+	)
+
+
+def _retry_later(jobs, error):
+	"""Requeue ``jobs`` after the error's retry hint, or fail those out of attempts."""
+	message = f"{type(error).__name__}: {error}"
+	max_attempts = getattr(settings, "MLAPI_JOB_MAX_ATTEMPTS", 3)
+	exhausted = [job for job in jobs if job.attempts >= max_attempts]
+	retry = [job for job in jobs if job.attempts < max_attempts]
+	if exhausted:
+		_finish(exhausted, PredictionJob.FAILED, message)
+		_send_callbacks(exhausted)
+	if retry:
+		available_at = timezone.now() + timedelta(seconds=predictions.retry_after(error))
+		PredictionJob.objects.filter(pk__in=[job.pk for job in retry]).update(
+			status=PredictionJob.QUEUED, error=message, available_at=available_at, lease_until=None
+		)
+		logger.warning("Requeued %d %s job(s): %s", len(retry), jobs[0].model_name, message)
+
+
+def _send_callbacks(jobs):
+	for job in jobs:
+		if not job.callback_url:
+			continue
+		try:
+			response = upstream.request_sync("job_callback", "POST", job.callback_url, json=job_document(job))
+			outcome = str(response.status_code)
+		except Exception as error:
+			logger.warning("Callback for job %s failed: %s", job.id, error)
+			outcome = f"{type(error).__name__}: {error}"[:100]
+		PredictionJob.objects.filter(pk=job.pk).update(callback_status=outcome)
+
+
+def run(jobs):
+	"""Classify every image of the claimed ``jobs`` (all for one model) and finish them.
+
+	With fallbacks off, a model that cannot be loaded or fails mid-batch sends
+	the jobs back through :func:`_retry_later` instead of finishing them with
+	per-image errors.
+	"""
+	spec = get_registry().spec(jobs[0].model_name)
+	if spec is None:
+		_finish(jobs, PredictionJob.FAILED, f"Unknown model '{jobs[0].model_name}'")
+		_send_callbacks(jobs)
+		return
+
+	try:
+		size = inference.model_input_size(spec.name)
+		size_error = None
+	except Exception as error:
+		if not getattr(settings, "MLAPI_FALLBACK_PREDICTIONS", True):
+			_retry_later(jobs, error)
+			return
+		size, size_error = None, error
+
+	# Read and decode a few model batches' worth of images at a time, so a
+	# claim of large jobs never holds all of their bytes in memory at once.
+	images = list(
+		PredictionJobImage.objects.filter(job__in=jobs).order_by("job_id", "position").defer("data")
+	)
+	window = getattr(settings, "MLAPI_BATCH_MAX_SIZE", 16) * 4
+	with metrics.span("job_batch", model=spec.name):
+		try:
+			for offset in range(0, len(images), window):
+				part = images[offset:offset + window]
+				pks = [image.pk for image in part]
+				data = dict(PredictionJobImage.objects.filter(pk__in=pks).values_list("pk", "data"))
+				uploads = [(image.name, bytes(data[image.pk])) for image in part]
+				classified = predictions.classify_uploads(spec, uploads, size, size_error, raise_model_errors=True)
+				for index, result in classified:
+					part[index].result = result
+				PredictionJobImage.objects.bulk_update(part, ["result"])
+		except Exception as error:
+			_retry_later(jobs, error)
+			return
+	# Keep the uploads until every image is done, so a retried job still has them.
+	PredictionJobImage.objects.filter(job__in=jobs).update(data=b"")
+	_finish(jobs, PredictionJob.DONE)
+	_send_callbacks(jobs)
+
+
+def requeue_expired():
+	"""Put running jobs whose worker's lease ran out back in the queue."""
+	now = timezone.now()
+	expired = list(PredictionJob.objects.filter(status=PredictionJob.RUNNING, lease_until__lt=now))
+	if expired:
+		_retry_later(expired, RuntimeError("Worker lease expired"))
+	return len(expired)
+
+
+def purge_finished():
+	"""Delete finished jobs older than ``MLAPI_JOB_RETENTION`` seconds (0 keeps them)."""
+	retention = getattr(settings, "MLAPI_JOB_RETENTION", 86400)
+	if retention <= 0:
+		return 0
+	cutoff = timezone.now() - timedelta(seconds=retention)
+	deleted, _ = PredictionJob.objects.filter(
+		status__in=(PredictionJob.DONE, PredictionJob.FAILED), finished_at__lt=cutoff
+	).delete()
+	return deleted
+
+
+def work(batch_size=None, poll_interval=None, lease=None, once=False):
+	"""Drain the queue until interrupted (or until it is empty, with ``once``).
+
+	Each round claims up to ``batch_size`` jobs for one model and sends their
+	images through the model ``MLAPI_BATCH_MAX_SIZE`` at a time. Returns the
+	number of jobs handled.
+	"""
+	batch_size = batch_size or getattr(settings, "MLAPI_JOB_BATCH_SIZE", 8)
+	poll_interval = poll_interval if poll_interval is not None else getattr(settings, "MLAPI_JOB_POLL_INTERVAL", 1.0)
+	lease = lease or getattr(settings, "MLAPI_JOB_LEASE", 600)
+	handled = 0
+	next_sweep = 0.0
+	while True:
+		close_old_connections()
+		if time.monotonic() >= next_sweep:
+			requeue_expired()
+			purge_finished()
+			next_sweep = time.monotonic() + 60
+		jobs = claim(batch_size, lease)
+		if not jobs:
+			if once:
+				return handled
+			time.sleep(poll_interval)
+			continue
+		try:
+			run(jobs)
+		except Exception as error:
+			logger.exception("Job batch for %s failed", jobs[0].model_name)
+			_retry_later(jobs, error)
+		handled += len(jobs)
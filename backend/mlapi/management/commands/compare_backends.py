@@ -0,0 +1,142 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mlapi.inference import predict_batch
+from mlapi.management.commands.convert_models import iter_images, keras_spec
+from mlapi.preprocessing import decode_image
+from mlapi.registry import (
+	TFLITE_VARIANTS,
+	TFLiteModel,
+	_resolve_input_size,
+	get_registry,
+	load_model_file,
+)
+
+
+class Command(BaseCommand):
+	help = (
+		"Compare top-1 accuracy, agreement with Keras, latency and size of each "
+		"backend per model on a labelled image set laid out as "
+		"<eval-dir>/<model>/<class name>/<image>."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("eval_dir")
+		parser.add_argument("models", nargs="*", help="Model names (default: all).")
+		parser.add_argument(
+			"--variants",
+			nargs="+",
+			choices=("keras",) + TFLITE_VARIANTS,
+			default=["keras", "float32", "float16", "int8"],
+		)
+		parser.add_argument("--limit", type=int, default=50, help="Images per class.")
+		parser.add_argument("--json", dest="json_path", help="Also write the report here.")
+
+	def _samples(self, spec, size, directory, limit):
+		lookup = {name.lower(): index for index, name in enumerate(spec.class_names)}
+		samples = []
+		for class_dir in sorted(path for path in directory.iterdir() if path.is_dir()):
+			index = lookup.get(class_dir.name.lower())
+			if index is None:
+				self.stdout.write(self.style.WARNING(f"{spec.name}: skipping unknown class '{class_dir.name}'"))
+				continue
+			for path in list(iter_images(class_dir))[:limit]:
+				with path.open("rb") as handle:
+					samples.append((decode_image(handle, size, spec), index))
+		return samples
+
+	def _load(self, spec, variant):
+		if variant == "keras":
+			return load_model_file(keras_spec(spec))[0], next(
+				(path for path in keras_spec(spec).model_paths() if path.exists()), None
+			)
+		path = spec.tflite_path(variant)
+		if not path.exists():
+			raise FileNotFoundError(f"{path.name} not found; run manage.py convert_models")
+		return TFLiteModel(path), path
+
+	def _evaluate(self, spec, variant, samples, reference):
+		import numpy as np
+
+		started = time.perf_counter()
+		model, path = self._load(spec, variant)
+		load_seconds = time.perf_counter() - started
+
+		predict_batch(model, samples[0][0][None, ...])  # warm-up
+		latencies = []
+		labels = []
+		for array, _ in samples:
+			started = time.perf_counter()
+			preds = predict_batch(model, array[None, ...])
+			latencies.append(time.perf_counter() - started)
+			labels.append(int(np.argmax(preds[0])))
+
+		latencies.sort()
+		correct = sum(label == truth for label, (_, truth) in zip(labels, samples))
+		agreement = None
+		if reference is not None:
+			agreement = sum(a == b for a, b in zip(labels, reference)) / len(labels)
+		return labels, {
+			"variant": variant,
+			"accuracy": correct / len(samples),
+			"agreement_with_keras": agreement,
+			"p50_ms": latencies[len(latencies) // 2] * 1000,
+			"p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+			"load_seconds": load_seconds,
+			"size_mb": path.stat().st_size / 1e6 if path is not None else None,
+		}
+
+	def handle(self, *args, **options):
+		registry = get_registry()
+		names = options["models"] or registry.names()
+		eval_dir = Path(options["eval_dir"])
+		report = {}
+
+		for name in names:
+			spec = registry.spec(name)
+			if spec is None:
+				raise CommandError(f"Unknown model '{name}'")
+			if not (eval_dir / name).is_dir():
+				self.stdout.write(self.style.WARNING(f"{name}: no {eval_dir / name}, skipped"))
+				continue
+
+			try:
+				size = spec.input_size or _resolve_input_size(self._load(spec, options["variants"][0])[0])
+			except Exception as error:
+				self.stdout.write(self.style.ERROR(f"{name}: {error}"))
+				continue
+			samples = self._samples(spec, size, eval_dir / name, options["limit"])
+			if not samples:
+				self.stdout.write(self.style.WARNING(f"{name}: no labelled images, skipped"))
+				continue
+
+			self.stdout.write(f"{name}: {len(samples)} images")
+			reference = None
+			rows = []
+			for variant in options["variants"]:
+				try:
+					labels, row = self._evaluate(spec, variant, samples, reference)
+				except Exception as error:
+					self.stdout.write(self.style.ERROR(f"  {variant}: {error}"))
+					continue
+				if variant == "keras":
+					reference = labels
+				rows.append(row)
+				agreement = row["agreement_with_keras"]
+				size_mb = row["size_mb"]
+				self.stdout.write(
+					f"  {variant:<8} acc {row['accuracy']:.3f}"
+					f"  agree {'-' if agreement is None else f'{agreement:.3f}'}"
+					f"  p50 {row['p50_ms']:.1f} ms  p95 {row['p95_ms']:.1f} ms"
+					f"  load {row['load_seconds']:.2f}s"
+					f"  size {'-' if size_mb is None else f'{size_mb:.1f} MB'}"
+				)
+			report[name] = rows
+
+		if options["json_path"]:
+			Path(options["json_path"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+		if not report:
+			raise CommandError("Nothing was evaluated")
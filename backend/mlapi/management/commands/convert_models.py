@@ -0,0 +1,118 @@
+import copy
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mlapi.preprocessing import decode_image
+from mlapi.registry import TFLITE_VARIANTS, get_registry, load_model_file
+
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
+
+
+def keras_spec(spec):
+	"""Copy of ``spec`` pointing at the full Keras model, whatever the manifest says."""
+	keras = copy.copy(spec)
+	keras.backend = "keras"
+	return keras
+
+
+def iter_images(directory):
+	for path in sorted(Path(directory).rglob("*")):
+		if path.suffix.lower() in IMAGE_SUFFIXES:
+			yield path
+
+
+class Command(BaseCommand):
+	help = (
+		"Convert the Keras models to TFLite (float32, float16 and int8 post-training "
+		"quantized) next to the originals, for models with \"backend\": \"tflite\"."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument("models", nargs="*", help="Model names (default: all).")
+		parser.add_argument(
+			"--variants",
+			nargs="+",
+			choices=TFLITE_VARIANTS,
+			default=["float16", "int8"],
+		)
+		parser.add_argument(
+			"--calibration-dir",
+			help="Images for int8 calibration; <dir>/<model>/ is used when it exists.",
+		)
+		parser.add_argument("--calibration-samples", type=int, default=200)
+
+	def _representative(self, spec, size, options):
+		import numpy as np
+
+		width, height = size
+		directory = options["calibration_dir"]
+		if directory and (Path(directory) / spec.name).is_dir():
+			directory = Path(directory) / spec.name
+
+		paths = list(iter_images(directory))[: options["calibration_samples"]] if directory else []
+		if not paths:
+			self.stdout.write(self.style.WARNING(
+				f"{spec.name}: no calibration images, calibrating int8 on noise; "
+				"expect a larger accuracy drop"
+			))
+
+		def dataset():
+			if paths:
+				for path in paths:
+					with path.open("rb") as handle:
+						yield [decode_image(handle, size, spec)[None, ...]]
+				return
+			rng = np.random.default_rng(0)
+			for _ in range(min(options["calibration_samples"], 50)):
+				pixels = rng.uniform(0, 255, (height, width, 3)).astype(np.float32)
+				yield [spec.preprocess(pixels)[None, ...]]
+
+		return dataset
+
+	def handle(self, *args, **options):
+		import tensorflow as tf
+
+		registry = get_registry()
+		names = options["models"] or registry.names()
+		unknown = [name for name in names if registry.spec(name) is None]
+		if unknown:
+			raise CommandError(f"Unknown models: {', '.join(unknown)}")
+
+		failed = []
+		for name in names:
+			spec = registry.spec(name)
+			try:
+				model, size = load_model_file(keras_spec(spec))
+			except Exception as error:
+				failed.append(name)
+				self.stdout.write(self.style.ERROR(f"{name}: {error}"))
+				continue
+
+			for variant in options["variants"]:
+				converter = tf.lite.TFLiteConverter.from_keras_model(model)
+				if variant == "float16":
+					converter.optimizations = [tf.lite.Optimize.DEFAULT]
+					converter.target_spec.supported_types = [tf.float16]
+				elif variant == "int8":
+					# Weights and activations in int8; float32 input/output keeps the
+					# serving code and preprocessing unchanged.
+					converter.optimizations = [tf.lite.Optimize.DEFAULT]
+					converter.representative_dataset = self._representative(spec, size, options)
+
+				try:
+					data = converter.convert()
+				except Exception as error:
+					failed.append(f"{name}/{variant}")
+					self.stdout.write(self.style.ERROR(f"{name} {variant}: {error}"))
+					continue
+
+				path = spec.tflite_path(variant)
+				path.write_bytes(data)
+				self.stdout.write(self.style.SUCCESS(
+					f"{name} {variant}: {path.name} ({len(data) / 1e6:.1f} MB)"
+				))
+
+		if failed:
+			raise CommandError(f"Failed to convert: {', '.join(failed)}")
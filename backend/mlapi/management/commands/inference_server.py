@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from mlapi.inference import InferenceServer
+from mlapi.warmup import preload_models
+
+
+class Command(BaseCommand):
+	help = (
+		"Run the shared inference process. Django workers started with "
+		"MLAPI_INFERENCE_SOCKET pointing at the same address send their "
+		"predictions here instead of loading their own copy of each model."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--address",
+			default=getattr(settings, "MLAPI_INFERENCE_SOCKET", ""),
+			help="Unix socket path or host:port (defaults to MLAPI_INFERENCE_SOCKET).",
+		)
+		parser.add_argument(
+			"--no-preload",
+			action="store_true",
+			help="Load models lazily on their first request instead of at startup.",
+		)
+
+	def handle(self, *args, **options):
+		address = options["address"]
+		if not address:
+			raise CommandError("Set MLAPI_INFERENCE_SOCKET or pass --address")
+		try:
+			server = InferenceServer(address)
+		except ImproperlyConfigured as error:
+			raise CommandError(str(error))
+
+		if not options["no_preload"]:
+			for name, entry in preload_models().items():
+				status = f"loaded in {entry['load_seconds']:.3f}s" if entry["ok"] else entry["error"]
+				self.stdout.write(f"{name}: {status}")
+
+		self.stdout.write(self.style.SUCCESS(f"Serving inference on {address}"))
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			server.close()
@@ -0,0 +1,82 @@
+import json
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from mlapi.models import UserCredential
+from mlapi.views import login
+
+
+class _Rollback(Exception):
+	pass
+
+
+class Command(BaseCommand):
+	help = "Measure queries and latency per /api/login/ call for each credential source."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--iterations", type=int, default=50)
+
+	def handle(self, *args, **options):
+		iterations = max(options["iterations"], 1)
+		password = "benchmark-password"
+		factory = RequestFactory()
+
+		cases = (
+			("credential", "bench.credential@example.com", password),
+			("django user", "Bench.User@Example.com", password),
+			("unknown", "nobody@example.com", password),
+		)
+
+		results = []
+		try:
+			# Cheap hashes keep the numbers about the lookup, not the hasher; as the
+			# preferred hasher md5 also never triggers a rehash write. The auth
+			# rate limit would otherwise reject most of the iterations.
+			with override_settings(
+				PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+				MLAPI_ADMISSION_ENABLED=False,
+			), transaction.atomic():
+				password_hash = make_password(password)
+				UserCredential.objects.create(
+					email="bench.credential@example.com",
+					password_hash=password_hash,
+				)
+				User.objects.create(
+					username="bench.user@example.com",
+					email="bench.user@example.com",
+					password=password_hash,
+				)
+
+				for label, email, secret in cases:
+					body = json.dumps({"email": email, "password": secret})
+					queries = 0
+					started = time.perf_counter()
+					for _ in range(iterations):
+						request = factory.post("/api/login/", body, content_type="application/json")
+						with CaptureQueriesContext(connection) as captured:
+							response = login(request)
+						queries += len(captured)
+					elapsed = time.perf_counter() - started
+					results.append((label, response.status_code, queries / iterations, elapsed / iterations))
+
+				raise _Rollback
+		except _Rollback:
+			pass
+
+		failed = False
+		for label, status, queries, seconds in results:
+			expected = 401 if label == "unknown" else 200
+			style = self.style.SUCCESS if status == expected else self.style.ERROR
+			failed = failed or status != expected
+			self.stdout.write(style(
+				f"{label}: HTTP {status}, {queries:.1f} queries/login, {seconds * 1000:.2f} ms/login"
+			))
+
+		if failed:
+			raise CommandError("Unexpected login status")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mlapi.warmup import preload_models
+
+
+class Command(BaseCommand):
+	help = "Load every registered model, run a warm-up batch and report timings."
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--no-warmup",
+			action="store_true",
+			help="Only load the models, skip the dummy warm-up batch.",
+		)
+
+	def handle(self, *args, **options):
+		report = preload_models(warmup=not options["no_warmup"])
+
+		failed = []
+		for name, entry in report.items():
+			if entry["ok"]:
+				warmup = entry["warmup_seconds"]
+				self.stdout.write(self.style.SUCCESS(
+					f"{name}: loaded in {entry['load_seconds']:.3f}s"
+					+ (f", warm-up {warmup:.3f}s" if warmup is not None else "")
+				))
+			else:
+				failed.append(name)
+				self.stdout.write(self.style.ERROR(f"{name}: {entry['error']}"))
+
+		if failed:
+			raise CommandError(f"Failed to preload: {', '.join(failed)}")
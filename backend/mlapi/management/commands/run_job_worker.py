@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mlapi import jobs
+from mlapi.warmup import preload_models
+
+
+class Command(BaseCommand):
+	help = (
+		"Process queued prediction jobs (POST /api/jobs/). Run one or more of "
+		"these next to the web workers so large and slow requests do not tie "
+		"up request workers; with MLAPI_INFERENCE_SOCKET set they share the "
+		"inference process instead of loading their own models."
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--batch-size",
+			type=int,
+			default=getattr(settings, "MLAPI_JOB_BATCH_SIZE", 8),
+			help="Jobs for the same model claimed and classified together (defaults to MLAPI_JOB_BATCH_SIZE).",
+		)
+		parser.add_argument(
+			"--poll-interval",
+			type=float,
+			default=getattr(settings, "MLAPI_JOB_POLL_INTERVAL", 1.0),
+			help="Seconds to wait when the queue is empty (defaults to MLAPI_JOB_POLL_INTERVAL).",
+		)
+		parser.add_argument(
+			"--once",
+			action="store_true",
+			help="Exit once the queue is empty instead of polling.",
+		)
+		parser.add_argument(
+			"--no-preload",
+			action="store_true",
+			help="Load models lazily on their first job instead of at startup.",
+		)
+
+	def handle(self, *args, **options):
+		if not options["no_preload"] and not getattr(settings, "MLAPI_INFERENCE_SOCKET", ""):
+			for name, entry in preload_models().items():
+				status = f"loaded in {entry['load_seconds']:.3f}s" if entry["ok"] else entry["error"]
+				self.stdout.write(f"{name}: {status}")
+
+		self.stdout.write(self.style.SUCCESS("Processing prediction jobs"))
+		try:
+			handled = jobs.work(
+				batch_size=options["batch_size"],
+				poll_interval=options["poll_interval"],
+				once=options["once"],
+			)
+		except KeyboardInterrupt:
+			return
+		self.stdout.write(f"Handled {handled} job(s)")
@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from mlapi.models import UserCredential
+from mlapi.views import signup
+
+
+class Command(BaseCommand):
+	help = "Run concurrent /api/signup/ calls against the configured database and report throughput."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--signups", type=int, default=500)
+		parser.add_argument("--concurrency", type=int, default=16)
+
+	def handle(self, *args, **options):
+		total = max(options["signups"], 1)
+		concurrency = max(options["concurrency"], 1)
+		prefix = f"loadtest-{uuid.uuid4().hex[:8]}-"
+		factory = RequestFactory()
+		statuses = {}
+		errors = {}
+		lock = threading.Lock()
+
+		def one(index):
+			body = json.dumps({"email": f"{prefix}{index}@example.com", "password": "load-test-password"})
+			request = factory.post("/api/signup/", body, content_type="application/json")
+			started = time.perf_counter()
+			try:
+				response = signup(request)
+			finally:
+				# Hand the connection back (or to the pool) like a request would.
+				connections.close_all()
+			elapsed = time.perf_counter() - started
+			with lock:
+				statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+				if response.status_code != 200:
+					message = json.loads(response.content).get("error", "")
+					errors[message] = errors.get(message, 0) + 1
+			return elapsed
+
+		vendor = connection.vendor
+		self.stdout.write(f"{vendor}: {total} signups, {concurrency} concurrent")
+
+		# Cheap hashes keep the numbers about the database, not the hasher, and
+		# every simulated signup comes from one client the auth rate limit would stop.
+		with override_settings(
+			PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+			MLAPI_ADMISSION_ENABLED=False,
+		):
+			started = time.perf_counter()
+			with ThreadPoolExecutor(max_workers=concurrency) as pool:
+				latencies = sorted(pool.map(one, range(total)))
+			elapsed = time.perf_counter() - started
+
+		UserCredential.objects.filter(email__startswith=prefix).delete()
+
+		p50 = latencies[len(latencies) // 2]
+		p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+		self.stdout.write(
+			f"{total / elapsed:.1f} signups/s, p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms"
+		)
+		for status, count in sorted(statuses.items()):
+			style = self.style.SUCCESS if status == 200 else self.style.ERROR
+			self.stdout.write(style(f"HTTP {status}: {count}"))
+		for message, count in errors.items():
+			self.stdout.write(self.style.ERROR(f"  {count}x {message}"))
+
+		if statuses.get(200, 0) != total:
+			raise CommandError("Some signups failed")
@@ -0,0 +1,282 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (
+	0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _enabled():
+	return getattr(settings, "MLAPI_METRICS_ENABLED", True)
+
+
+def _label_key(labels):
+	return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+	pairs = list(key) + list(extra)
+	if not pairs:
+		return ""
+	return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+	if value == math.inf:
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+	"""In-process counters and histograms rendered in Prometheus text format.
+
+	Each worker process keeps its own numbers; scrape every worker (or run a
+	single worker) to see the whole picture. ``collectors`` are called at
+	scrape time for values that already live elsewhere, such as cache stats.
+	"""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = tuple(buckets)
+		self._counters = {}
+		self._histograms = {}
+		self._help = {}
+		self._collectors = []
+		self._lock = threading.Lock()
+
+	def inc(self, name, amount=1, help="", **labels):
+		key = _label_key(labels)
+		with self._lock:
+			series = self._counters.setdefault(name, {})
+			series[key] = series.get(key, 0) + amount
+			if help:
+				self._help.setdefault(name, help)
+
+	def observe(self, name, value, help="", **labels):
+		key = _label_key(labels)
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			series = self._histograms.setdefault(name, {})
+			entry = series.get(key)
+			if entry is None:
+				entry = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+			if index < len(self.buckets):
+				entry["buckets"][index] += 1
+			entry["sum"] += value
+			entry["count"] += 1
+			if help:
+				self._help.setdefault(name, help)
+
+	def add_collector(self, collector):
+		"""Register ``collector()`` returning ``[(name, type, labels, value), ...]``."""
+		with self._lock:
+			if collector not in self._collectors:
+				self._collectors.append(collector)
+
+	def render(self):
+		with self._lock:
+			counters = {name: dict(series) for name, series in self._counters.items()}
+			histograms = {
+				name: {key: {**entry, "buckets": list(entry["buckets"])} for key, entry in series.items()}
+				for name, series in self._histograms.items()
+			}
+			collectors = list(self._collectors)
+			help_text = dict(self._help)
+
+		lines = []
+
+		def header(name, kind):
+			if name in help_text:
+				lines.append(f"# HELP {name} {help_text[name]}")
+			lines.append(f"# TYPE {name} {kind}")
+
+		for name in sorted(counters):
+			header(name, "counter")
+			for key, value in sorted(counters[name].items()):
+				lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+		for name in sorted(histograms):
+			header(name, "histogram")
+			for key, entry in sorted(histograms[name].items()):
+				cumulative = 0
+				for bound, count in zip(self.buckets, entry["buckets"]):
+					cumulative += count
+					lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+				lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {entry['count']}")
+				lines.append(f"{name}_sum{_format_labels(key)} {_format_value(entry['sum'])}")
+				lines.append(f"{name}_count{_format_labels(key)} {entry['count']}")
+
+		collected = {}
+		for collector in collectors:
+			try:
+				samples = collector()
+			except Exception:
+				continue
+			for name, kind, labels, value in samples:
+				collected.setdefault((name, kind), []).append((_label_key(labels), value))
+		for (name, kind), samples in sorted(collected.items()):
+			lines.append(f"# TYPE {name} {kind}")
+			for key, value in sorted(samples):
+				lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+		return "\n".join(lines) + "\n"
+
+
+_METRICS = MetricsRegistry()
+
+
+def get_metrics():
+	return _METRICS
+
+
+def inc(name, amount=1, help="", **labels):
+	if _enabled():
+		_METRICS.inc(name, amount, help=help, **labels)
+
+
+def observe(name, value, help="", **labels):
+	if _enabled():
+		_METRICS.observe(name, value, help=help, **labels)
+
+
+@contextmanager
+def span(name, **labels):
+	"""Time the block into the ``mlapi_<name>_seconds`` histogram.
+
+	Failed blocks are recorded too, with ``outcome="error"``.
+	"""
+	started = time.perf_counter()
+	outcome = "ok"
+	try:
+		yield
+	except BaseException:
+		outcome = "error"
+		raise
+	finally:
+		observe(f"mlapi_{name}_seconds", time.perf_counter() - started, outcome=outcome, **labels)
+
+
+def _time_query(execute, sql, params, many, context):
+	vendor = context["connection"].vendor
+	with span("db_query", vendor=vendor):
+		return execute(sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+	"""``connection_created`` receiver timing every query on the new connection."""
+	if _time_query not in connection.execute_wrappers:
+		connection.execute_wrappers.append(_time_query)
+
+
+def _cache_samples():
+	from .cache import get_prediction_cache
+	from .chat_cache import get_chat_cache
+	from .singleflight import _FLIGHTS
+
+	samples = []
+	for cache_name, cache in (("prediction", get_prediction_cache()), ("chat", get_chat_cache())):
+		if cache is None:
+			continue
+		for stat, value in cache.stats().items():
+			kind = "counter" if stat not in ("entries", "hit_rate") else "gauge"
+			name = f"mlapi_cache_{stat}" + ("_total" if kind == "counter" else "")
+			samples.append((name, kind, {"cache": cache_name}, value))
+	for flight_name, flight in list(_FLIGHTS.items()):
+		for stat, value in flight.stats().items():
+			kind = "gauge" if stat == "in_flight" else "counter"
+			name = f"mlapi_single_flight_{stat}" + ("_total" if kind == "counter" else "")
+			samples.append((name, kind, {"group": flight_name}, value))
+	return samples
+
+
+def _upstream_samples():
+	from .upstream import _BREAKERS
+
+	states = {"closed": 0, "half_open": 1, "open": 2}
+	return [
+		("mlapi_upstream_breaker_state", "gauge", {"target": target}, states.get(breaker.state, 0))
+		for target, breaker in list(_BREAKERS.items())
+	]
+
+
+def _model_samples():
+	from .registry import get_registry
+	from .warmup import readiness
+
+	samples = []
+	for name, health in get_registry().health().items():
+		samples.append(("mlapi_model_loaded", "gauge", {"model": name}, int(health["state"] == "loaded")))
+		samples.append(("mlapi_model_load_failures", "gauge", {"model": name}, health["failures"]))
+	is_ready, _ = readiness()
+	samples.append(("mlapi_ready", "gauge", {}, int(is_ready)))
+	return samples
+
+
+def _admission_samples():
+	from .admission import _CONTROLLERS
+
+	samples = []
+	for name, controller in list(_CONTROLLERS.items()):
+		for stat, value in controller.stats().items():
+			samples.append((f"mlapi_admission_{stat}", "gauge", {"controller": name}, value))
+	return samples
+
+
+_METRICS.add_collector(_cache_samples)
+_METRICS.add_collector(_upstream_samples)
+_METRICS.add_collector(_model_samples)
+_METRICS.add_collector(_admission_samples)
+
+
+class MetricsMiddleware:
+	"""Count requests and record latency per mlapi view, method and status.
+
+	Streaming responses are timed to the point the response object is
+	returned, i.e. time to first byte rather than the full stream.
+	"""
+
+	sync_capable = True
+	async_capable = True
+
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.is_async = iscoroutinefunction(get_response)
+		if self.is_async:
+			markcoroutinefunction(self)
+
+	def _record(self, request, response, started):
+		match = getattr(request, "resolver_match", None)
+		if match is None or not match.func.__module__.startswith("mlapi."):
+			return
+		labels = {"view": match.url_name, "method": request.method, "status": response.status_code}
+		inc("mlapi_requests_total", help="Requests handled, by view, method and status.", **labels)
+		observe(
+			"mlapi_request_duration_seconds",
+			time.perf_counter() - started,
+			help="Time from request to response object, by view, method and status.",
+			**labels,
+		)
+
+	def __call__(self, request):
+		if self.is_async:
+			return self.__acall__(request)
+		started = time.perf_counter()
+		response = self.get_response(request)
+		self._record(request, response, started)
+		return response
+
+	async def __acall__(self, request):
+		started = time.perf_counter()
+		response = await self.get_response(request)
+		self._record(request, response, started)
+		return response
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:23
+
+from collections import defaultdict
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+AUTH_USER_INDEXES = (
+    models.Index(Lower('username'), name='auth_user_username_lower'),
+    models.Index(Lower('email'), name='auth_user_email_lower'),
+)
+
+
+def normalize_emails(apps, schema_editor):
+    UserCredential = apps.get_model('mlapi', 'UserCredential')
+    by_normalized = defaultdict(list)
+    for credential in UserCredential.objects.all().only('pk', 'email'):
+        by_normalized[credential.email.strip().lower()].append(credential)
+
+    # Two accounts differing only by case or whitespace may belong to different
+    # people with different passwords; refuse to guess which one wins.
+    duplicates = {email: rows for email, rows in by_normalized.items() if len(rows) > 1}
+    if duplicates:
+        listing = '; '.join(
+            f"{email}: " + ', '.join(f"pk={row.pk} {row.email!r}" for row in rows)
+            for email, rows in sorted(duplicates.items())
+        )
+        raise RuntimeError(
+            'Cannot add the case-insensitive unique constraint on UserCredential.email: '
+            f'these accounts differ only by case or whitespace ({listing}). '
+            'Merge or delete the extra rows, then run migrate again.'
+        )
+
+    for normalized, (credential,) in by_normalized.items():
+        if normalized != credential.email:
+            UserCredential.objects.filter(pk=credential.pk).update(email=normalized)
+
+
+def add_auth_user_indexes(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for index in AUTH_USER_INDEXES:
+        schema_editor.add_index(User, index)
+
+
+def remove_auth_user_indexes(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    for index in AUTH_USER_INDEXES:
+        schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('mlapi', '0005_conversation_conversationturn'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usercredential',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='unique_usercredential_email_ci'),
+        ),
+        # Case-insensitive lookups on Django's own users for the login fallback.
+        migrations.RunPython(add_auth_user_indexes, remove_auth_user_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlapi', '0007_predictionjob_predictionjobimage'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='conversation',
+            old_name='summary',
+            new_name='digest',
+        ),
+        migrations.RenameField(
+            model_name='conversation',
+            old_name='summarized_through',
+            new_name='digested_through',
+        ),
+    ]
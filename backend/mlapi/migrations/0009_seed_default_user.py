@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import migrations
+
+
+def seed_default_user(apps, schema_editor):
+    # Replaces the per-request views._ensure_default_user(); runs once, and only
+    # when an account is configured through MLAPI_SEED_USER_EMAIL/_PASSWORD.
+    email = getattr(settings, 'MLAPI_SEED_USER_EMAIL', '').strip().lower()
+    password = getattr(settings, 'MLAPI_SEED_USER_PASSWORD', '')
+    if not email or not password:
+        return
+    UserCredential = apps.get_model('mlapi', 'UserCredential')
+    if not UserCredential.objects.filter(email=email).exists():
+        UserCredential.objects.create(email=email, password_hash=make_password(password))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlapi', '0008_rename_conversation_summary_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_default_user, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Lower
 
 
 class UserCredential(models.Model):
@@ -10,5 +13,98 @@ class UserCredential(models.Model):
 	profile_picture = models.URLField(blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		# Emails are stored lowercased; this keeps case variants from slipping in
+		# through other write paths, so login can match the column exactly.
+		constraints = [
+			models.UniqueConstraint(Lower('email'), name='unique_usercredential_email_ci'),
+		]
+
 	def __str__(self):
 		return self.email
+
+
+class Conversation(models.Model):
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(
+		UserCredential,
+		on_delete=models.CASCADE,
+		related_name='conversations',
+		blank=True,
+		null=True,
+	)
+	digest = models.TextField(blank=True, default='')  # first sentence of each turn before digested_through
+	digested_through = models.PositiveIntegerField(default=0)
+	turn_count = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return str(self.id)
+
+
+class ConversationTurn(models.Model):
+	conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='turns')
+	position = models.PositiveIntegerField()
+	role = models.CharField(max_length=10)  # 'user' or 'model'
+	content = models.TextField()
+	tokens = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ('position',)
+		constraints = [
+			models.UniqueConstraint(fields=('conversation', 'position'), name='unique_turn_position'),
+		]
+
+	def __str__(self):
+		return f"{self.conversation_id}#{self.position}"
+
+
+class PredictionJob(models.Model):
+	QUEUED = 'queued'
+	RUNNING = 'running'
+	DONE = 'done'
+	FAILED = 'failed'
+	STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	model_name = models.CharField(max_length=100)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+	prediction_format = models.CharField(max_length=10, default='full')
+	top_k = models.PositiveSmallIntegerField(blank=True, null=True)
+	callback_url = models.URLField(max_length=500, blank=True, default='')
+	callback_status = models.CharField(max_length=100, blank=True, default='')
+	error = models.TextField(blank=True, default='')
+	attempts = models.PositiveSmallIntegerField(default=0)
+	available_at = models.DateTimeField()  # not claimed before this (retry backoff)
+	lease_until = models.DateTimeField(blank=True, null=True)  # a running job past this is requeued
+	created_at = models.DateTimeField(auto_now_add=True)
+	started_at = models.DateTimeField(blank=True, null=True)
+	finished_at = models.DateTimeField(blank=True, null=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=('status', 'available_at'), name='predictionjob_claim_idx'),
+			models.Index(fields=('status', 'finished_at'), name='predictionjob_finished_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.model_name} {self.id} ({self.status})"
+
+
+class PredictionJobImage(models.Model):
+	job = models.ForeignKey(PredictionJob, on_delete=models.CASCADE, related_name='images')
+	position = models.PositiveIntegerField()
+	name = models.CharField(max_length=255)
+	data = models.BinaryField()  # emptied once the job has finished
+	result = models.JSONField(blank=True, null=True)  # raw prediction or {"error": ...}
+
+	class Meta:
+		ordering = ('position',)
+		constraints = [
+			models.UniqueConstraint(fields=('job', 'position'), name='unique_job_image_position'),
+		]
+
+	def __str__(self):
+		return f"{self.job_id}#{self.position}"
@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+	Argon2PasswordHasher,
+	PBKDF2PasswordHasher,
+	ScryptPasswordHasher,
+	check_password,
+	make_password,
+)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+	"""PBKDF2-SHA256 with ``PASSWORD_PBKDF2_ITERATIONS`` iterations."""
+
+	@property
+	def iterations(self):
+		return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+	"""scrypt with ``PASSWORD_SCRYPT_N`` / ``_R`` / ``_P`` cost parameters."""
+
+	@property
+	def work_factor(self):
+		return getattr(settings, "PASSWORD_SCRYPT_N", ScryptPasswordHasher.work_factor)
+
+	@property
+	def block_size(self):
+		return getattr(settings, "PASSWORD_SCRYPT_R", ScryptPasswordHasher.block_size)
+
+	@property
+	def parallelism(self):
+		return getattr(settings, "PASSWORD_SCRYPT_P", ScryptPasswordHasher.parallelism)
+
+	@property
+	def maxmem(self):
+		# OpenSSL's default 32 MiB cap rejects larger N/r; allow what the
+		# parameters need plus some headroom.
+		return 128 * self.block_size * (self.work_factor + self.parallelism + 2) + (1 << 20)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+	"""Argon2id with ``PASSWORD_ARGON2_*`` costs; needs ``argon2-cffi``."""
+
+	@property
+	def time_cost(self):
+		return getattr(settings, "PASSWORD_ARGON2_TIME_COST", Argon2PasswordHasher.time_cost)
+
+	@property
+	def memory_cost(self):
+		return getattr(settings, "PASSWORD_ARGON2_MEMORY_COST", Argon2PasswordHasher.memory_cost)
+
+	@property
+	def parallelism(self):
+		return getattr(settings, "PASSWORD_ARGON2_PARALLELISM", Argon2PasswordHasher.parallelism)
+
+
+class PasswordHashingBusy(Exception):
+	"""Raised when the hashing pool has no free slot within the configured wait."""
+
+
+_POOL = None
+_SLOTS = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool():
+	global _POOL, _SLOTS
+	if _POOL is None:
+		with _POOL_LOCK:
+			if _POOL is None:
+				workers = max(getattr(settings, "PASSWORD_HASH_WORKERS", 2), 1)
+				pending = max(getattr(settings, "PASSWORD_HASH_MAX_PENDING", 32), workers)
+				_SLOTS = threading.BoundedSemaphore(pending)
+				_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mlapi-hash")
+	return _POOL, _SLOTS
+
+
+def _run(fn, *args):
+	"""Run ``fn`` on the hashing pool, failing fast once too many are queued.
+
+	The pool caps how many cores hashing can take in this process, so a login
+	burst queues here instead of starving the inference threads.
+	"""
+	pool, slots = _get_pool()
+	if not slots.acquire(timeout=getattr(settings, "PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)):
+		raise PasswordHashingBusy("Too many sign-in attempts in progress, try again shortly")
+	try:
+		return pool.submit(fn, *args).result()
+	finally:
+		slots.release()
+
+
+def hash_password(password):
+	"""Hash ``password`` with the preferred hasher on the hashing pool."""
+	return _run(make_password, password)
+
+
+def _verify(password, encoded):
+	upgraded = []
+	valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+	return valid, (upgraded[0] if upgraded else None)
+
+
+def verify_password(password, encoded):
+	"""Check ``password`` against ``encoded`` on the hashing pool.
+
+	Returns ``(valid, new_hash)``; ``new_hash`` is set when the stored hash uses
+	a non-preferred algorithm or outdated cost parameters and should be saved
+	in place of ``encoded``.
+	"""
+	return _run(_verify, password, encoded)
@@ -0,0 +1,193 @@
+"""Model prediction results shared by the predict views and the job worker.
+
+Raw results (class index, confidence and every score) are what gets cached,
+coalesced and stored on job images; :func:`format_prediction` renders them
+per request format.
+"""
+
+import io
+import logging
+import math
+
+from django.conf import settings
+
+from . import inference, metrics
+from .cache import content_hash
+from .preprocessing import decode_image, get_decode_pool
+
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_FORMATS = ("full", "topk", "compact")
+
+
+def build_class_names(class_names, size):
+	if class_names:
+		return class_names
+	return [f"Class {i}" for i in range(size)]
+
+
+def fallback_prediction(file_obj, class_names, default_count=5):
+	digest = bytes.fromhex(content_hash(file_obj))
+	resolved_names = build_class_names(class_names, max(default_count, 1))
+	index = digest[0] % len(resolved_names)
+	confidence = 0.55 + (digest[1] / 255.0) * 0.4
+
+	base = (1.0 - confidence) / max(len(resolved_names) - 1, 1)
+	probabilities = {name: base for name in resolved_names}
+	probabilities[resolved_names[index]] = confidence
+
+	return resolved_names[index], float(confidence), probabilities
+
+
+def prediction_payload(preds):
+	"""Raw result for one image: winning class index, its score and every score.
+
+	This is what gets cached and shared between coalesced callers; it is
+	rendered per request by :func:`format_prediction`.
+	"""
+	import numpy as np
+
+	preds = np.asarray(preds, dtype=np.float32).ravel()
+	if preds.size == 0:
+		raise RuntimeError("Model returned no predictions")
+
+	index = int(np.argmax(preds))
+	return {"index": index, "confidence": float(preds[index]), "scores": preds.tolist()}
+
+
+def classes_version(class_names):
+	import hashlib
+
+	return hashlib.sha256("\n".join(class_names).encode("utf-8")).hexdigest()[:12]
+
+
+def format_prediction(spec, result, prediction_format="full", top_k=None):
+	import numpy as np
+
+	scores = result["scores"]
+	names = build_class_names(spec.class_names, len(scores))
+	index = result["index"]
+	label = names[index] if index < len(names) else str(index)
+	extra = {key: result[key] for key in ("fallback", "fallback_reason") if key in result}
+
+	top = None
+	if top_k:
+		values = np.asarray(scores, dtype=np.float32)
+		k = min(top_k, values.size)
+		top = np.argpartition(-values, k - 1)[:k]
+		top = top[np.argsort(-values[top], kind="stable")].tolist()
+
+	if prediction_format == "compact":
+		# Indices refer to /api/<model>/classes/ with the same classes_version.
+		payload = {
+			"class_index": index,
+			"confidence": result["confidence"],
+			"classes_version": classes_version(names),
+		}
+		if top is None:
+			payload["scores"] = scores
+		else:
+			payload["top_k"] = [[i, scores[i]] for i in top]
+		return {**payload, **extra}
+
+	payload = {"label": label, "confidence": result["confidence"]}
+	if top is None:
+		if len(names) > len(scores):
+			scores = scores + [0.0] * (len(names) - len(scores))
+		payload["probabilities"] = dict(zip(names, scores))
+	else:
+		payload["top_k"] = [
+			{"label": names[i] if i < len(names) else str(i), "score": scores[i]} for i in top
+		]
+	return {**payload, **extra}
+
+
+def fallback_payload(spec, file_obj, error):
+	metrics.inc(
+		"mlapi_fallback_predictions_total",
+		help="Predictions answered by the hash-based fallback instead of the model.",
+		model=spec.name,
+	)
+	logger.warning("Serving fallback prediction for %s: %s", spec.name, error)
+	label, confidence, probabilities = fallback_prediction(
+		file_obj, spec.class_names, default_count=spec.fallback_count()
+	)
+	names = list(probabilities)
+	return {
+		"index": names.index(label),
+		"confidence": confidence,
+		"scores": [float(probabilities[name]) for name in names],
+		"fallback": True,
+		"fallback_reason": f"{type(error).__name__}: {error}",
+	}
+
+
+def retry_after(error):
+	retry_after = getattr(error, "retry_after", None)
+	if retry_after is None:
+		retry_after = getattr(settings, "MLAPI_UNAVAILABLE_RETRY_AFTER", 30)
+	return max(math.ceil(retry_after), 1)
+
+
+def classify_uploads(spec, uploads, size, size_error=None, raise_model_errors=False):
+	"""Yield ``(index, result)`` for every ``(name, bytes)`` in ``uploads``.
+
+	``result`` is a raw prediction as from :func:`prediction_payload` (a
+	fallback one when the model fails and fallbacks are on) or
+	``{"error": ...}``. With fallbacks off and ``raise_model_errors`` set, a
+	failed model call raises instead, for callers that retry the whole batch
+	later. Pass ``size=None`` with the error from ``model_input_size`` to
+	answer every image with a fallback. Each chunk of
+	``MLAPI_BATCH_MAX_SIZE`` images is decoded straight into its own
+	preallocated buffer and sent to the model in one call.
+	"""
+	import numpy as np
+
+	fallback = getattr(settings, "MLAPI_FALLBACK_PREDICTIONS", True)
+
+	def flush(indices, batch):
+		try:
+			preds = inference.predict_many(spec.name, batch)
+			results = [prediction_payload(row) for row in preds]
+		except Exception as error:
+			if fallback:
+				results = [fallback_payload(spec, io.BytesIO(uploads[index][1]), error) for index in indices]
+			elif raise_model_errors:
+				raise
+			else:
+				results = [
+					{"error": f"{type(error).__name__}: {error}", "retry_after": retry_after(error)}
+				] * len(indices)
+		yield from zip(indices, results)
+
+	if size is None:
+		for index, (name, data) in enumerate(uploads):
+			yield index, fallback_payload(spec, io.BytesIO(data), size_error)
+		return
+
+	width, height = size
+	chunk_size = getattr(settings, "MLAPI_BATCH_MAX_SIZE", 16)
+	pool = get_decode_pool()
+	chunks = []
+	for start in range(0, len(uploads), chunk_size):
+		indices = list(range(start, min(start + chunk_size, len(uploads))))
+		buffer = np.empty((len(indices), height, width, 3), dtype=np.float32)
+		futures = [
+			pool.submit(decode_image, io.BytesIO(uploads[index][1]), size, spec, buffer[row])
+			for row, index in enumerate(indices)
+		]
+		chunks.append((indices, buffer, futures))
+
+	for indices, buffer, futures in chunks:
+		decoded = []
+		for row, (index, future) in enumerate(zip(indices, futures)):
+			try:
+				future.result()
+				decoded.append(row)
+			except Exception as error:
+				yield index, {"error": f"Could not decode image: {error}"}
+
+		if decoded:
+			batch = buffer if len(decoded) == len(indices) else buffer[decoded]
+			yield from flush([indices[row] for row in decoded], batch)
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import metrics
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_decode_pool():
+	"""Shared thread pool for image decoding; PIL releases the GIL while decoding."""
+	global _POOL
+	if _POOL is None:
+		with _POOL_LOCK:
+			if _POOL is None:
+				_POOL = ThreadPoolExecutor(
+					max_workers=getattr(settings, "MLAPI_DECODE_WORKERS", 4),
+					thread_name_prefix="mlapi-decode",
+				)
+	return _POOL
+
+
+def decode_image(file_obj, size, spec, out=None):
+	"""Decode ``file_obj`` to a preprocessed float32 array of ``size`` (width, height).
+
+	JPEGs are decoded straight at the nearest 1/2, 1/4 or 1/8 scale above
+	``size`` via ``draft()``, and the resized pixels are written into ``out``
+	(a preallocated ``(height, width, 3)`` float32 view, e.g. one row of a
+	batch) so no full-size float intermediates are created.
+	"""
+	import numpy as np
+	from PIL import Image
+
+	width, height = size
+	with metrics.span("decode", model=spec.name):
+		image = Image.open(file_obj)
+		if image.format == "JPEG":
+			image.draft("RGB", (width, height))
+		image.load()
+		if image.mode != "RGB":
+			image = image.convert("RGB")
+
+	with metrics.span("resize", model=spec.name):
+		if image.size != (width, height):
+			image = image.resize((width, height), reducing_gap=3.0)
+
+		if out is None:
+			out = np.empty((height, width, 3), dtype=np.float32)
+		out[...] = np.asarray(image)
+		return spec.preprocess(out)
+
+
+def preprocess_upload(file_obj, size, spec):
+	"""Decode one upload on the shared pool, bounding concurrent decodes per process."""
+	future = get_decode_pool().submit(decode_image, file_obj, size, spec)
+	return future.result(timeout=getattr(settings, "MLAPI_DECODE_TIMEOUT", 30.0))
@@ -0,0 +1,498 @@
+import json
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from . import metrics
+from .batching import discard_batcher
+
+
+MODEL_DIR = Path(__file__).resolve().parent / "models"
+MANIFEST_PATH = MODEL_DIR / "manifest.json"
+DEFAULT_INPUT_SIZE = (224, 224)
+VERSION_CHECK_SECONDS = 5.0
+
+
+def _rescale(array):
+	array *= 1.0 / 255.0
+	return array
+
+
+def _mobilenet_v2(array):
+	array *= 1.0 / 127.5
+	array -= 1.0
+	return array
+
+
+# Each step works in place on a float32 array and returns it.
+PREPROCESSING = {
+	"rescale": _rescale,
+	"mobilenet_v2": _mobilenet_v2,
+	"none": lambda array: array,
+}
+
+BACKENDS = ("keras", "tflite")
+TFLITE_VARIANTS = ("float32", "float16", "int8")
+
+
+class ModelSpec:
+	"""One classifier entry from ``models/manifest.json``.
+
+	``backend`` picks how the model is run: ``"keras"`` loads the full
+	``.keras``/``.h5``/``.pkl`` model through TensorFlow, ``"tflite"`` runs
+	``<file>.<variant>.tflite`` (built by ``manage.py convert_models``) through
+	the lightweight TFLite interpreter.
+	"""
+
+	def __init__(self, name, file, title=None, class_names=None, input_size=None,
+			preprocessing="rescale", default_count=5, backend="keras", variant="float16",
+			model_dir=MODEL_DIR):
+		if preprocessing not in PREPROCESSING:
+			raise ValueError(f"Unknown preprocessing '{preprocessing}' for model '{name}'")
+		if backend not in BACKENDS:
+			raise ValueError(f"Unknown backend '{backend}' for model '{name}'")
+		if backend == "tflite" and variant not in TFLITE_VARIANTS:
+			raise ValueError(f"Unknown TFLite variant '{variant}' for model '{name}'")
+
+		self.name = name
+		self.file = file
+		self.title = title or name.capitalize()
+		self.class_names = list(class_names or [])
+		self.input_size = tuple(input_size) if input_size else None
+		self.preprocessing = preprocessing
+		self.default_count = default_count
+		self.backend = backend
+		self.variant = variant
+		self.model_dir = Path(model_dir)
+
+	@property
+	def pickle_path(self):
+		return self.model_dir / f"{self.file}.pkl"
+
+	@property
+	def keras_path(self):
+		return self.model_dir / f"{self.file}.keras"
+
+	@property
+	def h5_path(self):
+		return self.model_dir / f"{self.file}.h5"
+
+	def tflite_path(self, variant=None):
+		return self.model_dir / f"{self.file}.{variant or self.variant}.tflite"
+
+	def model_paths(self):
+		"""Candidate files for the configured backend, in load order."""
+		if self.backend == "tflite":
+			return (self.tflite_path(),)
+		return (self.keras_path, self.h5_path, self.pickle_path)
+
+	def exists(self):
+		return any(path.exists() for path in self.model_paths())
+
+	def version(self):
+		"""Identify the model file on disk, so replacing it invalidates cached results."""
+		now = time.monotonic()
+		cached = getattr(self, "_version", None)
+		if cached is not None and now - cached[0] < VERSION_CHECK_SECONDS:
+			return cached[1]
+
+		version = "missing"
+		for path in self.model_paths():
+			try:
+				stat = path.stat()
+			except OSError:
+				continue
+			suffix = f"{self.variant}-tflite" if self.backend == "tflite" else path.suffix[1:]
+			version = f"{suffix}-{stat.st_size}-{stat.st_mtime_ns}"
+			break
+
+		self._version = (now, version)
+		return version
+
+	def preprocess(self, array):
+		return PREPROCESSING[self.preprocessing](array)
+
+	def fallback_count(self):
+		return len(self.class_names) or self.default_count
+
+
+def _resolve_input_size(model):
+	input_shape = getattr(model, "input_shape", None)
+	resolved_shape = None
+	if isinstance(input_shape, (list, tuple)):
+		if len(input_shape) > 0 and isinstance(input_shape[0], (list, tuple)):
+			resolved_shape = input_shape[0]
+		else:
+			resolved_shape = input_shape
+
+	if resolved_shape and len(resolved_shape) >= 3:
+		if (
+			len(resolved_shape) >= 4
+			and resolved_shape[1] in (1, 3)
+			and resolved_shape[-1] not in (1, 3)
+		):
+			height = resolved_shape[2] or DEFAULT_INPUT_SIZE[1]
+			width = resolved_shape[3] or DEFAULT_INPUT_SIZE[0]
+		else:
+			height = resolved_shape[1] or DEFAULT_INPUT_SIZE[1]
+			width = resolved_shape[2] or DEFAULT_INPUT_SIZE[0]
+	else:
+		width, height = DEFAULT_INPUT_SIZE
+
+	return int(width), int(height)
+
+
+def _estimate_bytes(model, spec):
+	count_params = getattr(model, "count_params", None)
+	if callable(count_params):
+		try:
+			return int(count_params()) * 4
+		except Exception:
+			pass
+
+	for path in spec.model_paths():
+		if path.exists():
+			return path.stat().st_size
+	return 0
+
+
+def _import_tflite_interpreter():
+	"""Prefer the standalone runtimes; they import in milliseconds, not seconds."""
+	try:
+		from ai_edge_litert.interpreter import Interpreter
+		return Interpreter
+	except ImportError:
+		pass
+	try:
+		from tflite_runtime.interpreter import Interpreter
+		return Interpreter
+	except ImportError:
+		pass
+	try:
+		from tensorflow.lite import Interpreter
+		return Interpreter
+	except Exception as exc:
+		raise ImportError(
+			"ai-edge-litert, tflite-runtime or TensorFlow is required to run TFLite "
+			f"models: {exc} (python: {sys.executable})"
+		) from exc
+
+
+class TFLiteModel:
+	"""Keras-like ``predict()`` over a TFLite interpreter.
+
+	The interpreter is not thread-safe, so calls are serialized. Quantized
+	input/output tensors are (de)quantized here, so callers always pass and
+	receive float32 arrays.
+	"""
+
+	def __init__(self, path, num_threads=None):
+		import numpy as np
+
+		self.path = Path(path)
+		self._interpreter = _import_tflite_interpreter()(
+			model_path=str(self.path), num_threads=num_threads
+		)
+		self._interpreter.allocate_tensors()
+		self._input = self._interpreter.get_input_details()[0]
+		self._output = self._interpreter.get_output_details()[0]
+		signature = self._input.get("shape_signature", self._input["shape"])
+		self._dynamic_batch = len(signature) > 0 and signature[0] == -1
+		self._batch_size = int(self._input["shape"][0])
+		self._np = np
+		self._lock = threading.Lock()
+
+	@property
+	def input_shape(self):
+		return (None, *(int(dim) for dim in self._input["shape"][1:]))
+
+	def _quantize(self, batch):
+		np = self._np
+		dtype = self._input["dtype"]
+		if dtype == np.float32:
+			return batch.astype(np.float32, copy=False)
+		scale, zero_point = self._input["quantization"]
+		info = np.iinfo(dtype)
+		return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+	def _dequantize(self, preds):
+		np = self._np
+		if preds.dtype == np.float32:
+			return preds
+		scale, zero_point = self._output["quantization"]
+		return (preds.astype(np.float32) - zero_point) * scale
+
+	def _invoke(self, batch):
+		if batch.shape[0] != self._batch_size:
+			self._interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+			self._interpreter.allocate_tensors()
+			self._input = self._interpreter.get_input_details()[0]
+			self._output = self._interpreter.get_output_details()[0]
+			self._batch_size = batch.shape[0]
+		self._interpreter.set_tensor(self._input["index"], self._quantize(batch))
+		self._interpreter.invoke()
+		return self._dequantize(self._interpreter.get_tensor(self._output["index"]).copy())
+
+	def predict(self, batch):
+		np = self._np
+		batch = np.asarray(batch)
+		with self._lock:
+			if self._dynamic_batch:
+				return self._invoke(batch)
+			return np.concatenate([self._invoke(batch[i:i + 1]) for i in range(len(batch))])
+
+
+def _load_tflite(spec):
+	from django.conf import settings
+
+	model = TFLiteModel(
+		spec.tflite_path(),
+		num_threads=getattr(settings, "MLAPI_TFLITE_THREADS", None) or None,
+	)
+	return model, spec.input_size or _resolve_input_size(model)
+
+
+def load_model_file(spec):
+	"""Deserialize the model for ``spec`` and return ``(model, (width, height))``."""
+	if not spec.exists():
+		raise FileNotFoundError(f"{spec.title} model not found")
+
+	if spec.backend == "tflite":
+		return _load_tflite(spec)
+
+	try:
+		from tensorflow import keras  # noqa: F401
+	except Exception as tf_exc:
+		try:
+			import keras  # noqa: F401
+		except Exception as keras_exc:
+			raise ImportError(
+				f"TensorFlow/Keras is required to load the {spec.title.lower()} model: "
+				f"{keras_exc or tf_exc} (python: {sys.executable})"
+			) from keras_exc
+
+	if spec.keras_path.exists() or spec.h5_path.exists():
+		from tensorflow import keras
+		model_file = spec.keras_path if spec.keras_path.exists() else spec.h5_path
+		model = keras.models.load_model(model_file)
+	else:
+		try:
+			with spec.pickle_path.open("rb") as handle:
+				model = pickle.load(handle)
+		except Exception as exc:
+			raise RuntimeError(
+				"Model pickle is incompatible with this Keras version. "
+				f"Re-save the model as {spec.file}.keras or {spec.file}.h5 "
+				"in backend/mlapi/models."
+			) from exc
+
+	return model, spec.input_size or _resolve_input_size(model)
+
+
+class ModelUnavailable(RuntimeError):
+	"""Raised while a model that failed to load is waiting out its retry backoff."""
+
+	def __init__(self, message, retry_after=None):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+class ModelRegistry:
+	"""Loads manifest models on demand and keeps the recently used ones in memory.
+
+	Loaded models are kept in LRU order. When ``memory_budget`` (bytes, 0 for
+	unlimited) is exceeded, or a model has been idle for ``idle_seconds``, the
+	least recently used models are dropped and reloaded on their next request.
+
+	A failed load is remembered: until its backoff (``retry_base`` seconds,
+	doubling per consecutive failure up to ``retry_max``) expires, ``get()``
+	raises ``ModelUnavailable`` without touching the model files again.
+	"""
+
+	def __init__(self, manifest_path=MANIFEST_PATH, memory_budget=0, idle_seconds=0,
+			loader=load_model_file, retry_base=5.0, retry_max=300.0):
+		self.manifest_path = Path(manifest_path)
+		self.memory_budget = max(int(memory_budget), 0)
+		self.idle_seconds = max(float(idle_seconds), 0.0)
+		self.loader = loader
+		self.retry_base = max(float(retry_base), 0.0)
+		self.retry_max = max(float(retry_max), self.retry_base)
+		self.specs = self._read_manifest()
+		self._loaded = OrderedDict()
+		self._failures = {}
+		self._lock = threading.Lock()
+		self._load_locks = {name: threading.Lock() for name in self.specs}
+
+	def _read_manifest(self):
+		if not self.manifest_path.exists():
+			return {}
+
+		with self.manifest_path.open("r", encoding="utf-8") as handle:
+			manifest = json.load(handle)
+
+		specs = OrderedDict()
+		for entry in manifest.get("models", []):
+			# Model files live next to the manifest that lists them.
+			spec = ModelSpec(**entry, model_dir=self.manifest_path.parent)
+			specs[spec.name] = spec
+		return specs
+
+	def names(self):
+		return list(self.specs)
+
+	def spec(self, name):
+		return self.specs.get(name)
+
+	def is_loaded(self, name):
+		with self._lock:
+			return name in self._loaded
+
+	def health(self):
+		"""Return ``{name: {"state", "failures", "error", "retry_in"}}`` for every model."""
+		now = time.monotonic()
+		with self._lock:
+			report = {}
+			for name in self.specs:
+				failure = self._failures.get(name)
+				if name in self._loaded:
+					state = "loaded"
+				elif failure is not None:
+					state = "failed"
+				else:
+					state = "unloaded"
+				report[name] = {
+					"state": state,
+					"failures": failure["count"] if failure else 0,
+					"error": failure["error"] if failure else None,
+					"retry_in": round(max(failure["retry_at"] - now, 0.0), 1) if failure else None,
+				}
+			return report
+
+	def _check_backoff(self, name):
+		with self._lock:
+			failure = self._failures.get(name)
+			if failure is None:
+				return
+			retry_in = failure["retry_at"] - time.monotonic()
+		if retry_in > 0:
+			raise ModelUnavailable(
+				f"Model '{name}' failed to load: {failure['error']}",
+				retry_after=retry_in,
+			)
+
+	def _record_failure(self, name, error):
+		with self._lock:
+			count = self._failures.get(name, {}).get("count", 0) + 1
+			delay = min(self.retry_base * 2 ** (count - 1), self.retry_max)
+			self._failures[name] = {
+				"count": count,
+				"error": f"{type(error).__name__}: {error}",
+				"retry_at": time.monotonic() + delay,
+			}
+		return delay
+
+	def get(self, name):
+		"""Return ``(model, (width, height))`` for ``name``, loading it if needed."""
+		spec = self.specs.get(name)
+		if spec is None:
+			raise KeyError(name)
+
+		self._evict_idle()
+		with self._lock:
+			entry = self._loaded.get(name)
+			if entry is not None:
+				entry["last_used"] = time.monotonic()
+				self._loaded.move_to_end(name)
+				return entry["model"], entry["input_size"]
+
+		self._check_backoff(name)
+		with self._load_locks[name]:
+			with self._lock:
+				entry = self._loaded.get(name)
+				if entry is not None:
+					entry["last_used"] = time.monotonic()
+					self._loaded.move_to_end(name)
+					return entry["model"], entry["input_size"]
+
+			# Another thread may have failed this load while we waited.
+			self._check_backoff(name)
+			try:
+				with metrics.span("model_load", model=name):
+					model, input_size = self.loader(spec)
+			except Exception as error:
+				delay = self._record_failure(name, error)
+				raise ModelUnavailable(
+					f"Model '{name}' failed to load: {type(error).__name__}: {error}",
+					retry_after=delay,
+				) from error
+			with self._lock:
+				self._failures.pop(name, None)
+				self._loaded[name] = {
+					"model": model,
+					"input_size": input_size,
+					"bytes": _estimate_bytes(model, spec),
+					"last_used": time.monotonic(),
+				}
+				evicted = self._evict_over_budget(keep=name)
+
+		for evicted_name in evicted:
+			discard_batcher(evicted_name)
+		return model, input_size
+
+	def evict(self, name):
+		with self._lock:
+			removed = self._loaded.pop(name, None)
+		if removed is not None:
+			discard_batcher(name)
+		return removed is not None
+
+	def _evict_over_budget(self, keep):
+		evicted = []
+		if not self.memory_budget:
+			return evicted
+
+		total = sum(entry["bytes"] for entry in self._loaded.values())
+		for name in list(self._loaded):
+			if total <= self.memory_budget:
+				break
+			if name == keep:
+				continue
+			total -= self._loaded.pop(name)["bytes"]
+			evicted.append(name)
+		return evicted
+
+	def _evict_idle(self):
+		if not self.idle_seconds:
+			return
+
+		cutoff = time.monotonic() - self.idle_seconds
+		with self._lock:
+			idle = [name for name, entry in self._loaded.items() if entry["last_used"] < cutoff]
+			for name in idle:
+				del self._loaded[name]
+		for name in idle:
+			discard_batcher(name)
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry():
+	global _REGISTRY
+	if _REGISTRY is None:
+		from django.conf import settings
+
+		with _REGISTRY_LOCK:
+			if _REGISTRY is None:
+				_REGISTRY = ModelRegistry(
+					manifest_path=getattr(settings, "MLAPI_MODEL_MANIFEST", "") or MANIFEST_PATH,
+					memory_budget=getattr(settings, "MLAPI_MODEL_MEMORY_BUDGET_MB", 0) * 1024 * 1024,
+					idle_seconds=getattr(settings, "MLAPI_MODEL_IDLE_SECONDS", 0),
+					retry_base=getattr(settings, "MLAPI_MODEL_RETRY_BASE", 5.0),
+					retry_max=getattr(settings, "MLAPI_MODEL_RETRY_MAX", 300.0),
+				)
+	return _REGISTRY
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+
+_MISSING = object()
+# Result handed to followers when the leader was cancelled: its cancellation
+# belongs to its own caller, so followers run the call again instead.
+_ABANDONED = object()
+
+
+class SingleFlight:
+	"""Collapses concurrent calls with the same key into one upstream call.
+
+	Within a process, the first caller for a key runs the function and every
+	concurrent caller with that key waits for its result (or exception). With
+	a Django cache ``alias``, a short lease extends this across workers: a
+	worker that finds another worker's lease polls the cache for the leader's
+	result instead of calling upstream itself, and falls back to running the
+	call if the lease expires without one. If an async leader is cancelled,
+	its followers elect a new leader rather than seeing the cancellation.
+	"""
+
+	def __init__(self, alias="", lease_seconds=30.0, poll_interval=0.05, wait_timeout=60.0):
+		self.alias = alias
+		self.lease_seconds = lease_seconds
+		self.poll_interval = poll_interval
+		self.wait_timeout = wait_timeout
+		self._calls = {}
+		self._lock = threading.Lock()
+		self._counts = {"leaders": 0, "followers": 0, "remote_followers": 0}
+
+	def _shared(self):
+		if not self.alias:
+			return None
+		from django.core.cache import caches
+
+		return caches[self.alias]
+
+	def _join(self, key):
+		with self._lock:
+			future = self._calls.get(key)
+			if future is not None:
+				self._counts["followers"] += 1
+				return future, False
+			future = Future()
+			self._calls[key] = future
+			self._counts["leaders"] += 1
+			return future, True
+
+	def _finish(self, key, future, result=_MISSING, error=None):
+		with self._lock:
+			self._calls.pop(key, None)
+		if error is not None:
+			future.set_exception(error)
+		else:
+			future.set_result(result)
+
+	def _acquire_lease(self, key):
+		shared = self._shared()
+		if shared is None:
+			return True
+		try:
+			return shared.add(f"mlapi:flight:lease:{key}", 1, timeout=self.lease_seconds)
+		except Exception:
+			return True
+
+	def _publish(self, key, result):
+		shared = self._shared()
+		if shared is None:
+			return
+		try:
+			shared.set(f"mlapi:flight:result:{key}", result, timeout=self.lease_seconds)
+			shared.delete(f"mlapi:flight:lease:{key}")
+		except Exception:
+			pass
+
+	def _release(self, key):
+		shared = self._shared()
+		if shared is None:
+			return
+		try:
+			shared.delete(f"mlapi:flight:lease:{key}")
+		except Exception:
+			pass
+
+	def _remote_result(self, key):
+		"""Return ``(done, result)`` for a call led by another worker."""
+		shared = self._shared()
+		result = shared.get(f"mlapi:flight:result:{key}", _MISSING)
+		if result is not _MISSING:
+			return True, result
+		if shared.get(f"mlapi:flight:lease:{key}") is None:
+			return True, _MISSING
+		return False, None
+
+	def do(self, key, fn):
+		"""Run ``fn()`` once for all concurrent callers sharing ``key``."""
+		future, leader = self._join(key)
+		while not leader:
+			result = future.result(timeout=self.wait_timeout)
+			if result is not _ABANDONED:
+				return result
+			future, leader = self._join(key)
+
+		try:
+			result = self._lead(key, fn)
+		except BaseException as exc:
+			self._finish(key, future, error=exc)
+			raise
+		self._finish(key, future, result=result)
+		return result
+
+	def _lead(self, key, fn):
+		if not self._acquire_lease(key):
+			deadline = time.monotonic() + self.wait_timeout
+			while time.monotonic() < deadline:
+				done, result = self._remote_result(key)
+				if done and result is not _MISSING:
+					with self._lock:
+						self._counts["remote_followers"] += 1
+					return result
+				if done:
+					break
+				time.sleep(self.poll_interval)
+
+		try:
+			result = fn()
+		except BaseException:
+			self._release(key)
+			raise
+		self._publish(key, result)
+		return result
+
+	async def ado(self, key, coro_fn):
+		"""Async variant of :meth:`do`; ``coro_fn()`` must return an awaitable."""
+		future, leader = self._join(key)
+		while not leader:
+			# Shielded so a follower's own cancellation or timeout does not
+			# cancel the future the leader and other followers share.
+			result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+			if result is not _ABANDONED:
+				return result
+			future, leader = self._join(key)
+
+		try:
+			result = await self._alead(key, coro_fn)
+		except asyncio.CancelledError:
+			self._finish(key, future, result=_ABANDONED)
+			raise
+		except BaseException as exc:
+			self._finish(key, future, error=exc)
+			raise
+		self._finish(key, future, result=result)
+		return result
+
+	async def _alead(self, key, coro_fn):
+		from asgiref.sync import sync_to_async
+
+		if not await sync_to_async(self._acquire_lease)(key):
+			deadline = time.monotonic() + self.wait_timeout
+			while time.monotonic() < deadline:
+				done, result = await sync_to_async(self._remote_result)(key)
+				if done and result is not _MISSING:
+					with self._lock:
+						self._counts["remote_followers"] += 1
+					return result
+				if done:
+					break
+				await asyncio.sleep(self.poll_interval)
+
+		try:
+			result = await coro_fn()
+		except BaseException:
+			await sync_to_async(self._release)(key)
+			raise
+		await sync_to_async(self._publish)(key, result)
+		return result
+
+	def stats(self):
+		with self._lock:
+			counts = dict(self._counts)
+			counts["in_flight"] = len(self._calls)
+		return counts
+
+
+_FLIGHTS = {}
+_FLIGHTS_LOCK = threading.Lock()
+
+
+def get_single_flight(name):
+	"""Return the process-wide :class:`SingleFlight` group for ``name``."""
+	flight = _FLIGHTS.get(name)
+	if flight is None:
+		with _FLIGHTS_LOCK:
+			flight = _FLIGHTS.get(name)
+			if flight is None:
+				flight = SingleFlight(
+					alias=getattr(settings, "SINGLE_FLIGHT_ALIAS", ""),
+					lease_seconds=getattr(settings, "SINGLE_FLIGHT_LEASE_SECONDS", 30.0),
+				)
+				_FLIGHTS[name] = flight
+	return flight
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from mlapi import admission, auth_tokens
+
+
+@override_settings(MLAPI_ADMISSION_ENABLED=True, MLAPI_RATE_LIMITS={"auth": (0.001, 2)}, MLAPI_RATE_LIMIT_ALIAS="")
+class RateLimitTests(TestCase):
+	def setUp(self):
+		patcher = mock.patch.object(admission, "_LIMITER", None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _login(self, **headers):
+		return self.client.post(
+			"/api/login/", {"email": "nobody@example.com", "password": "wrong"},
+			content_type="application/json", headers=headers,
+		)
+
+	def test_limit_applies_per_client(self):
+		self.assertNotEqual(self._login().status_code, 429)
+		self.assertNotEqual(self._login().status_code, 429)
+		response = self._login()
+		self.assertEqual(response.status_code, 429)
+		self.assertTrue(int(response["Retry-After"]) >= 1)
+
+	def test_rotating_client_headers_does_not_reset_the_limit(self):
+		statuses = [
+			self._login(**{"X-Api-Key": f"key-{i}", "X-User-Email": f"user-{i}@example.com"}).status_code
+			for i in range(4)
+		]
+		self.assertEqual(statuses[2:], [429, 429])
+
+	def test_signed_in_users_have_their_own_bucket(self):
+		for _ in range(2):
+			self._login()
+		self.assertEqual(self._login().status_code, 429)
+		token = auth_tokens.issue_token("alice@example.com")
+		self.assertNotEqual(self._login(Authorization=f"Bearer {token}").status_code, 429)
+
+
+class ClientIdentityTests(SimpleTestCase):
+	def setUp(self):
+		self.factory = RequestFactory()
+
+	def test_unverified_headers_are_ignored(self):
+		request = self.factory.get("/", headers={"X-Api-Key": "k", "X-User-Email": "victim@example.com"}, REMOTE_ADDR="10.0.0.1")
+		self.assertEqual(admission.client_identity(request), "ip:10.0.0.1")
+
+	def test_signed_token_identifies_the_user(self):
+		token = auth_tokens.issue_token("Alice@Example.com")
+		request = self.factory.get("/", headers={"Authorization": f"Bearer {token}"})
+		self.assertEqual(admission.client_identity(request), "user:alice@example.com")
+
+	def test_forwarded_for_needs_trust(self):
+		request = self.factory.get("/", headers={"X-Forwarded-For": "203.0.113.7, 10.0.0.2"}, REMOTE_ADDR="10.0.0.1")
+		with override_settings(MLAPI_TRUST_X_FORWARDED_FOR=False):
+			self.assertEqual(admission.client_identity(request), "ip:10.0.0.1")
+		with override_settings(MLAPI_TRUST_X_FORWARDED_FOR=True):
+			self.assertEqual(admission.client_identity(request), "ip:203.0.113.7")
+
+
+class AdmissionControllerTests(SimpleTestCase):
+	def test_waiters_are_served_by_priority(self):
+		controller = admission.AdmissionController("test", capacity=1, max_queue=4, timeout=5)
+		controller.acquire()
+		order = []
+
+		def wait(priority, name):
+			controller.acquire(priority)
+			order.append(name)
+			controller.release()
+
+		bulk = threading.Thread(target=wait, args=(admission.BULK, "bulk"))
+		bulk.start()
+		while controller.stats()["queued"] < 1:
+			time.sleep(0.01)
+		interactive = threading.Thread(target=wait, args=(admission.INTERACTIVE, "interactive"))
+		interactive.start()
+		while controller.stats()["queued"] < 2:
+			time.sleep(0.01)
+
+		controller.release()
+		bulk.join(5)
+		interactive.join(5)
+		self.assertEqual(order, ["interactive", "bulk"])
+		self.assertEqual(controller.stats()["in_use"], 0)
+
+	def test_full_queue_sheds_immediately(self):
+		controller = admission.AdmissionController("test", capacity=1, max_queue=0, timeout=5)
+		controller.acquire()
+		with self.assertRaises(admission.Overloaded):
+			controller.acquire()
+
+	def test_waiter_gives_up_at_deadline(self):
+		controller = admission.AdmissionController("test", capacity=1, max_queue=4, timeout=0.05)
+		controller.acquire()
+		with self.assertRaises(admission.Overloaded):
+			controller.acquire()
+		controller.release()
+		self.assertEqual(controller.stats(), {"in_use": 0, "queued": 0, "capacity": 1})
+
+	async def test_cancelled_async_waiter_frees_its_place(self):
+		controller = admission.AdmissionController("test", capacity=1, max_queue=4, timeout=5)
+		await controller.aacquire()
+		waiter = asyncio.ensure_future(controller.aacquire())
+		await asyncio.sleep(0.01)
+		waiter.cancel()
+		with self.assertRaises(asyncio.CancelledError):
+			await waiter
+		controller.release()
+		self.assertEqual(controller.stats()["in_use"], 0)
+
+	@override_settings(MLAPI_ADMISSION_ENABLED=True, MLAPI_RATE_LIMITS={})
+	def test_overloaded_view_gets_503_with_retry_after(self):
+		controller = admission.AdmissionController("test", capacity=1, max_queue=0, timeout=2)
+		controller.acquire()
+		view = admission.admit(controller="test")(lambda request: HttpResponse("ok"))
+		with mock.patch.dict(admission._CONTROLLERS, {"test": controller}):
+			response = view(RequestFactory().get("/"))
+		self.assertEqual(response.status_code, 503)
+		self.assertEqual(response["Retry-After"], "2")
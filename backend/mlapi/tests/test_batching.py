@@ -0,0 +1,87 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from mlapi import inference
+from mlapi.batching import BatcherClosed, MicroBatcher
+
+
+def _sum_rows(model, batch):
+	model.calls.append(len(batch))
+	return batch.reshape(len(batch), -1).sum(axis=1, keepdims=True)
+
+
+class MicroBatcherTests(SimpleTestCase):
+	def setUp(self):
+		self.model = SimpleNamespace(calls=[])
+
+	def test_concurrent_requests_share_one_call(self):
+		batcher = MicroBatcher(self.model, _sum_rows, max_batch_size=8, max_wait_ms=200)
+		results = {}
+
+		def call(i):
+			results[i] = batcher.predict(np.full((2, 2), i, dtype=np.float32), timeout=5)
+
+		threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		batcher.close()
+
+		self.assertEqual(sum(self.model.calls), 4)
+		self.assertLess(len(self.model.calls), 4)
+		for i in range(4):
+			self.assertEqual(float(results[i][0]), 4.0 * i)
+
+	def test_batch_is_flushed_at_max_size(self):
+		batcher = MicroBatcher(self.model, _sum_rows, max_batch_size=2, max_wait_ms=1000)
+		futures = [batcher.submit(np.ones((1,), dtype=np.float32)) for _ in range(4)]
+		for future in futures:
+			future.result(timeout=5)
+		batcher.close()
+		self.assertEqual(self.model.calls, [2, 2])
+
+	def test_errors_reach_every_caller(self):
+		def fail(model, batch):
+			raise ValueError("boom")
+
+		batcher = MicroBatcher(self.model, fail, max_batch_size=4, max_wait_ms=50)
+		futures = [batcher.submit(np.ones((1,), dtype=np.float32)) for _ in range(2)]
+		for future in futures:
+			with self.assertRaises(ValueError):
+				future.result(timeout=5)
+		batcher.close()
+
+	def test_items_queued_before_close_are_still_run(self):
+		batcher = MicroBatcher(self.model, _sum_rows, max_batch_size=16, max_wait_ms=100)
+		futures = [batcher.submit(np.ones((1,), dtype=np.float32)) for _ in range(3)]
+		batcher.close()
+		for future in futures:
+			self.assertEqual(float(future.result(timeout=5)[0]), 1.0)
+
+	def test_submit_after_close_is_rejected(self):
+		batcher = MicroBatcher(self.model, _sum_rows)
+		batcher.submit(np.ones((1,), dtype=np.float32)).result(timeout=5)
+		batcher.close()
+		with self.assertRaises(BatcherClosed):
+			batcher.submit(np.ones((1,), dtype=np.float32))
+		batcher._worker.join(timeout=5)
+		self.assertFalse(batcher._worker.is_alive())
+
+
+class PredictLocalTests(SimpleTestCase):
+	@override_settings(MLAPI_BATCHING_ENABLED=True)
+	def test_closed_batcher_falls_back_to_a_direct_call(self):
+		model = SimpleNamespace(calls=[], predict=lambda batch: batch.reshape(len(batch), -1) * 2)
+		closed = MicroBatcher(model, _sum_rows)
+		closed.close()
+		registry = mock.Mock()
+		registry.get.return_value = (model, (1, 1))
+		with mock.patch.object(inference, "get_registry", return_value=registry), \
+				mock.patch.object(inference, "get_batcher", return_value=closed):
+			result = inference.predict_local("stub", np.array([3.0], dtype=np.float32))
+		self.assertEqual(result.tolist(), [6.0])
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from mlapi import chat_cache
+
+
+class _Reply:
+	def __init__(self, text):
+		self.text = text
+
+	def json(self):
+		return {"candidates": [{"content": {"parts": [{"text": self.text}]}}]}
+
+
+@override_settings(
+	CHAT_API_KEY="test-key",
+	CHAT_CACHE_ENABLED=True,
+	CHAT_CACHE_SIMILARITY=0.5,
+	MLAPI_ADMISSION_ENABLED=False,
+)
+class ChatCacheKeyTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		patcher = mock.patch.object(chat_cache, "_CHAT_CACHE", None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.prompts = []
+
+		async def post_json(url, body, headers=None, target="gemini"):
+			self.prompts.append(body["systemInstruction"]["parts"])
+			return _Reply(f"reply {len(self.prompts)}")
+
+		patcher = mock.patch("mlapi.upstream.post_json", side_effect=post_json)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	async def _chat(self, **payload):
+		response = await self.async_client.post(
+			"/api/chat/", {"message": "What is a confusion matrix?", **payload}, content_type="application/json"
+		)
+		self.assertEqual(response.status_code, 200)
+		return response.json()
+
+	async def test_identical_requests_are_cached(self):
+		first = await self._chat()
+		second = await self._chat()
+		self.assertEqual(len(self.prompts), 1)
+		self.assertEqual(second["text"], first["text"])
+		self.assertTrue(second.get("cached"))
+
+	async def test_client_cache_hints_are_part_of_the_key(self):
+		first = await self._chat(client_cache={"cached_match": "see the earlier answer"})
+		second = await self._chat(client_cache={"cached_match": "something else entirely"})
+		self.assertEqual(len(self.prompts), 2)
+		self.assertNotEqual(first["text"], second["text"])
+		self.assertFalse(second.get("cached", False))
+
+	async def test_language_is_part_of_the_key(self):
+		await self._chat(language="en")
+		await self._chat(language="ta")
+		self.assertEqual(len(self.prompts), 2)
+
+	async def test_near_duplicate_reuse_respects_client_cache_hints(self):
+		hints = {"cached_match": "see the earlier answer"}
+		await self._chat(client_cache=hints)
+		near = await self._chat(message="So what is the confusion matrix?", client_cache=hints)
+		self.assertEqual(len(self.prompts), 1)
+		self.assertTrue(near.get("cached"))
+
+		other = await self._chat(message="So what is the confusion matrix?", client_cache={"local_math": "2 + 2 = 4"})
+		self.assertEqual(len(self.prompts), 2)
+		self.assertFalse(other.get("cached", False))
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from mlapi import auth_tokens, chat_cache
+from mlapi.conversations import fold_into_digest
+from mlapi.models import Conversation, UserCredential
+
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class _Reply:
+	def json(self):
+		return {"candidates": [{"content": {"parts": [{"text": "A reply."}]}}]}
+
+
+@override_settings(
+	CHAT_API_KEY="test-key",
+	CHAT_CACHE_ENABLED=False,
+	MLAPI_ADMISSION_ENABLED=False,
+	PASSWORD_HASHERS=FAST_HASHERS,
+)
+class ConversationOwnershipTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		patcher = mock.patch.object(chat_cache, "_CHAT_CACHE", None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		async def post_json(url, body, headers=None, target="gemini"):
+			return _Reply()
+
+		patcher = mock.patch("mlapi.upstream.post_json", side_effect=post_json)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		self.alice = UserCredential.objects.create(email="alice@example.com", password_hash=make_password("secret1"))
+		UserCredential.objects.create(email="mallory@example.com", password_hash=make_password("secret2"))
+
+	async def _chat(self, token=None, **payload):
+		headers = {"Authorization": f"Bearer {token}"} if token else {}
+		return await self.async_client.post(
+			"/api/chat/",
+			{"message": "Hello there", "conversation": True, **payload},
+			content_type="application/json",
+			headers=headers,
+		)
+
+	def test_login_returns_a_token_for_the_user(self):
+		response = self.client.post(
+			"/api/login/", {"email": "alice@example.com", "password": "secret1"}, content_type="application/json"
+		)
+		self.assertEqual(response.status_code, 200)
+		request = RequestFactory().get("/", headers={"Authorization": f"Bearer {response.json()['token']}"})
+		self.assertEqual(auth_tokens.authenticated_email(request), "alice@example.com")
+
+	async def test_conversation_belongs_to_the_token_user(self):
+		token = auth_tokens.issue_token("alice@example.com")
+		response = await self._chat(token)
+		self.assertEqual(response.status_code, 200)
+		conversation_id = response.json()["conversation_id"]
+		conversation = await Conversation.objects.aget(pk=conversation_id)
+		self.assertEqual(conversation.user_id, self.alice.pk)
+
+		again = await self._chat(token, conversation_id=conversation_id)
+		self.assertEqual(again.status_code, 200)
+
+	async def test_body_email_does_not_grant_access(self):
+		response = await self._chat(auth_tokens.issue_token("alice@example.com"))
+		conversation_id = response.json()["conversation_id"]
+
+		spoofed = await self._chat(conversation_id=conversation_id, user_email="alice@example.com")
+		self.assertEqual(spoofed.status_code, 404)
+
+		other = await self._chat(auth_tokens.issue_token("mallory@example.com"), conversation_id=conversation_id)
+		self.assertEqual(other.status_code, 404)
+
+	async def test_tampered_token_is_ignored(self):
+		response = await self._chat(auth_tokens.issue_token("alice@example.com"))
+		conversation_id = response.json()["conversation_id"]
+		forged = auth_tokens.issue_token("alice@example.com")[:-2] + "xx"
+		denied = await self._chat(forged, conversation_id=conversation_id)
+		self.assertEqual(denied.status_code, 404)
+
+	@override_settings(MLAPI_AUTH_TOKEN_MAX_AGE=-1)
+	def test_expired_token_is_ignored(self):
+		token = auth_tokens.issue_token("alice@example.com")
+		request = RequestFactory().get("/", headers={"Authorization": f"Bearer {token}"})
+		self.assertIsNone(auth_tokens.authenticated_email(request))
+
+
+class DigestTests(TestCase):
+	def test_keeps_first_sentence_of_each_turn(self):
+		turns = [
+			SimpleNamespace(role="user", content="How do I train it? I have 10 images."),
+			SimpleNamespace(role="model", content="Use transfer learning. Start from a pretrained model."),
+		]
+		self.assertEqual(
+			fold_into_digest("", turns, max_tokens=100),
+			"User: How do I train it?\nAssistant: Use transfer learning.",
+		)
+
+	def test_drops_oldest_lines_over_budget(self):
+		turns = [SimpleNamespace(role="user", content=f"Question number {i}.") for i in range(20)]
+		digest = fold_into_digest("", turns, max_tokens=12)
+		self.assertTrue(digest.endswith("User: Question number 19."))
+		self.assertNotIn("number 0.", digest)
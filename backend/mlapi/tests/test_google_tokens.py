@@ -0,0 +1,220 @@
+import base64
+import json
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from benchmarks.stub_upstream import SigningKey
+from mlapi import google_tokens
+from mlapi.google_tokens import JWKSKeySource, StaticKeySource, TokenError, verify_id_token
+
+
+CLIENT_ID = "test-client-id"
+
+
+def _b64(data):
+	return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _claims(**overrides):
+	claims = {
+		"iss": "https://accounts.google.com",
+		"aud": CLIENT_ID,
+		"sub": "1234567890",
+		"email": "someone@example.com",
+		"email_verified": True,
+		"exp": int(time.time()) + 3600,
+	}
+	claims.update(overrides)
+	return claims
+
+
+class _Response:
+	def __init__(self, jwks, max_age=3600):
+		self._jwks = jwks
+		self.headers = {"Cache-Control": f"public, max-age={max_age}"}
+
+	def json(self):
+		return self._jwks
+
+
+class VerifyIdTokenTests(SimpleTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.key = SigningKey(kid="key-1", bits=1024)
+		cls.keys = StaticKeySource({"keys": [cls.key.jwk()]})
+
+	def _verify(self, token):
+		return verify_id_token(token, CLIENT_ID, self.keys)
+
+	def test_valid_token(self):
+		claims = self._verify(self.key.sign(_claims()))
+		self.assertEqual(claims["email"], "someone@example.com")
+
+	def test_tampered_signature(self):
+		token = self.key.sign(_claims())
+		head, _, signature = token.rpartition(".")
+		forged = head + "." + ("A" if signature[0] != "A" else "B") + signature[1:]
+		with self.assertRaisesMessage(TokenError, "signature"):
+			self._verify(forged)
+
+	def test_tampered_payload(self):
+		header, _, signature = self.key.sign(_claims()).split(".")
+		payload = self.key.sign(_claims(email="attacker@example.com")).split(".")[1]
+		with self.assertRaisesMessage(TokenError, "signature"):
+			self._verify(f"{header}.{payload}.{signature}")
+
+	def test_signed_by_another_key(self):
+		other = SigningKey(kid="key-1", bits=1024)
+		with self.assertRaisesMessage(TokenError, "signature"):
+			self._verify(other.sign(_claims()))
+
+	def test_wrong_audience(self):
+		with self.assertRaisesMessage(TokenError, "audience"):
+			self._verify(self.key.sign(_claims(aud="someone-else")))
+
+	def test_audience_list(self):
+		self.assertTrue(self._verify(self.key.sign(_claims(aud=["other", CLIENT_ID]))))
+
+	def test_wrong_issuer(self):
+		with self.assertRaisesMessage(TokenError, "issuer"):
+			self._verify(self.key.sign(_claims(iss="https://evil.example.com")))
+
+	def test_expired(self):
+		with self.assertRaisesMessage(TokenError, "expired"):
+			self._verify(self.key.sign(_claims(exp=int(time.time()) - 120)))
+
+	def test_expiry_within_leeway(self):
+		self.assertTrue(self._verify(self.key.sign(_claims(exp=int(time.time()) - 10))))
+
+	def test_unknown_kid(self):
+		with self.assertRaisesMessage(TokenError, "Unknown signing key"):
+			self._verify(self.key.sign(_claims(), kid="key-2"))
+
+	def test_unsigned_token_is_rejected(self):
+		header, payload, _ = self.key.sign(_claims()).split(".")
+		none_header = "eyJhbGciOiJub25lIiwia2lkIjoia2V5LTEifQ"  # {"alg":"none","kid":"key-1"}
+		with self.assertRaisesMessage(TokenError, "algorithm"):
+			self._verify(f"{none_header}.{payload}.")
+
+	def test_malformed(self):
+		with self.assertRaisesMessage(TokenError, "Malformed"):
+			self._verify("not-a-token")
+
+	def test_non_object_header(self):
+		_, payload, signature = self.key.sign(_claims()).split(".")
+		header = _b64(json.dumps(["RS256"]).encode())
+		with self.assertRaisesMessage(TokenError, "Malformed"):
+			self._verify(f"{header}.{payload}.{signature}")
+
+	def test_non_object_payload(self):
+		header, _, signature = self.key.sign(_claims()).split(".")
+		payload = _b64(json.dumps("someone@example.com").encode())
+		with self.assertRaisesMessage(TokenError, "Malformed"):
+			self._verify(f"{header}.{payload}.{signature}")
+
+	def test_signature_not_reduced_modulo_n(self):
+		# s + n is congruent to a valid signature s; it must still be rejected.
+		size = (self.key.n.bit_length() + 7) // 8
+		for attempt in range(200):
+			header, payload, signature = self.key.sign(_claims(sub=str(attempt))).split(".")
+			value = int.from_bytes(google_tokens._b64decode(signature), "big") + self.key.n
+			if value.bit_length() <= size * 8:
+				break
+		else:
+			self.fail("no signature left room for s + n")
+		forged = _b64(value.to_bytes(size, "big"))
+		with self.assertRaisesMessage(TokenError, "signature"):
+			self._verify(f"{header}.{payload}.{forged}")
+
+
+class JWKSKeySourceTests(SimpleTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.old_key = SigningKey(kid="old", bits=1024)
+		cls.new_key = SigningKey(kid="new", bits=1024)
+
+	def setUp(self):
+		self.now = 1000.0
+		patcher = mock.patch("mlapi.google_tokens.time.monotonic", side_effect=lambda: self.now)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.published = [self.old_key.jwk()]
+		patcher = mock.patch(
+			"mlapi.upstream.request_sync", side_effect=lambda *args, **kwargs: _Response({"keys": list(self.published)})
+		)
+		self.fetch = patcher.start()
+		self.addCleanup(patcher.stop)
+		self.source = JWKSKeySource("https://keys.example.com/certs", min_refresh=30.0)
+
+	def _verify(self, key):
+		return verify_id_token(key.sign(_claims()), CLIENT_ID, self.source)
+
+	def test_keys_are_cached(self):
+		self._verify(self.old_key)
+		self._verify(self.old_key)
+		self.assertEqual(self.fetch.call_count, 1)
+
+	def test_unknown_kid_refetches_after_rotation(self):
+		self._verify(self.old_key)
+		self.published = [self.old_key.jwk(), self.new_key.jwk()]
+		self.now += 31
+		self.assertTrue(self._verify(self.new_key))
+		self.assertEqual(self.fetch.call_count, 2)
+
+	def test_unknown_kid_refetch_is_throttled(self):
+		self._verify(self.old_key)
+		self.now += 5
+		for _ in range(3):
+			with self.assertRaisesMessage(TokenError, "Unknown signing key"):
+				self._verify(self.new_key)
+		self.assertEqual(self.fetch.call_count, 1)
+
+		self.published = [self.new_key.jwk()]
+		self.now += 30
+		self.assertTrue(self._verify(self.new_key))
+		self.assertEqual(self.fetch.call_count, 2)
+
+	def test_keys_expire_after_max_age(self):
+		self._verify(self.old_key)
+		self.now += 3601
+		self._verify(self.old_key)
+		self.assertEqual(self.fetch.call_count, 2)
+
+
+@override_settings(
+	GOOGLE_CLIENT_ID=CLIENT_ID,
+	GOOGLE_CLIENT_SECRET="test-secret",
+	GOOGLE_TOKEN_VERIFICATION="local",
+	MLAPI_ADMISSION_ENABLED=False,
+)
+class GoogleAuthViewTests(TestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.key = SigningKey(kid="key-1", bits=1024)
+
+	def setUp(self):
+		google_tokens.set_key_source(StaticKeySource({"keys": [self.key.jwk()]}))
+		self.addCleanup(google_tokens.set_key_source, None)
+
+	def _login(self, token):
+		return self.client.post("/api/google-auth/", {"token": token}, content_type="application/json")
+
+	def test_signed_token_logs_in(self):
+		response = self._login(self.key.sign(_claims()))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()["user"]["email"], "someone@example.com")
+		self.assertTrue(response.json()["token"])
+
+	def test_forged_token_is_rejected(self):
+		other = SigningKey(kid="key-1", bits=1024)
+		self.assertEqual(self._login(other.sign(_claims())).status_code, 401)
+
+	def test_malformed_token_is_rejected(self):
+		header, _, signature = self.key.sign(_claims()).split(".")
+		payload = _b64(b"[]")
+		self.assertEqual(self._login(f"{header}.{payload}.{signature}").status_code, 401)
@@ -0,0 +1,63 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from mlapi import inference
+
+
+DEDICATED_KEY = "k" * 40
+
+
+class EndpointTests(SimpleTestCase):
+	def test_unix_socket_path_is_allowed(self):
+		address, authkey = inference._endpoint("/tmp/mlapi-inference.sock")
+		self.assertEqual(address, "/tmp/mlapi-inference.sock")
+		self.assertEqual(len(authkey), 32)
+
+	@override_settings(MLAPI_INFERENCE_AUTHKEY="")
+	def test_tcp_without_dedicated_key_is_refused(self):
+		with self.assertRaises(ImproperlyConfigured):
+			inference._endpoint("127.0.0.1:9000")
+
+	@override_settings(MLAPI_INFERENCE_AUTHKEY="short")
+	def test_tcp_with_short_key_is_refused(self):
+		with self.assertRaises(ImproperlyConfigured):
+			inference._endpoint("127.0.0.1:9000")
+
+	def test_tcp_with_secret_key_as_authkey_is_refused(self):
+		secret = "s" * 50
+		with self.settings(SECRET_KEY=secret, MLAPI_INFERENCE_AUTHKEY=secret):
+			with self.assertRaises(ImproperlyConfigured):
+				inference._endpoint("127.0.0.1:9000")
+
+	@override_settings(MLAPI_INFERENCE_AUTHKEY=DEDICATED_KEY)
+	def test_tcp_with_dedicated_key(self):
+		address, authkey = inference._endpoint("127.0.0.1:9000")
+		self.assertEqual(address, ("127.0.0.1", 9000))
+		self.assertNotEqual(authkey, inference._endpoint("/tmp/x.sock")[1])
+
+
+class UnixSocketRoundTripTests(SimpleTestCase):
+	def test_client_reaches_server_over_owner_only_socket(self):
+		path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+		registry = mock.Mock()
+		registry.get.return_value = (object(), (4, 3))
+		server = inference.InferenceServer(path)
+		with mock.patch.object(inference, "get_registry", return_value=registry):
+			thread = threading.Thread(target=server.serve_forever, daemon=True)
+			thread.start()
+			for _ in range(100):
+				if os.path.exists(path):
+					break
+				time.sleep(0.01)
+			self.addCleanup(server.close)
+
+			client = inference.InferenceClient(path)
+			self.assertEqual(client.input_size("stub"), (4, 3))
+			self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
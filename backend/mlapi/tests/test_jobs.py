@@ -0,0 +1,128 @@
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from mlapi import jobs
+from mlapi.models import PredictionJob, PredictionJobImage
+from mlapi.registry import ModelUnavailable
+
+from .test_predict import ModelTestMixin, _jpeg
+
+
+def _scores(name, batch):
+	return np.tile(np.array([0.3, 0.7], dtype=np.float32), (len(batch), 1))
+
+
+@override_settings(
+	MLAPI_ADMISSION_ENABLED=False,
+	MLAPI_FALLBACK_PREDICTIONS=True,
+	MLAPI_JOB_MAX_ATTEMPTS=2,
+	MLAPI_JOB_CALLBACK_HOSTS=["hooks.example.com"],
+)
+class JobTests(ModelTestMixin, TestCase):
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch("mlapi.inference.predict_many", side_effect=_scores)
+		self.predict_many = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _submit(self, count=3, query="?model=demo", **fields):
+		files = [SimpleUploadedFile(f"{i}.jpg", _jpeg((i * 40, 0, 0)), content_type="image/jpeg") for i in range(count)]
+		return self.client.post(f"/api/jobs/{query}", {"files": files, **fields})
+
+	def _job(self, response):
+		self.assertEqual(response.status_code, 202, response.content)
+		return PredictionJob.objects.get(pk=response.json()["id"])
+
+	def test_submit_and_poll(self):
+		response = self._submit()
+		job = self._job(response)
+		self.assertEqual(response["Location"], response.json()["poll"])
+		self.assertEqual(job.images.count(), 3)
+
+		status = self.client.get(response["Location"])
+		self.assertEqual(status.json()["status"], "queued")
+		self.assertIn("Retry-After", status)
+
+	def test_submit_validation(self):
+		self.assertEqual(self._submit(query="").status_code, 400)
+		self.assertEqual(self._submit(query="?model=missing").status_code, 404)
+		self.assertEqual(self._submit(callback_url="http://169.254.169.254/latest").status_code, 400)
+		self.assertEqual(self._submit(callback_url="file:///etc/passwd").status_code, 400)
+		self.assertFalse(PredictionJob.objects.exists())
+
+	def test_worker_finishes_jobs(self):
+		job = self._job(self._submit(query="?model=demo&top_k=1"))
+		self.assertEqual(jobs.work(once=True), 1)
+
+		document = self.client.get(f"/api/jobs/{job.id}/").json()
+		self.assertEqual(document["status"], "done")
+		self.assertEqual(document["attempts"], 1)
+		self.assertEqual([result["index"] for result in document["results"]], [0, 1, 2])
+		self.assertEqual(document["results"][0]["top_k"], [{"label": "dog", "score": document["results"][0]["confidence"]}])
+		self.assertFalse(PredictionJobImage.objects.exclude(data=b"").exists())
+		self.assertEqual(self.predict_many.call_count, 1)
+
+	def test_jobs_not_yet_due_are_not_claimed(self):
+		job = self._job(self._submit())
+		PredictionJob.objects.filter(pk=job.pk).update(available_at=timezone.now() + timedelta(minutes=5))
+		self.assertEqual(jobs.claim(8, lease=60), [])
+
+	def test_model_failure_with_fallbacks_finishes_with_fallback_results(self):
+		self.predict_many.side_effect = ModelUnavailable("not loaded", retry_after=7)
+		job = self._job(self._submit())
+		jobs.work(once=True)
+		job.refresh_from_db()
+		self.assertEqual(job.status, PredictionJob.DONE)
+		self.assertTrue(all(image.result["fallback"] for image in job.images.all()))
+
+	@override_settings(MLAPI_FALLBACK_PREDICTIONS=False)
+	def test_strict_model_failure_is_retried_then_failed(self):
+		self.predict_many.side_effect = ModelUnavailable("not loaded", retry_after=7)
+		job = self._job(self._submit())
+		started = timezone.now()
+		jobs.work(once=True)
+
+		job.refresh_from_db()
+		self.assertEqual(job.status, PredictionJob.QUEUED)
+		self.assertEqual(job.attempts, 1)
+		self.assertIn("not loaded", job.error)
+		self.assertGreaterEqual(job.available_at, started + timedelta(seconds=7))
+		self.assertFalse(job.images.filter(result__isnull=False).exists())
+		self.assertFalse(job.images.filter(data=b"").exists())
+
+		PredictionJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+		jobs.work(once=True)
+		job.refresh_from_db()
+		self.assertEqual(job.status, PredictionJob.FAILED)
+		self.assertEqual(job.attempts, 2)
+
+	@override_settings(MLAPI_FALLBACK_PREDICTIONS=False)
+	def test_strict_job_recovers_when_the_model_comes_back(self):
+		self.predict_many.side_effect = [ModelUnavailable("not loaded", retry_after=1), _scores(None, [0, 1, 2])]
+		job = self._job(self._submit())
+		jobs.work(once=True)
+		PredictionJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+		jobs.work(once=True)
+		job.refresh_from_db()
+		self.assertEqual(job.status, PredictionJob.DONE)
+		self.assertEqual(job.images.filter(result__index=1).count(), 3)
+
+	def test_callback_receives_the_finished_job(self):
+		job = self._job(self._submit(callback_url="https://hooks.example.com/done"))
+		with mock.patch("mlapi.upstream.request_sync", return_value=mock.Mock(status_code=204)) as send:
+			jobs.work(once=True)
+		target, method, url = send.call_args.args
+		self.assertEqual((target, method, url), ("job_callback", "POST", "https://hooks.example.com/done"))
+		self.assertEqual(send.call_args.kwargs["json"]["status"], "done")
+		job.refresh_from_db()
+		self.assertEqual(job.callback_status, "204")
+
+	def test_check_callback_url(self):
+		self.assertIsNone(jobs.check_callback_url("https://hooks.example.com/x"))
+		self.assertIsNotNone(jobs.check_callback_url("https://evil.example.com/x"))
+		self.assertIsNotNone(jobs.check_callback_url("ftp://hooks.example.com/x"))
@@ -0,0 +1,44 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from mlapi.models import UserCredential
+
+
+@override_settings(
+	PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+	MLAPI_ADMISSION_ENABLED=False,
+)
+class LoginTests(TestCase):
+	def setUp(self):
+		UserCredential.objects.create(email="alice@example.com", password_hash=make_password("secret1"))
+		User.objects.create_user("Bob", email="Bob@Example.com", password="secret2")
+
+	def _login(self, email, password):
+		return self.client.post("/api/login/", {"email": email, "password": password}, content_type="application/json")
+
+	def test_login_is_a_single_query(self):
+		with self.assertNumQueries(1):
+			response = self._login("alice@example.com", "secret1")
+		self.assertEqual(response.status_code, 200)
+
+	def test_django_user_matched_case_insensitively_in_one_query(self):
+		with self.assertNumQueries(1):
+			self.assertEqual(self._login("bob@example.com", "secret2").status_code, 200)
+		with self.assertNumQueries(1):
+			self.assertEqual(self._login("BOB", "secret2").status_code, 200)
+
+	def test_wrong_password_and_unknown_user(self):
+		self.assertEqual(self._login("alice@example.com", "nope").status_code, 401)
+		with self.assertNumQueries(1):
+			self.assertEqual(self._login("nobody@example.com", "secret1").status_code, 401)
+
+	@override_settings(
+		PASSWORD_HASHERS=["mlapi.passwords.TunedPBKDF2PasswordHasher", "django.contrib.auth.hashers.MD5PasswordHasher"],
+		PASSWORD_PBKDF2_ITERATIONS=1,
+	)
+	def test_outdated_hash_is_upgraded_with_one_extra_query(self):
+		with self.assertNumQueries(2):
+			self.assertEqual(self._login("alice@example.com", "secret1").status_code, 200)
+		stored = UserCredential.objects.get(email="alice@example.com").password_hash
+		self.assertTrue(stored.startswith("pbkdf2_sha256$1$"))
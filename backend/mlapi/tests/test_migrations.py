@@ -0,0 +1,70 @@
+from django.contrib.auth.hashers import check_password
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase, override_settings
+
+
+class MigrationTestCase(TransactionTestCase):
+	"""Roll ``mlapi`` back to ``before``; each test migrates forward to ``after``."""
+
+	before = after = None
+
+	def setUp(self):
+		executor = MigrationExecutor(connection)
+		self.latest = executor.loader.graph.leaf_nodes("mlapi")
+		executor.migrate(self.before)
+		self.addCleanup(self._migrate, self.latest)
+		self.UserCredential = executor.loader.project_state(self.before).apps.get_model("mlapi", "UserCredential")
+
+	def _migrate(self, targets):
+		executor = MigrationExecutor(connection)
+		executor.loader.build_graph()
+		executor.migrate(targets)
+
+
+class NormalizeEmailsMigrationTests(MigrationTestCase):
+	before = [("mlapi", "0005_conversation_conversationturn")]
+	after = [("mlapi", "0006_login_lookup_indexes")]
+
+	def test_emails_are_lowercased(self):
+		self.UserCredential.objects.create(email=" Alice@Example.com", password_hash="x")
+		self._migrate(self.after)
+		self.assertEqual(
+			list(self.UserCredential.objects.values_list("email", flat=True)), ["alice@example.com"]
+		)
+
+	def test_case_duplicates_stop_the_migration(self):
+		self.UserCredential.objects.create(email="bob@example.com", password_hash="x")
+		self.UserCredential.objects.create(email="Bob@Example.com", password_hash="y")
+		with self.assertRaisesMessage(RuntimeError, "bob@example.com"):
+			self._migrate(self.after)
+		self.assertEqual(self.UserCredential.objects.count(), 2)
+		self.UserCredential.objects.filter(email="Bob@Example.com").delete()
+
+	def test_no_default_account_is_seeded(self):
+		self._migrate(self.after)
+		self.assertFalse(self.UserCredential.objects.exists())
+
+
+class SeedDefaultUserMigrationTests(MigrationTestCase):
+	before = [("mlapi", "0008_rename_conversation_summary_digest")]
+	after = [("mlapi", "0009_seed_default_user")]
+
+	@override_settings(MLAPI_SEED_USER_EMAIL=" Admin@Example.com", MLAPI_SEED_USER_PASSWORD="s3cret-pass")
+	def test_configured_account_is_seeded_hashed(self):
+		self._migrate(self.after)
+		credential = self.UserCredential.objects.get()
+		self.assertEqual(credential.email, "admin@example.com")
+		self.assertNotEqual(credential.password_hash, "s3cret-pass")
+		self.assertTrue(check_password("s3cret-pass", credential.password_hash))
+
+	@override_settings(MLAPI_SEED_USER_EMAIL="admin@example.com", MLAPI_SEED_USER_PASSWORD="new-pass")
+	def test_existing_account_is_left_alone(self):
+		self.UserCredential.objects.create(email="admin@example.com", password_hash="existing")
+		self._migrate(self.after)
+		self.assertEqual(self.UserCredential.objects.get().password_hash, "existing")
+
+	@override_settings(MLAPI_SEED_USER_EMAIL="", MLAPI_SEED_USER_PASSWORD="")
+	def test_nothing_is_seeded_by_default(self):
+		self._migrate(self.after)
+		self.assertFalse(self.UserCredential.objects.exists())
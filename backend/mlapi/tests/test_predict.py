@@ -0,0 +1,220 @@
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from mlapi import cache
+from mlapi.registry import ModelRegistry
+from mlapi.singleflight import SingleFlight
+
+
+def _jpeg(color):
+	buffer = io.BytesIO()
+	Image.new("RGB", (16, 16), color).save(buffer, format="JPEG")
+	return buffer.getvalue()
+
+
+class ModelTestMixin:
+	"""A one-model registry with inference mocked out."""
+
+	def setUp(self):
+		super().setUp()
+		model_dir = Path(tempfile.mkdtemp())
+		self.addCleanup(shutil.rmtree, model_dir, True)
+		(model_dir / "manifest.json").write_text(json.dumps({
+			"models": [{"name": "demo", "file": "demo", "class_names": ["cat", "dog"], "input_size": [8, 8]}],
+		}))
+		self.registry = ModelRegistry(manifest_path=model_dir / "manifest.json")
+		for target in ("mlapi.views.get_registry", "mlapi.jobs.get_registry", "mlapi.registry.get_registry"):
+			patcher = mock.patch(target, return_value=self.registry)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		patcher = mock.patch("mlapi.inference.model_input_size", return_value=(8, 8))
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		patcher = mock.patch.object(cache, "_PREDICTION_CACHE", None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+
+@override_settings(MLAPI_ADMISSION_ENABLED=False, MLAPI_PREDICTION_CACHE_ENABLED=True, MLAPI_PREDICTION_CACHE_ALIAS="")
+class PredictionCacheTests(ModelTestMixin, SimpleTestCase):
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch("mlapi.inference.predict", return_value=np.array([0.2, 0.8], dtype=np.float32))
+		self.predict = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _post(self, data, query=""):
+		upload = SimpleUploadedFile("a.jpg", data, content_type="image/jpeg")
+		return self.client.post(f"/api/demo/predict/{query}", {"file": upload})
+
+	def test_repeated_image_is_served_from_cache(self):
+		image = _jpeg("red")
+		first = self._post(image)
+		second = self._post(image)
+		self.assertEqual(first.status_code, 200)
+		self.assertEqual(first.json(), second.json())
+		self.assertEqual(self.predict.call_count, 1)
+		self.assertEqual(cache.get_prediction_cache().stats()["local_hits"], 1)
+
+	def test_cached_scores_are_rendered_per_request(self):
+		image = _jpeg("red")
+		self._post(image)
+		top = self._post(image, "?top_k=1").json()
+		self.assertEqual(self.predict.call_count, 1)
+		self.assertEqual(top["top_k"], [{"label": "dog", "score": top["confidence"]}])
+		self.assertNotIn("probabilities", top)
+
+	def test_different_images_are_predicted_separately(self):
+		self._post(_jpeg("red"))
+		self._post(_jpeg("blue"))
+		self.assertEqual(self.predict.call_count, 2)
+
+	@override_settings(MLAPI_PREDICTION_CACHE_ENABLED=False)
+	def test_cache_can_be_disabled(self):
+		image = _jpeg("red")
+		self._post(image)
+		self._post(image)
+		self.assertEqual(self.predict.call_count, 2)
+
+
+@override_settings(MLAPI_ADMISSION_ENABLED=False, MLAPI_PREDICTION_CACHE_ENABLED=False)
+class PredictFailureTests(ModelTestMixin, SimpleTestCase):
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch("mlapi.inference.predict", return_value=np.array([0.2, 0.8], dtype=np.float32))
+		self.predict = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _post(self, data):
+		upload = SimpleUploadedFile("a.jpg", data, content_type="image/jpeg")
+		return self.client.post("/api/demo/predict/", {"file": upload})
+
+	@mock.patch("mlapi.predictions.fallback_payload")
+	def test_undecodable_upload_is_a_client_error(self, fallback_payload):
+		for strict in (True, False):
+			with self.subTest(strict=strict), override_settings(MLAPI_FALLBACK_PREDICTIONS=not strict):
+				for data in (b"not an image", _jpeg("red")[:40]):
+					response = self._post(data)
+					self.assertEqual(response.status_code, 400)
+					self.assertIn("Could not decode image", response.json()["error"])
+					self.assertNotIn("Retry-After", response)
+		self.predict.assert_not_called()
+		fallback_payload.assert_not_called()
+
+	@override_settings(MLAPI_FALLBACK_PREDICTIONS=True)
+	def test_model_failure_falls_back(self):
+		self.predict.side_effect = RuntimeError("model crashed")
+		response = self._post(_jpeg("red"))
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.json()["fallback"])
+
+	@override_settings(MLAPI_FALLBACK_PREDICTIONS=False)
+	def test_model_failure_is_unavailable_in_strict_mode(self):
+		self.predict.side_effect = RuntimeError("model crashed")
+		response = self._post(_jpeg("red"))
+		self.assertEqual(response.status_code, 503)
+		self.assertIn("Retry-After", response)
+
+
+class SingleFlightTests(SimpleTestCase):
+	def test_concurrent_callers_share_one_call(self):
+		flight = SingleFlight()
+		started, release = threading.Event(), threading.Event()
+		calls = []
+
+		def work():
+			calls.append(1)
+			started.set()
+			release.wait(5)
+			return "result"
+
+		results = []
+		leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+		leader.start()
+		started.wait(5)
+		followers = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(4)]
+		for thread in followers:
+			thread.start()
+		while flight.stats()["followers"] < 4:
+			threading.Event().wait(0.01)
+		release.set()
+		for thread in [leader, *followers]:
+			thread.join(5)
+
+		self.assertEqual(calls, [1])
+		self.assertEqual(results, ["result"] * 5)
+		self.assertEqual(flight.stats()["in_flight"], 0)
+
+	def test_errors_reach_every_waiter_and_are_not_cached(self):
+		flight = SingleFlight()
+		with self.assertRaises(ValueError):
+			flight.do("key", mock.Mock(side_effect=ValueError("boom")))
+		self.assertEqual(flight.do("key", lambda: 42), 42)
+
+	def test_distinct_keys_run_separately(self):
+		flight = SingleFlight()
+		self.assertEqual([flight.do(key, lambda key=key: key) for key in "ab"], ["a", "b"])
+		self.assertEqual(flight.stats()["leaders"], 2)
+
+	async def test_async_callers_share_one_call(self):
+		flight = SingleFlight()
+		calls = []
+
+		async def work():
+			calls.append(1)
+			await asyncio.sleep(0.05)
+			return "result"
+
+		results = await asyncio.gather(*(flight.ado("key", work) for _ in range(5)))
+		self.assertEqual(calls, [1])
+		self.assertEqual(results, ["result"] * 5)
+
+	async def test_cancelled_leader_hands_off_to_a_follower(self):
+		flight = SingleFlight()
+		calls = []
+
+		async def work():
+			calls.append(1)
+			await asyncio.sleep(0.05)
+			return "result"
+
+		leader = asyncio.ensure_future(flight.ado("key", work))
+		await asyncio.sleep(0.01)
+		follower = asyncio.ensure_future(flight.ado("key", work))
+		await asyncio.sleep(0.01)
+		leader.cancel()
+
+		with self.assertRaises(asyncio.CancelledError):
+			await leader
+		self.assertEqual(await follower, "result")
+		self.assertEqual(len(calls), 2)
+		self.assertEqual(flight.stats()["in_flight"], 0)
+
+	async def test_cancelled_follower_does_not_affect_the_others(self):
+		flight = SingleFlight()
+
+		async def work():
+			await asyncio.sleep(0.05)
+			return "result"
+
+		leader = asyncio.ensure_future(flight.ado("key", work))
+		await asyncio.sleep(0.01)
+		followers = [asyncio.ensure_future(flight.ado("key", work)) for _ in range(2)]
+		await asyncio.sleep(0.01)
+		followers[0].cancel()
+
+		with self.assertRaises(asyncio.CancelledError):
+			await followers[0]
+		self.assertEqual(await leader, "result")
+		self.assertEqual(await followers[1], "result")
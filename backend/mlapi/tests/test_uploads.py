@@ -0,0 +1,124 @@
+import io
+import os
+import tarfile
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mlapi.uploads import UploadTooLarge, iter_batch_uploads, upload_error, use_image_upload_handler
+
+
+def _zip(members):
+	buffer = io.BytesIO()
+	with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+		for name, data in members.items():
+			archive.writestr(name, data)
+	return buffer.getvalue()
+
+
+def _tar(members):
+	buffer = io.BytesIO()
+	with tarfile.open(fileobj=buffer, mode="w") as archive:
+		for name, data in members.items():
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			archive.addfile(info, io.BytesIO(data))
+	return buffer.getvalue()
+
+
+class BatchUploadTests(SimpleTestCase):
+	def setUp(self):
+		self.factory = RequestFactory()
+
+	def _raw(self, body, content_type):
+		return self.factory.generic("POST", "/api/m/predict/batch/", data=body, content_type=content_type)
+
+	@override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+	def test_raw_zip_larger_than_data_upload_limit(self):
+		members = {f"{i}.jpg": os.urandom(4096) for i in range(4)}
+		body = _zip(members)
+		self.assertGreater(len(body), 1024)
+		uploads = list(iter_batch_uploads(self._raw(body, "application/zip"), 8192, 1 << 20))
+		self.assertEqual(dict(uploads), members)
+
+	def test_raw_zip_over_total_limit(self):
+		body = _zip({"a.jpg": b"\0" * 10})
+		with self.assertRaises(UploadTooLarge):
+			list(iter_batch_uploads(self._raw(body, "application/zip"), 1 << 20, len(body) - 1))
+
+	def test_zip_member_over_image_limit_is_not_extracted(self):
+		# Highly compressible: a few KB on the wire, 5 MB once extracted.
+		body = _zip({"bomb.jpg": b"\0" * (5 * 1024 * 1024)})
+		self.assertLess(len(body), 64 * 1024)
+		with self.assertRaisesMessage(UploadTooLarge, "bomb.jpg"):
+			list(iter_batch_uploads(self._raw(body, "application/zip"), 1024 * 1024, 1 << 30))
+
+	def test_extracted_total_is_capped(self):
+		body = _zip({f"{i}.jpg": b"\0" * 1000 for i in range(10)})
+		uploads = iter_batch_uploads(self._raw(body, "application/zip"), 1000, 5000)
+		with self.assertRaises(UploadTooLarge):
+			list(uploads)
+
+	def test_raw_tar_stream(self):
+		members = {"a.jpg": b"a" * 100, "b.jpg": b"b" * 200}
+		uploads = list(iter_batch_uploads(self._raw(_tar(members), "application/x-tar"), 1000, 1 << 20))
+		self.assertEqual(dict(uploads), members)
+
+	def test_raw_tar_stream_over_total_limit(self):
+		body = _tar({"a.jpg": b"a" * 100})
+		with self.assertRaises(UploadTooLarge):
+			list(iter_batch_uploads(self._raw(body, "application/x-tar"), 1000, len(body) // 2))
+
+	def test_archive_field_larger_than_image_limit(self):
+		members = {f"{i}.jpg": os.urandom(800) for i in range(4)}
+		archive = SimpleUploadedFile("images.zip", _zip(members), content_type="application/zip")
+		request = self.factory.post("/api/m/predict/batch/", {"archive": archive})
+		self.assertIsNone(use_image_upload_handler(request, 1000, max_total_bytes=1 << 20, allow_archives=True))
+		self.assertIsNone(upload_error(request))
+		self.assertGreater(request.FILES["archive"].size, 1000)
+		self.assertEqual(dict(iter_batch_uploads(request, 1000, 1 << 20)), members)
+
+	def test_archive_field_member_over_image_limit(self):
+		archive = SimpleUploadedFile("images.zip", _zip({"big.jpg": b"x" * 5000}), content_type="application/zip")
+		request = self.factory.post("/api/m/predict/batch/", {"archive": archive})
+		use_image_upload_handler(request, 1000, max_total_bytes=1 << 20, allow_archives=True)
+		self.assertIsNone(upload_error(request))
+		with self.assertRaisesMessage(UploadTooLarge, "big.jpg"):
+			list(iter_batch_uploads(request, 1000, 1 << 20))
+
+	def test_image_field_keeps_image_limit_next_to_archives(self):
+		image = SimpleUploadedFile("a.jpg", b"x" * 4096, content_type="image/jpeg")
+		request = self.factory.post("/api/m/predict/batch/", {"files": image})
+		use_image_upload_handler(request, 1000, max_total_bytes=1 << 20, allow_archives=True)
+		self.assertEqual(upload_error(request).status_code, 413)
+
+	def test_tar_member_over_image_limit(self):
+		body = _tar({"big.jpg": b"x" * 5000})
+		with self.assertRaisesMessage(UploadTooLarge, "big.jpg"):
+			list(iter_batch_uploads(self._raw(body, "application/x-tar"), 1000, 1 << 20))
+
+
+class ImageUploadHandlerTests(SimpleTestCase):
+	def setUp(self):
+		self.factory = RequestFactory()
+
+	def _multipart(self, upload):
+		return self.factory.post("/api/m/predict/", {"file": upload})
+
+	def test_image_is_buffered_and_hashed(self):
+		request = self._multipart(SimpleUploadedFile("a.jpg", b"jpeg-bytes", content_type="image/jpeg"))
+		self.assertIsNone(use_image_upload_handler(request, 1024))
+		self.assertIsNone(upload_error(request))
+		upload = request.FILES["file"]
+		self.assertEqual(upload.data, b"jpeg-bytes")
+		self.assertEqual(len(upload.sha256), 64)
+
+	def test_non_image_is_rejected(self):
+		request = self._multipart(SimpleUploadedFile("a.txt", b"text", content_type="text/plain"))
+		use_image_upload_handler(request, 1024)
+		self.assertEqual(upload_error(request).status_code, 415)
+
+	def test_declared_length_over_limit_is_rejected_before_reading(self):
+		request = self._multipart(SimpleUploadedFile("a.jpg", b"x" * 4096, content_type="image/jpeg"))
+		self.assertEqual(use_image_upload_handler(request, 1024).status_code, 413)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks.stub_upstream import StubUpstream
+from mlapi import upstream
+
+
+FAST = {"retries": 2, "backoff_base": 0.01, "backoff_cap": 0.02, "read_timeout": 5.0}
+
+
+class UpstreamPolicyTests(SimpleTestCase):
+	def setUp(self):
+		self.stub = StubUpstream(latency=0.0).start()
+		self.addCleanup(self.stub.stop)
+		self.target = f"test-{uuid.uuid4().hex}"
+		self.addCleanup(upstream._BREAKERS.pop, self.target, None)
+
+	def _policy(self, **overrides):
+		return override_settings(UPSTREAM_POLICIES={self.target: {**FAST, **overrides}})
+
+	@property
+	def url(self):
+		return f"{self.stub.url}/v1beta/models/stub:generateContent"
+
+	async def _call(self, **kwargs):
+		return await upstream.request(self.target, "POST", self.url, json={}, **kwargs)
+
+	async def test_retries_transient_errors(self):
+		self.stub.script((503, 0), (429, 0))
+		with self._policy():
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.stub.calls, 3)
+
+	async def test_client_errors_are_not_retried(self):
+		self.stub.script((400, 0))
+		with self._policy():
+			with self.assertRaises(httpx.HTTPStatusError):
+				await self._call()
+		self.assertEqual(self.stub.calls, 1)
+		self.assertEqual(upstream.get_breaker(self.target).state, "closed")
+
+	async def test_breaker_opens_and_fails_fast(self):
+		self.stub.script(*[(503, 0)] * 3)
+		with self._policy(retries=0, breaker_failures=3, breaker_reset=60):
+			for _ in range(3):
+				with self.assertRaises(httpx.HTTPStatusError):
+					await self._call()
+			with self.assertRaises(upstream.CircuitOpen):
+				await self._call()
+		self.assertEqual(self.stub.calls, 3)
+
+	async def test_half_open_trial_closes_breaker(self):
+		self.stub.script((503, 0))
+		with self._policy(retries=0, breaker_failures=1, breaker_reset=0.05):
+			with self.assertRaises(httpx.HTTPStatusError):
+				await self._call()
+			await asyncio.sleep(0.06)
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(upstream.get_breaker(self.target).state, "closed")
+
+	async def test_cancelled_trial_is_released(self):
+		self.stub.script((503, 0), (200, 1.0))
+		with self._policy(retries=0, breaker_failures=1, breaker_reset=0.05):
+			with self.assertRaises(httpx.HTTPStatusError):
+				await self._call()
+			await asyncio.sleep(0.06)
+			trial = asyncio.ensure_future(self._call())
+			await asyncio.sleep(0.2)
+			trial.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await trial
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(upstream.get_breaker(self.target).state, "closed")
+
+	async def test_trial_failing_unexpectedly_is_released(self):
+		self.stub.script((503, 0))
+		with self._policy(retries=0, breaker_failures=1, breaker_reset=0.05):
+			with self.assertRaises(httpx.HTTPStatusError):
+				await self._call()
+			await asyncio.sleep(0.06)
+			with self.assertRaises(TypeError):
+				await upstream.request(self.target, "POST", self.url, json=object())
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+
+	async def test_cancelled_stream_trial_is_released(self):
+		self.stub.script((503, 0))
+		stream_url = f"{self.stub.url}/v1beta/models/stub:streamGenerateContent"
+		with self._policy(retries=0, breaker_failures=1, breaker_reset=0.05):
+			with self.assertRaises(httpx.HTTPStatusError):
+				await self._call()
+			await asyncio.sleep(0.06)
+			self.stub._server.latency = 1.0
+
+			async def consume():
+				async for _ in upstream.stream_lines(stream_url, {}, target=self.target):
+					pass
+
+			trial = asyncio.ensure_future(consume())
+			await asyncio.sleep(0.2)
+			trial.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await trial
+			self.stub._server.latency = 0.0
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+
+	async def _stream(self):
+		stream_url = f"{self.stub.url}/v1beta/models/stub:streamGenerateContent"
+		lines = []
+		try:
+			async for line in upstream.stream_lines(stream_url, {}, target=self.target):
+				lines.append(line)
+		except httpx.TransportError as error:
+			return lines, error
+		return lines, None
+
+	async def test_stream_failing_before_any_line_is_retried(self):
+		self.stub.drop_streams(0)
+		with self._policy():
+			lines, error = await self._stream()
+		self.assertIsNone(error)
+		self.assertEqual(self.stub._server.stream_calls, 2)
+		events = [line for line in lines if line]
+		self.assertGreater(len(events), 3)
+		self.assertEqual(len(set(events)), len(events))
+
+	async def test_stream_dropped_midway_is_not_replayed(self):
+		self.stub.drop_streams(3)
+		with self._policy():
+			lines, error = await self._stream()
+		self.assertIsInstance(error, httpx.TransportError)
+		self.assertEqual(self.stub._server.stream_calls, 1)
+		events = [line for line in lines if line]
+		self.assertEqual(len(events), 3)
+		self.assertEqual(len(set(events)), 3)
+		self.assertEqual(upstream.get_breaker(self.target)._consecutive, 1)
+
+	async def test_slow_call_is_hedged(self):
+		self.stub.script((200, 1.0))
+		with self._policy(hedge_after=0.05):
+			started = time.perf_counter()
+			response = await self._call()
+		self.assertEqual(response.status_code, 200)
+		self.assertLess(time.perf_counter() - started, 0.8)
+		self.assertEqual(self.stub.calls, 2)
+
+	def test_sync_retries(self):
+		self.stub.script((503, 0), (200, 0))
+		with self._policy():
+			response = upstream.request_sync(self.target, "POST", self.url, json={})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.stub.calls, 2)
+
+	def test_sync_trial_failing_unexpectedly_is_released(self):
+		self.stub.script((503, 0))
+		with self._policy(retries=0, breaker_failures=1, breaker_reset=0.05):
+			with self.assertRaises(httpx.HTTPStatusError):
+				upstream.request_sync(self.target, "POST", self.url, json={})
+			time.sleep(0.06)
+			with self.assertRaises(TypeError):
+				upstream.request_sync(self.target, "POST", self.url, json=object())
+			response = upstream.request_sync(self.target, "POST", self.url, json={})
+		self.assertEqual(response.status_code, 200)
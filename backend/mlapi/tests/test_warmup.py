@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+
+from mlapi import warmup
+
+
+class _Registry:
+	def __init__(self, broken=()):
+		self.broken = set(broken)
+		self.loaded = set()
+
+	def names(self):
+		return ["good", "bad"]
+
+	def get(self, name):
+		if name in self.broken:
+			raise OSError(f"{name} is missing")
+		self.loaded.add(name)
+		return object(), (2, 2)
+
+	def is_loaded(self, name):
+		return name in self.loaded
+
+
+class ReadinessTests(SimpleTestCase):
+	def setUp(self):
+		saved = {key: (dict(value) if isinstance(value, dict) else value) for key, value in warmup._STATE.items()}
+		self.addCleanup(warmup._STATE.update, saved)
+		warmup._STATE.update({"started": False, "ready": False, "models": {}})
+
+	def _preload(self, registry):
+		with mock.patch("mlapi.registry.get_registry", return_value=registry):
+			warmup.preload_models(warmup=False)
+			return warmup.readiness()
+
+	def test_ready_without_preloading(self):
+		self.assertEqual(warmup.readiness()[0], True)
+
+	def test_ready_when_every_model_loaded(self):
+		is_ready, details = self._preload(_Registry())
+		self.assertTrue(is_ready)
+		self.assertEqual(details["failed"], [])
+
+	def test_not_ready_while_a_model_failed(self):
+		registry = _Registry(broken={"bad"})
+		is_ready, details = self._preload(registry)
+		self.assertFalse(is_ready)
+		self.assertEqual(details["failed"], ["bad"])
+
+		# A later lazy load that succeeds makes the worker ready again.
+		registry.loaded.add("bad")
+		with mock.patch("mlapi.registry.get_registry", return_value=registry):
+			self.assertTrue(warmup.readiness()[0])
+
+
+class PreloadStartupTests(SimpleTestCase):
+	@override_settings(MLAPI_PRELOAD_MODELS=True, MLAPI_INFERENCE_SOCKET="")
+	def test_app_ready_does_not_preload(self):
+		with mock.patch.object(warmup, "start_preload") as start:
+			apps.get_app_config("mlapi").ready()
+		start.assert_not_called()
+
+	@override_settings(MLAPI_PRELOAD_MODELS=True, MLAPI_INFERENCE_SOCKET="", MLAPI_PRELOAD_BACKGROUND=False)
+	def test_server_entry_point_preloads(self):
+		with mock.patch.object(warmup, "start_preload") as start:
+			warmup.preload_for_server()
+		start.assert_called_once_with(background=False, warmup=True)
+
+	@override_settings(MLAPI_PRELOAD_MODELS=True, MLAPI_INFERENCE_SOCKET="/tmp/inference.sock")
+	def test_no_preload_with_shared_inference_process(self):
+		with mock.patch.object(warmup, "start_preload") as start:
+			warmup.preload_for_server()
+		start.assert_not_called()
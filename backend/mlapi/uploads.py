@@ -0,0 +1,226 @@
+import hashlib
+import io
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.http import JsonResponse
+
+
+ARCHIVE_CONTENT_TYPES = frozenset({
+	"application/zip",
+	"application/x-zip-compressed",
+	"application/x-tar",
+	"application/gzip",
+	"application/x-gzip",
+})
+
+
+class UploadTooLarge(Exception):
+	"""Raised while reading a batch upload that goes over its size limits."""
+
+
+class ImageUpload(UploadedFile):
+	"""An upload held in one in-memory ``bytes`` buffer, hashed while it arrived.
+
+	``file`` is a ``BytesIO`` sharing ``data`` (CPython does not copy an
+	immutable initial buffer), so the decoder reads the received bytes
+	directly and ``sha256`` saves re-reading the upload to hash it.
+	"""
+
+	def __init__(self, data, name, content_type, sha256, charset=None, content_type_extra=None):
+		super().__init__(io.BytesIO(data), name, content_type, len(data), charset, content_type_extra)
+		self.data = data
+		self.sha256 = sha256
+
+	def open(self, mode=None):
+		self.file.seek(0)
+		return self
+
+	def chunks(self, chunk_size=None):
+		view = memoryview(self.data)
+		size = chunk_size or self.DEFAULT_CHUNK_SIZE
+		for start in range(0, len(view), size):
+			yield view[start:start + size]
+
+	def multiple_chunks(self, chunk_size=None):
+		return False
+
+
+class ImageUploadHandler(FileUploadHandler):
+	"""Keeps image uploads in memory up to a size cap, hashing as chunks arrive.
+
+	Files whose declared content type is not ``image/*`` (or an archive type,
+	for the ``archive`` field when ``allow_archives`` is set) are skipped
+	without buffering, and the upload stops as soon as a file passes
+	``max_file_bytes`` or all files together pass ``max_total_bytes``. An
+	archive holds many images, so it is only held to ``max_total_bytes``;
+	its members are checked against ``max_file_bytes`` when extracted. The
+	reason is left in ``error`` as ``(status, message)`` for the view.
+	"""
+
+	def __init__(self, request=None, max_file_bytes=10 * 1024 * 1024, max_total_bytes=None,
+			allow_archives=False):
+		super().__init__(request)
+		self.max_file_bytes = max_file_bytes
+		self.max_total_bytes = max_total_bytes or max_file_bytes
+		self.allow_archives = allow_archives
+		self.error = None
+		self._total = 0
+		self._chunks = None
+		self._digest = None
+		self._file_limit = max_file_bytes
+
+	def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+			content_type_extra=None):
+		super().new_file(
+			field_name, file_name, content_type, content_length, charset, content_type_extra
+		)
+		content_type = (content_type or "").lower()
+		is_archive = (
+			self.allow_archives and field_name == "archive" and content_type in ARCHIVE_CONTENT_TYPES
+		)
+		if not content_type.startswith("image/") and not is_archive:
+			self.error = (415, f"Unsupported content type '{content_type or 'unknown'}' for {file_name}")
+			raise SkipFile()
+		self._file_limit = self.max_total_bytes if is_archive else self.max_file_bytes
+		self._chunks = []
+		self._digest = hashlib.sha256()
+
+	def receive_data_chunk(self, raw_data, start):
+		self._total += len(raw_data)
+		if start + len(raw_data) > self._file_limit:
+			self.error = (413, f"{self.file_name} exceeds {self._file_limit} bytes")
+			raise StopUpload(connection_reset=True)
+		if self._total > self.max_total_bytes:
+			self.error = (413, f"Upload exceeds {self.max_total_bytes} bytes")
+			raise StopUpload(connection_reset=True)
+		self._chunks.append(raw_data)
+		self._digest.update(raw_data)
+		return None
+
+	def file_complete(self, file_size):
+		data = b"".join(self._chunks)
+		self._chunks = None
+		return ImageUpload(
+			data,
+			self.file_name,
+			self.content_type,
+			self._digest.hexdigest(),
+			charset=self.charset,
+			content_type_extra=self.content_type_extra,
+		)
+
+
+def use_image_upload_handler(request, max_file_bytes, max_total_bytes=None, allow_archives=False):
+	"""Install :class:`ImageUploadHandler` on ``request`` before its body is read.
+
+	Returns a 413 response straight away when the declared ``Content-Length``
+	is already over the limit, otherwise ``None``.
+	"""
+	handler = ImageUploadHandler(
+		request,
+		max_file_bytes=max_file_bytes,
+		max_total_bytes=max_total_bytes,
+		allow_archives=allow_archives,
+	)
+	try:
+		content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+	except ValueError:
+		content_length = 0
+	if content_length > handler.max_total_bytes:
+		return JsonResponse({"error": f"Upload exceeds {handler.max_total_bytes} bytes"}, status=413)
+
+	request.upload_handlers = [handler]
+	return None
+
+
+def upload_error(request):
+	"""Response for an upload the handler rejected, or ``None``. Reads ``request.FILES``."""
+	request.FILES
+	for handler in request.upload_handlers:
+		if isinstance(handler, ImageUploadHandler) and handler.error is not None:
+			status, message = handler.error
+			return JsonResponse({"error": message}, status=status)
+	return None
+
+
+class _BoundedReader:
+	"""File-like view of ``stream`` that raises once more than ``limit`` bytes are read."""
+
+	def __init__(self, stream, limit):
+		self.stream = stream
+		self.limit = limit
+		self.total = 0
+
+	def read(self, size=-1):
+		data = self.stream.read(size)
+		self.total += len(data)
+		if self.total > self.limit:
+			raise UploadTooLarge(f"Upload exceeds {self.limit} bytes")
+		return data
+
+
+def iter_batch_uploads(request, max_file_bytes, max_total_bytes):
+	"""Yield ``(name, bytes)`` for every image in a batch request.
+
+	Accepts repeated ``files``/``file`` form fields, a zip or tar upload in the
+	``archive`` field, or a raw zip/tar request body. A raw zip is spooled to
+	a temporary file (it needs seeking) and a raw tar is read as a stream,
+	both capped at ``max_total_bytes``. Archive members are checked against
+	``max_file_bytes`` by their declared size before being extracted, and
+	the extracted total against ``max_total_bytes``; either raises
+	:class:`UploadTooLarge`.
+	"""
+	total = 0
+
+	def accept(name, size):
+		nonlocal total
+		if size > max_file_bytes:
+			raise UploadTooLarge(f"{name} exceeds {max_file_bytes} bytes")
+		total += size
+		if total > max_total_bytes:
+			raise UploadTooLarge(f"Images in the upload exceed {max_total_bytes} bytes")
+
+	def from_archive(handle, streaming=False):
+		if not streaming and zipfile.is_zipfile(handle):
+			handle.seek(0)
+			with zipfile.ZipFile(handle) as archive:
+				for info in archive.infolist():
+					if not info.is_dir():
+						# Reads stop at the declared size, so this bounds extraction.
+						accept(info.filename, info.file_size)
+						yield info.filename, archive.read(info)
+			return
+
+		if not streaming:
+			handle.seek(0)
+		with tarfile.open(fileobj=handle, mode="r|*" if streaming else "r:*") as archive:
+			for member in archive:
+				if member.isfile():
+					accept(member.name, member.size)
+					yield member.name, archive.extractfile(member).read()
+
+	content_type = request.content_type or ""
+	if content_type in ("application/zip", "application/x-zip-compressed"):
+		# Read the stream rather than request.body, which is meant for small
+		# bodies and capped by DATA_UPLOAD_MAX_MEMORY_SIZE.
+		with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+			shutil.copyfileobj(_BoundedReader(request, max_total_bytes), spool, 64 * 1024)
+			yield from from_archive(spool)
+		return
+	if content_type in ("application/x-tar", "application/gzip", "application/x-gzip"):
+		yield from from_archive(_BoundedReader(request, max_total_bytes), streaming=True)
+		return
+
+	for file_obj in request.FILES.getlist("files") + request.FILES.getlist("file"):
+		accept(file_obj.name, file_obj.size)
+		data = getattr(file_obj, "data", None)
+		yield file_obj.name, data if data is not None else file_obj.read()
+
+	archive = request.FILES.get("archive")
+	if archive:
+		yield from from_archive(archive)
@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_POLICY = {
+	"connect_timeout": 5.0,
+	"read_timeout": 60.0,
+	"retries": 2,
+	"backoff_base": 0.25,
+	"backoff_cap": 4.0,
+	"breaker_failures": 5,
+	"breaker_reset": 30.0,
+	"hedge_after": 0.0,
+}
+
+
+class UpstreamBusy(Exception):
+	"""Raised when no upstream slot frees up within the configured wait."""
+
+
+class CircuitOpen(Exception):
+	"""Raised without calling upstream while a target's circuit breaker is open."""
+
+
+class CircuitBreaker:
+	"""Consecutive-failure breaker shared by every call to one upstream target.
+
+	After ``failures`` failed attempts in a row the breaker opens and calls fail
+	fast for ``reset_timeout`` seconds; then a single trial call is let through
+	(half-open) and its outcome closes or re-opens the breaker. ``allow()``
+	returns ``TRIAL`` to that caller, which must call :meth:`release_trial`
+	when it finishes without recording an outcome (cancelled, or an
+	unexpected error) so the next call can try instead.
+	"""
+
+	TRIAL = "trial"
+
+	def __init__(self, failures=5, reset_timeout=30.0):
+		self.failures = max(int(failures), 1)
+		self.reset_timeout = reset_timeout
+		self.state = "closed"
+		self._consecutive = 0
+		self._opened_at = 0.0
+		self._trial_running = False
+		self._lock = threading.Lock()
+
+	def allow(self):
+		with self._lock:
+			if self.state == "closed":
+				return True
+			if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+				self.state = "half_open"
+				self._trial_running = False
+			if self.state == "half_open" and not self._trial_running:
+				self._trial_running = True
+				return self.TRIAL
+			return False
+
+	def release_trial(self):
+		"""Give up a half-open trial whose outcome was never recorded."""
+		with self._lock:
+			if self.state == "half_open":
+				self._trial_running = False
+
+	def record_success(self):
+		with self._lock:
+			self.state = "closed"
+			self._consecutive = 0
+			self._trial_running = False
+
+	def record_failure(self):
+		with self._lock:
+			self._consecutive += 1
+			self._trial_running = False
+			if self.state == "half_open" or self._consecutive >= self.failures:
+				if self.state != "open":
+					logger.warning("Circuit breaker opened after %s failures", self._consecutive)
+				self.state = "open"
+				self._opened_at = time.monotonic()
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_policy(target):
+	"""Merge ``UPSTREAM_POLICIES[target]`` from settings over the defaults."""
+	policy = dict(DEFAULT_POLICY)
+	policy.update(getattr(settings, "UPSTREAM_POLICIES", {}).get(target, {}))
+	return policy
+
+
+def get_breaker(target):
+	breaker = _BREAKERS.get(target)
+	if breaker is None:
+		with _BREAKERS_LOCK:
+			breaker = _BREAKERS.get(target)
+			if breaker is None:
+				policy = get_policy(target)
+				breaker = CircuitBreaker(policy["breaker_failures"], policy["breaker_reset"])
+				_BREAKERS[target] = breaker
+	return breaker
+
+
+def _timeout(policy):
+	return httpx.Timeout(policy["read_timeout"], connect=policy["connect_timeout"])
+
+
+def _backoff(policy, attempt, response=None):
+	"""Full-jitter exponential backoff, honouring a short ``Retry-After``."""
+	ceiling = min(policy["backoff_cap"], policy["backoff_base"] * (2 ** attempt))
+	if response is not None:
+		retry_after = response.headers.get("Retry-After", "")
+		if retry_after.isdigit():
+			return min(float(retry_after), policy["backoff_cap"])
+	return random.uniform(0, ceiling)
+
+
+def _is_retryable(error):
+	if isinstance(error, httpx.HTTPStatusError):
+		return error.response.status_code in RETRY_STATUSES
+	return isinstance(error, httpx.TransportError)
+
+
+def _check(response):
+	if response.is_error:
+		response.raise_for_status()
+	return response
+
+
+# One client and concurrency limiter per event loop: httpx connection pools
+# are bound to the loop that created them. Under ASGI there is a single
+# long-lived loop, so every request shares the same keep-alive pool.
+_CLIENTS = weakref.WeakKeyDictionary()
+_LIMITS = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+	loop = asyncio.get_running_loop()
+	client = _CLIENTS.get(loop)
+	if client is None or client.is_closed:
+		client = httpx.AsyncClient(
+			timeout=httpx.Timeout(
+				getattr(settings, "CHAT_READ_TIMEOUT", 60.0),
+				connect=getattr(settings, "CHAT_CONNECT_TIMEOUT", 5.0),
+			),
+			limits=httpx.Limits(
+				max_connections=getattr(settings, "CHAT_MAX_CONNECTIONS", 100),
+				max_keepalive_connections=getattr(settings, "CHAT_MAX_KEEPALIVE", 20),
+				keepalive_expiry=getattr(settings, "CHAT_KEEPALIVE_EXPIRY", 30.0),
+			),
+		)
+		_CLIENTS[loop] = client
+	return client
+
+
+def _get_limiter():
+	loop = asyncio.get_running_loop()
+	limiter = _LIMITS.get(loop)
+	if limiter is None:
+		limiter = asyncio.Semaphore(getattr(settings, "CHAT_MAX_CONCURRENCY", 200))
+		_LIMITS[loop] = limiter
+	return limiter
+
+
+async def _acquire_slot():
+	limiter = _get_limiter()
+	try:
+		await asyncio.wait_for(limiter.acquire(), getattr(settings, "CHAT_QUEUE_TIMEOUT", 10.0))
+	except asyncio.TimeoutError as exc:
+		raise UpstreamBusy("Too many concurrent upstream requests") from exc
+	return limiter
+
+
+async def _hedged(send, hedge_after):
+	"""Run ``send()``; if it is still pending after ``hedge_after``s, race a second copy."""
+	first = asyncio.ensure_future(send())
+	if not hedge_after:
+		return await first
+
+	done, _ = await asyncio.wait({first}, timeout=hedge_after)
+	if done:
+		return first.result()
+
+	second = asyncio.ensure_future(send())
+	pending = {first, second}
+	error = None
+	while pending:
+		done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+		for task in done:
+			if task.exception() is None:
+				for other in pending:
+					other.cancel()
+				return task.result()
+			error = task.exception()
+	raise error
+
+
+async def request(target, method, url, **kwargs):
+	"""Call ``url`` under ``target``'s policy: timeouts, retries, breaker and hedging.
+
+	Retries 429/5xx responses and transport errors with jittered exponential
+	backoff. Raises ``CircuitOpen`` without calling upstream while the target's
+	breaker is open, and the last ``httpx`` error once retries are exhausted.
+	"""
+	policy = get_policy(target)
+	breaker = get_breaker(target)
+	client = get_async_client()
+
+	async def send():
+		with metrics.span("upstream_request", target=target):
+			return _check(await client.request(method, url, timeout=_timeout(policy), **kwargs))
+
+	limiter = await _acquire_slot()
+	try:
+		for attempt in range(policy["retries"] + 1):
+			allowed = breaker.allow()
+			if not allowed:
+				raise CircuitOpen(f"{target} is unavailable")
+			try:
+				response = await _hedged(send, policy["hedge_after"])
+			except (httpx.HTTPStatusError, httpx.TransportError) as error:
+				if not _is_retryable(error):
+					breaker.record_success()
+					raise
+				breaker.record_failure()
+				if attempt >= policy["retries"]:
+					raise
+				await asyncio.sleep(_backoff(policy, attempt, getattr(error, "response", None)))
+				continue
+			else:
+				breaker.record_success()
+				return response
+			finally:
+				if allowed is breaker.TRIAL:
+					breaker.release_trial()
+	finally:
+		limiter.release()
+
+
+async def post_json(url, body, headers=None, target="gemini"):
+	"""POST ``body`` as JSON under ``target``'s policy and return the response.
+
+	At most ``CHAT_MAX_CONCURRENCY`` calls run at once per process; callers
+	wait up to ``CHAT_QUEUE_TIMEOUT`` seconds for a slot before ``UpstreamBusy``.
+	"""
+	return await request(
+		target,
+		"POST",
+		url,
+		json=body,
+		headers={"Content-Type": "application/json", **(headers or {})},
+	)
+
+
+async def stream_lines(url, body, headers=None, target="gemini"):
+	"""POST ``body`` as JSON and yield the response body line by line.
+
+	Failures before the first byte are retried like :func:`request`; once
+	lines have been yielded the stream is never replayed. The concurrency
+	slot is held until the stream is fully consumed or closed.
+	"""
+	policy = get_policy(target)
+	breaker = get_breaker(target)
+	client = get_async_client()
+
+	limiter = await _acquire_slot()
+	yielded = False
+	try:
+		for attempt in range(policy["retries"] + 1):
+			allowed = breaker.allow()
+			if not allowed:
+				raise CircuitOpen(f"{target} is unavailable")
+			try:
+				started = time.perf_counter()
+				async with client.stream(
+					"POST",
+					url,
+					json=body,
+					headers={"Content-Type": "application/json", **(headers or {})},
+					timeout=_timeout(policy),
+				) as response:
+					# Time to response headers; the body streams to the client after.
+					metrics.observe(
+						"mlapi_upstream_request_seconds",
+						time.perf_counter() - started,
+						outcome="error" if response.is_error else "ok",
+						target=target,
+					)
+					if response.is_error:
+						await response.aread()
+						response.raise_for_status()
+					breaker.record_success()
+					async for line in response.aiter_lines():
+						yielded = True
+						yield line
+				return
+			except (httpx.HTTPStatusError, httpx.TransportError) as error:
+				if yielded:
+					# Part of the reply is already with the caller; replaying it would duplicate it.
+					breaker.record_failure()
+					raise
+				if not _is_retryable(error):
+					breaker.record_success()
+					raise
+				breaker.record_failure()
+				if attempt >= policy["retries"]:
+					raise
+				await asyncio.sleep(_backoff(policy, attempt, getattr(error, "response", None)))
+			finally:
+				if allowed is breaker.TRIAL:
+					breaker.release_trial()
+	finally:
+		limiter.release()
+
+
+_SYNC_CLIENT = None
+_SYNC_LOCK = threading.Lock()
+_HEDGE_POOL = None
+
+
+def get_sync_client():
+	"""Shared, thread-safe pooled client for sync views."""
+	global _SYNC_CLIENT
+	if _SYNC_CLIENT is None:
+		with _SYNC_LOCK:
+			if _SYNC_CLIENT is None:
+				_SYNC_CLIENT = httpx.Client(
+					limits=httpx.Limits(
+						max_connections=getattr(settings, "CHAT_MAX_CONNECTIONS", 100),
+						max_keepalive_connections=getattr(settings, "CHAT_MAX_KEEPALIVE", 20),
+						keepalive_expiry=getattr(settings, "CHAT_KEEPALIVE_EXPIRY", 30.0),
+					),
+				)
+	return _SYNC_CLIENT
+
+
+def _hedge_pool():
+	global _HEDGE_POOL
+	if _HEDGE_POOL is None:
+		with _SYNC_LOCK:
+			if _HEDGE_POOL is None:
+				_HEDGE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mlapi-hedge")
+	return _HEDGE_POOL
+
+
+def _hedged_sync(send, hedge_after):
+	if not hedge_after:
+		return send()
+
+	pool = _hedge_pool()
+	first = pool.submit(send)
+	done, _ = wait({first}, timeout=hedge_after)
+	if done:
+		return first.result()
+
+	pending = {first, pool.submit(send)}
+	error = None
+	while pending:
+		done, pending = wait(pending, return_when=FIRST_COMPLETED)
+		for future in done:
+			if future.exception() is None:
+				return future.result()
+			error = future.exception()
+	raise error
+
+
+def request_sync(target, method, url, **kwargs):
+	"""Blocking counterpart of :func:`request` for sync views."""
+	policy = get_policy(target)
+	breaker = get_breaker(target)
+	client = get_sync_client()
+
+	def send():
+		with metrics.span("upstream_request", target=target):
+			return _check(client.request(method, url, timeout=_timeout(policy), **kwargs))
+
+	for attempt in range(policy["retries"] + 1):
+		allowed = breaker.allow()
+		if not allowed:
+			raise CircuitOpen(f"{target} is unavailable")
+		try:
+			response = _hedged_sync(send, policy["hedge_after"])
+		except (httpx.HTTPStatusError, httpx.TransportError) as error:
+			if not _is_retryable(error):
+				breaker.record_success()
+				raise
+			breaker.record_failure()
+			if attempt >= policy["retries"]:
+				raise
+			time.sleep(_backoff(policy, attempt, getattr(error, "response", None)))
+			continue
+		else:
+			breaker.record_success()
+			return response
+		finally:
+			if allowed is breaker.TRIAL:
+				breaker.release_trial()
@@ -9,6 +9,11 @@ urlpatterns = [
 	path("signup/", views.signup, name="signup"),
 	path("google-auth/", views.google_auth, name="google_auth"),
 	path("google-client-id/", views.get_google_client_id, name="get_google_client_id"),
-	path("flower/predict/", views.predict_flower, name="predict_flower"),
-	path("animal/predict/", views.predict_animal, name="predict_animal"),
+	path("ready/", views.ready, name="ready"),
+	path("metrics/", views.metrics_view, name="metrics"),
+	path("jobs/", views.create_job, name="create_job"),
+	path("jobs/<uuid:job_id>/", views.job_status, name="job_status"),
+	path("<str:model_name>/predict/", views.predict, name="predict"),
+	path("<str:model_name>/predict/batch/", views.predict_batch, name="predict_batch"),
+	path("<str:model_name>/classes/", views.model_classes, name="model_classes"),
 ]
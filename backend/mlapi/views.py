@@ -1,25 +1,54 @@
 import json
+import logging
+import math
 import os
-import urllib.request
-import urllib.error
-import pickle
-import sys
-from pathlib import Path
-
-from django.http import JsonResponse
-from django.contrib.auth.hashers import check_password, make_password
+
+import httpx
+from asgiref.sync import sync_to_async
+
+try:
+	import orjson
+except ImportError:  # optional: faster serialization of prediction responses
+	orjson = None
+
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django.urls import reverse
+
+from . import (
+	admission,
+	auth_tokens,
+	conversations,
+	google_tokens,
+	inference,
+	jobs,
+	metrics,
+	passwords,
+	predictions,
+	upstream,
+)
+from .cache import get_prediction_cache, prediction_cache_key
+from .chat_cache import conversation_key, get_chat_cache
+from .models import Conversation, PredictionJob, UserCredential
+from .preprocessing import preprocess_upload
+from .registry import get_registry
+from .singleflight import get_single_flight
+from .uploads import UploadTooLarge, iter_batch_uploads, upload_error, use_image_upload_handler
+from .warmup import readiness
 
-from .models import UserCredential
 
+logger = logging.getLogger(__name__)
 
 API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
-GEMINI_URL = (
-	"https://generativelanguage.googleapis.com/v1beta/models/"
-	"gemini-2.5-flash:generateContent"
-)
+GEMINI_URL = f"{settings.GEMINI_API_BASE}/v1beta/models/gemini-2.5-flash:generateContent"
+GEMINI_STREAM_URL = f"{settings.GEMINI_API_BASE}/v1beta/models/gemini-2.5-flash:streamGenerateContent"
+GOOGLE_TOKEN_URL = f"{settings.GOOGLE_OAUTH_BASE}/token"
+GOOGLE_TOKENINFO_URL = f"{settings.GOOGLE_OAUTH_BASE}/tokeninfo"
 
 SYSTEM_PROMPT = (
 	"Your name is Gojo. Answer the user's question directly and exactly. "
@@ -35,91 +64,6 @@ LANGUAGE_NAMES = {
 	'hi': 'Hindi',
 }
 
-MODEL_DIR = Path(__file__).resolve().parent / "models"
-MODEL_BASENAME = "flowers_mobilenet"
-MODEL_PATH = MODEL_DIR / f"{MODEL_BASENAME}.pkl"
-MODEL_KERAS_PATH = MODEL_DIR / f"{MODEL_BASENAME}.keras"
-MODEL_H5_PATH = MODEL_DIR / f"{MODEL_BASENAME}.h5"
-CLASS_NAMES = ["Daisy", "Dandelion", "Roses", "Sunflowers", "Tulips"]
-_MODEL = None
-_MODEL_INPUT_SIZE = None
-
-ANIMAL_MODEL_BASENAME = "animal_mobilenet"
-ANIMAL_MODEL_PATH = MODEL_DIR / f"{ANIMAL_MODEL_BASENAME}.pkl"
-ANIMAL_MODEL_KERAS_PATH = MODEL_DIR / f"{ANIMAL_MODEL_BASENAME}.keras"
-ANIMAL_MODEL_H5_PATH = MODEL_DIR / f"{ANIMAL_MODEL_BASENAME}.h5"
-ANIMAL_CLASS_NAMES = [
-	"abyssinian (cat)",
-	"american_bulldog (dog)",
-	"american_pit_bull_terrier (dog)",
-	"basset_hound (dog)",
-	"beagle (dog)",
-	"bengal (cat)",
-	"birman (cat)",
-	"bombay (cat)",
-	"boxer (dog)",
-	"british_shorthair (cat)",
-	"chihuahua (dog)",
-	"egyptian_mau (cat)",
-	"english_cocker_spaniel (dog)",
-	"english_setter (dog)",
-	"german_shorthaired (dog)",
-	"great_pyrenees (dog)",
-	"havanese (dog)",
-	"japanese_chin (dog)",
-	"keeshond (dog)",
-	"leonberger (dog)",
-	"maine_coon (cat)",
-	"miniature_pinscher (dog)",
-	"newfoundland (dog)",
-	"persian (cat)",
-	"pomeranian (dog)",
-	"pug (dog)",
-	"ragdoll (cat)",
-	"russian_blue (cat)",
-	"saint_bernard (dog)",
-	"samoyed (dog)",
-	"scottish_terrier (dog)",
-	"shiba_inu (dog)",
-	"siamese (cat)",
-	"siberian (cat)",
-	"staffordshire_bull_terrier (dog)",
-	"wheaten_terrier (dog)",
-	"yorkshire_terrier (dog)",
-]
-_ANIMAL_MODEL = None
-_ANIMAL_MODEL_INPUT_SIZE = None
-
-
-def _build_class_names(class_names, size):
-	if class_names:
-		return class_names
-	return [f"Class {i}" for i in range(size)]
-
-
-def _fallback_prediction(file_obj, class_names, default_count=5):
-	import hashlib
-
-	file_obj.seek(0)
-	data = file_obj.read()
-	file_obj.seek(0)
-
-	digest = hashlib.sha256(data).digest()
-	resolved_names = _build_class_names(class_names, max(default_count, 1))
-	index = digest[0] % len(resolved_names)
-	confidence = 0.55 + (digest[1] / 255.0) * 0.4
-
-	base = (1.0 - confidence) / max(len(resolved_names) - 1, 1)
-	probabilities = {name: base for name in resolved_names}
-	probabilities[resolved_names[index]] = confidence
-
-	return resolved_names[index], float(confidence), probabilities
-
-
-def _fallback_flower_prediction(file_obj):
-	return _fallback_prediction(file_obj, CLASS_NAMES, default_count=len(CLASS_NAMES))
-
-
 def _fallback_response(message):
 	text = message.lower().strip()
 	if "what can you do" in text or "what do you do" in text or "help" == text:
@@ -140,144 +84,39 @@ def _get_api_key():
 	return getattr(settings, 'CHAT_API_KEY', '').strip() or API_KEY
 
 
-def _ensure_default_user():
-	default_email = "nijanth"
-	default_password = "2428"
-
-	if not UserCredential.objects.filter(email=default_email).exists():
-		UserCredential.objects.create(
-			email=default_email,
-			password_hash=make_password(default_password),
-		)
-
-
-def _load_flower_model():
-	global _MODEL, _MODEL_INPUT_SIZE
-	if _MODEL is not None:
-		return _MODEL, _MODEL_INPUT_SIZE
-
-	if not (MODEL_PATH.exists() or MODEL_KERAS_PATH.exists() or MODEL_H5_PATH.exists()):
-		raise FileNotFoundError("Flower model not found")
-
-	try:
-		from tensorflow import keras  # noqa: F401
-	except Exception as tf_exc:
-		try:
-			import keras  # noqa: F401
-		except Exception as keras_exc:
-			raise ImportError(
-				"TensorFlow/Keras is required to load the flower model: "
-				f"{keras_exc or tf_exc} (python: {sys.executable})"
-			) from keras_exc
-
-	if MODEL_KERAS_PATH.exists() or MODEL_H5_PATH.exists():
-		from tensorflow import keras
-		model_file = MODEL_KERAS_PATH if MODEL_KERAS_PATH.exists() else MODEL_H5_PATH
-		_MODEL = keras.models.load_model(model_file)
-	else:
-		try:
-			with MODEL_PATH.open("rb") as handle:
-				_MODEL = pickle.load(handle)
-		except Exception as exc:
-			raise RuntimeError(
-				"Model pickle is incompatible with this Keras version. "
-				"Re-save the model as plant_model.keras or plant_model.h5 "
-				"in backend/mlapi/models."
-			) from exc
-
-	input_shape = getattr(_MODEL, "input_shape", None)
-	resolved_shape = None
-	if isinstance(input_shape, (list, tuple)):
-		if len(input_shape) > 0 and isinstance(input_shape[0], (list, tuple)):
-			resolved_shape = input_shape[0]
-		else:
-			resolved_shape = input_shape
-
-	if resolved_shape and len(resolved_shape) >= 3:
-		if len(resolved_shape) >= 4 and resolved_shape[1] in (1, 3) and resolved_shape[-1] not in (1, 3):
-			height = resolved_shape[2] or 224
-			width = resolved_shape[3] or 224
-		else:
-			height = resolved_shape[1] or 224
-			width = resolved_shape[2] or 224
-	else:
-		height = 224
-		width = 224
-
-	_MODEL_INPUT_SIZE = (int(width), int(height))
-	return _MODEL, _MODEL_INPUT_SIZE
+def _login_password_hash(email):
+	"""Return ``(source, pk, password_hash)`` for ``email`` in a single query.
 
+	``UserCredential`` rows (source 0) take precedence over Django users
+	(source 1), which are matched case-insensitively on username (or email)
+	through the ``Lower()`` indexes added in migration 0006.
+	"""
+	credentials = (
+		UserCredential.objects.filter(email=email)
+		.annotate(source=Value(0))
+		.values_list("source", "pk", "password_hash")
+	)
+	match = Q(username_lower=email)
+	if "@" in email:
+		match |= Q(email_lower=email)
+	django_users = (
+		User.objects.annotate(username_lower=Lower("username"), email_lower=Lower("email"))
+		.filter(match)
+		.annotate(source=Value(1))
+		.values_list("source", "pk", "password")
+	)
+	return credentials.union(django_users, all=True).order_by("source").first()
 
-def _load_animal_model():
-	global _ANIMAL_MODEL, _ANIMAL_MODEL_INPUT_SIZE
-	if _ANIMAL_MODEL is not None:
-		return _ANIMAL_MODEL, _ANIMAL_MODEL_INPUT_SIZE
-
-	if not (
-		ANIMAL_MODEL_PATH.exists()
-		or ANIMAL_MODEL_KERAS_PATH.exists()
-		or ANIMAL_MODEL_H5_PATH.exists()
-	):
-		raise FileNotFoundError("Animal model not found")
 
-	try:
-		from tensorflow import keras  # noqa: F401
-	except Exception as tf_exc:
-		try:
-			import keras  # noqa: F401
-		except Exception as keras_exc:
-			raise ImportError(
-				"TensorFlow/Keras is required to load the animal model: "
-				f"{keras_exc or tf_exc} (python: {sys.executable})"
-			) from keras_exc
-
-	if ANIMAL_MODEL_KERAS_PATH.exists() or ANIMAL_MODEL_H5_PATH.exists():
-		from tensorflow import keras
-		model_file = (
-			ANIMAL_MODEL_KERAS_PATH
-			if ANIMAL_MODEL_KERAS_PATH.exists()
-			else ANIMAL_MODEL_H5_PATH
-		)
-		_ANIMAL_MODEL = keras.models.load_model(model_file)
-	else:
-		try:
-			with ANIMAL_MODEL_PATH.open("rb") as handle:
-				_ANIMAL_MODEL = pickle.load(handle)
-		except Exception as exc:
-			raise RuntimeError(
-				"Model pickle is incompatible with this Keras version. "
-				"Re-save the model as animal_mobilenet.keras or animal_mobilenet.h5 "
-				"in backend/mlapi/models."
-			) from exc
-
-	input_shape = getattr(_ANIMAL_MODEL, "input_shape", None)
-	resolved_shape = None
-	if isinstance(input_shape, (list, tuple)):
-		if len(input_shape) > 0 and isinstance(input_shape[0], (list, tuple)):
-			resolved_shape = input_shape[0]
-		else:
-			resolved_shape = input_shape
-
-	if resolved_shape and len(resolved_shape) >= 3:
-		if (
-			len(resolved_shape) >= 4
-			and resolved_shape[1] in (1, 3)
-			and resolved_shape[-1] not in (1, 3)
-		):
-			height = resolved_shape[2] or 224
-			width = resolved_shape[3] or 224
-		else:
-			height = resolved_shape[1] or 224
-			width = resolved_shape[2] or 224
+def _store_rehashed_password(source, pk, password_hash):
+	if source == 0:
+		UserCredential.objects.filter(pk=pk).update(password_hash=password_hash)
 	else:
-		height = 224
-		width = 224
-
-	_ANIMAL_MODEL_INPUT_SIZE = (int(width), int(height))
-	return _ANIMAL_MODEL, _ANIMAL_MODEL_INPUT_SIZE
+		User.objects.filter(pk=pk).update(password=password_hash)
 
 
 @csrf_exempt
+@admission.admit("auth")
 def signup(request):
 	if request.method != "POST":
 		return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -300,16 +139,19 @@ def signup(request):
 		# Create new user
 		UserCredential.objects.create(
 			email=email,
-			password_hash=make_password(password),
+			password_hash=passwords.hash_password(password),
 		)
 		
 		return JsonResponse({"ok": True, "message": "Account created successfully"})
 		
+	except passwords.PasswordHashingBusy as error:
+		return JsonResponse({"error": str(error)}, status=503)
 	except Exception as error:
 		return JsonResponse({"error": str(error)}, status=500)
 
 
 @csrf_exempt
+@admission.admit("auth")
 def login(request):
 	if request.method != "POST":
 		return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -321,30 +163,27 @@ def login(request):
 		if not email or not password:
 			return JsonResponse({"error": "Email and password are required"}, status=400)
 
-		_ensure_default_user()
+		row = _login_password_hash(email)
+		if not row or not row[2]:
+			return JsonResponse({"error": "Invalid credentials"}, status=401)
 
-		try:
-			user = UserCredential.objects.get(email=email)
-			if not check_password(password, user.password_hash):
-				return JsonResponse({"error": "Invalid credentials"}, status=401)
-			return JsonResponse({"ok": True})
-		except UserCredential.DoesNotExist:
-			pass
-
-		django_user = User.objects.filter(username__iexact=email).first()
-		if not django_user and "@" in email:
-			django_user = User.objects.filter(email__iexact=email).first()
-
-		if not django_user or not django_user.check_password(password):
+		source, pk, password_hash = row
+		valid, new_hash = passwords.verify_password(password, password_hash)
+		if not valid:
 			return JsonResponse({"error": "Invalid credentials"}, status=401)
+		if new_hash:
+			_store_rehashed_password(source, pk, new_hash)
 
-		return JsonResponse({"ok": True})
+		return JsonResponse({"ok": True, "token": auth_tokens.issue_token(email)})
 
+	except passwords.PasswordHashingBusy as error:
+		return JsonResponse({"error": str(error)}, status=503)
 	except Exception as error:
 		return JsonResponse({"error": str(error)}, status=500)
 
 
 @csrf_exempt
+@admission.admit("auth")
 def google_auth(request):
 	"""Handle Google OAuth authentication"""
 	if request.method != "POST":
@@ -370,7 +209,7 @@ def google_auth(request):
 		# Handle authorization code flow
 		if code:
 			# Exchange code for tokens
-			token_url = "https://oauth2.googleapis.com/token"
+			token_url = GOOGLE_TOKEN_URL
 			token_data = {
 				"code": code,
 				"client_id": client_id,
@@ -379,29 +218,36 @@ def google_auth(request):
 				"grant_type": "authorization_code"
 			}
 			
-			token_data_encoded = urllib.parse.urlencode(token_data).encode('utf-8')
-			token_req = urllib.request.Request(token_url, data=token_data_encoded, method='POST')
-			
 			try:
-				with urllib.request.urlopen(token_req) as token_response:
-					token_result = json.loads(token_response.read().decode("utf-8"))
-					token = token_result.get("id_token")
-					if not token:
-						return JsonResponse({"error": "Failed to get ID token from authorization code"}, status=400)
-			except urllib.error.HTTPError as e:
-				error_body = e.read().decode('utf-8')
-				print(f"Token exchange error: {error_body}")
+				token_response = upstream.request_sync("google_oauth", "POST", token_url, data=token_data)
+				token = token_response.json().get("id_token")
+				if not token:
+					return JsonResponse({"error": "Failed to get ID token from authorization code"}, status=400)
+			except httpx.HTTPStatusError as e:
+				if e.response.status_code in upstream.RETRY_STATUSES:
+					raise
+				logger.warning("Token exchange error: %s", e.response.text)
 				return JsonResponse({"error": "Failed to exchange authorization code"}, status=401)
 
-		# Verify token with Google
-		verification_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={token}"
-		req = urllib.request.Request(verification_url)
-		
-		try:
-			with urllib.request.urlopen(req) as response:
-				user_info = json.loads(response.read().decode("utf-8"))
-		except urllib.error.HTTPError as e:
-			return JsonResponse({"error": "Invalid Google token"}, status=401)
+		# Verify the token's signature and claims locally against Google's cached
+		# public keys; the tokeninfo round-trip is kept as an opt-in fallback.
+		if settings.GOOGLE_TOKEN_VERIFICATION == "tokeninfo":
+			try:
+				response = upstream.request_sync(
+					"google_oauth", "GET", GOOGLE_TOKENINFO_URL, params={"id_token": token}
+				)
+				user_info = response.json()
+			except httpx.HTTPStatusError as e:
+				if e.response.status_code in upstream.RETRY_STATUSES:
+					raise
+				return JsonResponse({"error": "Invalid Google token"}, status=401)
+		else:
+			try:
+				user_info = google_tokens.verify_id_token(
+					token, client_id, google_tokens.get_key_source()
+				)
+			except google_tokens.TokenError as e:
+				return JsonResponse({"error": str(e)}, status=401)
 
 		# Verify the token's audience matches our client ID
 		if user_info.get("aud") != client_id:
@@ -415,7 +261,8 @@ def google_auth(request):
 		family_name = user_info.get("family_name", "")
 		profile_picture = user_info.get("picture", "")
 		locale = user_info.get("locale", "en")
-		email_verified = user_info.get("email_verified", False)
+		# tokeninfo reports booleans as strings
+		email_verified = user_info.get("email_verified", False) in (True, "true")
 
 		if not google_id or not email:
 			return JsonResponse({"error": "Invalid user information from Google"}, status=400)
@@ -450,6 +297,7 @@ def google_auth(request):
 
 		return JsonResponse({
 			"ok": True,
+			"token": auth_tokens.issue_token(user.email),
 			"user": {
 				"email": user.email,
 				"name": user.full_name or email.split("@")[0],
@@ -461,6 +309,10 @@ def google_auth(request):
 			}
 		})
 
+	except upstream.CircuitOpen:
+		return JsonResponse({"error": "Google sign-in is temporarily unavailable"}, status=503)
+	except httpx.HTTPError:
+		return JsonResponse({"error": "Google sign-in is temporarily unavailable"}, status=503)
 	except Exception as error:
 		return JsonResponse({"error": str(error)}, status=500)
 
@@ -482,231 +334,573 @@ def get_google_client_id(request):
 
 
 @csrf_exempt
-def chat(request):
+def ready(request):
+	"""Readiness probe: 503 until startup model preloading has finished."""
+	if request.method != "GET":
+		return JsonResponse({"error": "Method not allowed"}, status=405)
+
+	is_ready, details = readiness()
+	if not getattr(settings, "MLAPI_INFERENCE_SOCKET", ""):
+		# Per-model load state, including failed loads waiting out their backoff.
+		details["health"] = get_registry().health()
+	return JsonResponse({"ready": is_ready, **details}, status=200 if is_ready else 503)
+
+
+@csrf_exempt
+def metrics_view(request):
+	"""Prometheus text exposition of this worker's request, span and cache metrics."""
+	if request.method != "GET":
+		return JsonResponse({"error": "Method not allowed"}, status=405)
+
+	return HttpResponse(
+		metrics.get_metrics().render(),
+		content_type="text/plain; version=0.0.4; charset=utf-8",
+	)
+
+
+def _build_chat_request(payload, digest="", history_limit=12):
+	"""Turn a chat payload into a Gemini request body, or ``(None, error_response)``.
+
+	``digest`` (see :func:`conversations.fold_into_digest`) is sent as extra
+	system context for turns no longer in ``messages``.
+	"""
+	message = str(payload.get("message", "")).strip()
+	messages = payload.get("messages", [])
+	client_cache = payload.get("client_cache") or {}
+	language = payload.get("language", "en")  # Get selected language
+
+	if not message and not isinstance(messages, list):
+		return None, JsonResponse({"error": "Message is required"}, status=400)
+
+	contents = []
+	if isinstance(messages, list) and messages:
+		for item in messages[-history_limit:] if history_limit else messages:
+			role = "user" if str(item.get("role", "")).lower() == "user" else "model"
+			text = str(item.get("content", "")).strip()
+			if text:
+				contents.append({"role": role, "parts": [{"text": text}]})
+
+	if not contents and message:
+		contents = [{"role": "user", "parts": [{"text": message}]}]
+
+	if not contents:
+		return None, JsonResponse({"error": "Message is required"}, status=400)
+
+	cache_parts = []
+	if isinstance(client_cache, dict):
+		for key in ("local_math", "cached_match", "followup_suggestion", "last_user_message"):
+			value = client_cache.get(key)
+			if value:
+				cache_parts.append(f"{key}: {value}")
+
+	# Build system instruction with language requirement
+	language_name = LANGUAGE_NAMES.get(language, 'English')
+	language_instruction = f"IMPORTANT: Always respond in {language_name} language."
+
+	system_parts = [SYSTEM_PROMPT, language_instruction]
+	if digest:
+		system_parts.append("Earlier in this conversation (first sentence of each turn):\n" + digest)
+	if cache_parts:
+		system_parts.append("Client cache hints:\n" + "\n".join(cache_parts))
+
+	request_body = {
+		"systemInstruction": {"parts": [{"text": text} for text in system_parts]},
+		"contents": contents,
+		"generationConfig": {
+			"temperature": 0.7,
+			"maxOutputTokens": 1000,
+		},
+	}
+	return request_body, None
+
+
+def _extract_ai_text(data):
+	return (
+		data.get("candidates", [{}])[0]
+		.get("content", {})
+		.get("parts", [{}])[0]
+		.get("text", "")
+	)
+
+
+def _sse_event(data, event=None):
+	prefix = f"event: {event}\n" if event else ""
+	return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _stream_chat(api_key, request_body, on_complete=None, fallback_text=None):
+	"""Relay Gemini's streamed chunks to the client as Server-Sent Events.
+
+	``on_complete`` is awaited with the full reply once the stream finishes.
+	While Gemini's circuit breaker is open, ``fallback_text`` is sent instead.
+	"""
+	url = f"{GEMINI_STREAM_URL}?alt=sse&key={api_key}"
+	chunks = []
+	try:
+		async for line in upstream.stream_lines(url, request_body):
+			if not line.startswith("data:"):
+				continue
+			try:
+				chunk = json.loads(line[5:].strip())
+			except ValueError:
+				continue
+
+			text = _extract_ai_text(chunk)
+			if text:
+				chunks.append(text)
+				yield _sse_event({"text": text})
+
+		if not chunks:
+			yield _sse_event({"error": "Empty response from AI service"}, event="error")
+			return
+		if on_complete is not None:
+			await on_complete("".join(chunks))
+		yield _sse_event({}, event="done")
+
+	except upstream.CircuitOpen:
+		metrics.inc("mlapi_chat_fallbacks_total", help="Chat replies answered from canned text.")
+		yield _sse_event({"text": fallback_text or "", "fallback": True})
+		yield _sse_event({}, event="done")
+	except httpx.HTTPStatusError as error:
+		yield _sse_event(
+			{
+				"error": f"Upstream API error: {error.response.status_code}",
+				"details": error.response.text,
+			},
+			event="error",
+		)
+	except httpx.TimeoutException:
+		yield _sse_event({"error": "Upstream API timed out"}, event="error")
+	except Exception as error:
+		yield _sse_event({"error": str(error)}, event="error")
+
+
+async def _replay_stream(text):
+	yield _sse_event({"text": text, "cached": True})
+	yield _sse_event({}, event="done")
+
+
+def _sse_response(events):
+	response = StreamingHttpResponse(events, content_type="text/event-stream")
+	response["Cache-Control"] = "no-cache"
+	response["X-Accel-Buffering"] = "no"
+	return response
+
+
+def _wants_stream(request, payload):
+	if payload.get("stream") is True or request.GET.get("stream") in ("1", "true"):
+		return True
+	return "text/event-stream" in request.headers.get("Accept", "")
+
+
+@csrf_exempt
+@admission.admit("chat", controller="chat")
+async def chat(request):
 	if request.method != "POST":
 		return JsonResponse({"error": "Method not allowed"}, status=405)
 
-	fallback_prompt = ""
 	try:
 		payload = json.loads(request.body.decode("utf-8") or "{}")
-		message = str(payload.get("message", "")).strip()
-		messages = payload.get("messages", [])
-		client_cache = payload.get("client_cache") or {}
-		language = payload.get("language", "en")  # Get selected language
-		
-		if not message and not isinstance(messages, list):
-			return JsonResponse({"error": "Message is required"}, status=400)
-
-		fallback_prompt = message
-		if not fallback_prompt and isinstance(messages, list) and messages:
-			last_user = next(
-				(item for item in reversed(messages) if str(item.get("role", "")).lower() == "user"),
-				None,
-			)
-			fallback_prompt = str(last_user.get("content", "")).strip() if last_user else ""
 
 		api_key = _get_api_key()
 		if not api_key:
 			return JsonResponse({"error": "Missing GEMINI_API_KEY"}, status=503)
 
-		contents = []
-		if isinstance(messages, list) and messages:
-			for item in messages[-12:]:
-				role = "user" if str(item.get("role", "")).lower() == "user" else "model"
-				text = str(item.get("content", "")).strip()
-				if text:
-					contents.append({"role": role, "parts": [{"text": text}]})
-
-		if not contents and message:
-			contents = [{"role": "user", "parts": [{"text": message}]}]
-
-		if not contents:
-			return JsonResponse({"error": "Message is required"}, status=400)
-
-		cache_parts = []
-		if isinstance(client_cache, dict):
-			for key in ("local_math", "cached_match", "followup_suggestion", "last_user_message"):
-				value = client_cache.get(key)
-				if value:
-					cache_parts.append(f"{key}: {value}")
-
-		# Build system instruction with language requirement
-		language_name = LANGUAGE_NAMES.get(language, 'English')
-		language_instruction = f"IMPORTANT: Always respond in {language_name} language."
-		
-		system_parts = [SYSTEM_PROMPT, language_instruction]
-		if cache_parts:
-			system_parts.append("Client cache hints:\n" + "\n".join(cache_parts))
-
-		request_body = {
-			"systemInstruction": {"parts": [{"text": text} for text in system_parts]},
-			"contents": contents,
-			"generationConfig": {
-				"temperature": 0.7,
-				"maxOutputTokens": 1000,
-			},
-		}
-
-		url = f"{GEMINI_URL}?key={api_key}"
-		req = urllib.request.Request(
-			url,
-			data=json.dumps(request_body).encode("utf-8"),
-			headers={"Content-Type": "application/json"},
-			method="POST",
+		# With a server-side conversation the client sends only the new message;
+		# history comes from the database as a token-budgeted window plus a
+		# digest of older turns. Conversations belong to the bearer token's user.
+		conversation = None
+		digest = ""
+		message = str(payload.get("message", "")).strip()
+		if payload.get("conversation_id") or payload.get("conversation") is True:
+			if not message:
+				return JsonResponse({"error": "Message is required"}, status=400)
+			# A client starting a server-side conversation mid-chat seeds it with
+			# its local history, minus the message being sent now.
+			seed = payload.get("messages") if isinstance(payload.get("messages"), list) else []
+			if seed and str(seed[-1].get("content", "")).strip() == message:
+				seed = seed[:-1]
+			try:
+				conversation = await sync_to_async(conversations.get_or_create_conversation)(
+					payload.get("conversation_id"),
+					auth_tokens.authenticated_email(request),
+					seed_messages=seed,
+				)
+			except (Conversation.DoesNotExist, ValidationError, ValueError):
+				return JsonResponse({"error": "Conversation not found"}, status=404)
+
+			window, digest = await sync_to_async(conversations.build_context)(conversation, message)
+			payload = {**payload, "message": "", "messages": window}
+
+		request_body, error_response = _build_chat_request(
+			payload,
+			digest=digest,
+			history_limit=None if conversation is not None else 12,
+		)
+		if error_response is not None:
+			return error_response
+
+		stream = _wants_stream(request, payload)
+		chat_cache = get_chat_cache()
+		# Key on the exact system instruction sent upstream (language, digest
+		# and client cache hints included), so differing prompts never share.
+		cache_args = (
+			"\n\n".join(part["text"] for part in request_body["systemInstruction"]["parts"]),
+			LANGUAGE_NAMES.get(payload.get("language", "en"), "English"),
+			request_body["contents"],
 		)
+		extra = {"conversation_id": str(conversation.pk)} if conversation is not None else {}
+		fallback_text = _fallback_response(request_body["contents"][-1]["parts"][0]["text"])
+
+		def with_conversation(response):
+			if conversation is not None:
+				response["X-Conversation-Id"] = str(conversation.pk)
+			return response
+
+		async def remember(text):
+			if chat_cache is not None:
+				await sync_to_async(chat_cache.set)(*cache_args, text)
+			if conversation is not None:
+				await sync_to_async(conversations.record_exchange)(conversation, message, text)
+
+		if chat_cache is not None:
+			cached_text = await sync_to_async(chat_cache.get)(*cache_args)
+			if cached_text:
+				if conversation is not None:
+					await sync_to_async(conversations.record_exchange)(conversation, message, cached_text)
+				if stream:
+					return with_conversation(_sse_response(_replay_stream(cached_text)))
+				return with_conversation(JsonResponse({"text": cached_text, "cached": True, **extra}))
+
+		if stream:
+			return with_conversation(
+				_sse_response(_stream_chat(
+					api_key,
+					request_body,
+					on_complete=remember,
+					fallback_text=fallback_text,
+				))
+			)
 
-		with urllib.request.urlopen(req) as response:
-			data = json.loads(response.read().decode("utf-8"))
+		async def generate():
+			response = await upstream.post_json(f"{GEMINI_URL}?key={api_key}", request_body)
+			return _extract_ai_text(response.json())
 
-		ai_text = (
-			data.get("candidates", [{}])[0]
-			.get("content", {})
-			.get("parts", [{}])[0]
-			.get("text", "")
-		)
+		# Identical concurrent prompts share a single upstream call. While the
+		# circuit breaker is open, answer from the canned replies immediately.
+		try:
+			ai_text = await get_single_flight("chat").ado(conversation_key(*cache_args), generate)
+		except upstream.CircuitOpen:
+			metrics.inc("mlapi_chat_fallbacks_total", help="Chat replies answered from canned text.")
+			return with_conversation(JsonResponse({"text": fallback_text, "fallback": True, **extra}))
 
 		if not ai_text:
 			return JsonResponse({"error": "Empty response from AI service"}, status=502)
 
-		return JsonResponse({"text": ai_text})
+		await remember(ai_text)
+		return with_conversation(JsonResponse({"text": ai_text, **extra}))
 
-	except urllib.error.HTTPError as error:
-		error_body = error.read().decode("utf-8") if error.fp else ""
+	except httpx.HTTPStatusError as error:
 		return JsonResponse(
 			{
-				"error": f"Upstream API error: {error.code}",
-				"details": error_body,
+				"error": f"Upstream API error: {error.response.status_code}",
+				"details": error.response.text,
 			},
 			status=502,
 		)
+	except httpx.TimeoutException:
+		return JsonResponse({"error": "Upstream API timed out"}, status=504)
+	except upstream.UpstreamBusy as error:
+		return JsonResponse({"error": str(error)}, status=503)
 	except Exception as error:
 		return JsonResponse({"error": str(error)}, status=500)
 
 
+def _dumps(payload):
+	if orjson is not None:
+		return orjson.dumps(payload)
+	return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _json_response(payload, status=200):
+	return HttpResponse(_dumps(payload), content_type="application/json", status=status)
+
+
+def _prediction_options(request):
+	"""Parse ``?format=full|topk|compact&top_k=N``; returns ``((format, top_k), error)``."""
+	prediction_format = request.GET.get("format", "").strip().lower()
+	top_k = request.GET.get("top_k", "").strip()
+	if top_k:
+		try:
+			top_k = int(top_k)
+		except ValueError:
+			top_k = 0
+		if top_k < 1:
+			return None, JsonResponse({"error": "top_k must be a positive integer"}, status=400)
+	else:
+		top_k = None
+
+	if not prediction_format:
+		prediction_format = "topk" if top_k else "full"
+	if prediction_format not in predictions.PREDICTION_FORMATS:
+		return None, JsonResponse(
+			{"error": f"format must be one of: {', '.join(predictions.PREDICTION_FORMATS)}"}, status=400
+		)
+	if prediction_format == "topk" and top_k is None:
+		top_k = getattr(settings, "MLAPI_DEFAULT_TOP_K", 5)
+	return (prediction_format, top_k), None
+
+
+def _unavailable_response(spec, error):
+	"""503 with a ``Retry-After`` hint, used instead of a fallback in strict mode."""
+	retry_after = predictions.retry_after(error)
+	response = JsonResponse(
+		{
+			"error": f"Model '{spec.name}' is unavailable",
+			"details": f"{type(error).__name__}: {error}",
+			"retry_after": retry_after,
+		},
+		status=503,
+	)
+	response["Retry-After"] = str(retry_after)
+	return response
+
+
 @csrf_exempt
-def predict_flower(request):
+@admission.admit("predict", controller="inference")
+def predict(request, model_name):
 	if request.method != "POST":
 		return JsonResponse({"error": "Method not allowed"}, status=405)
 
+	spec = get_registry().spec(model_name)
+	if spec is None:
+		return JsonResponse({"error": f"Unknown model '{model_name}'"}, status=404)
+
+	# Reject by headers before any of the body is read, then receive the image
+	# into one hashed in-memory buffer.
+	if request.content_type != "multipart/form-data":
+		return JsonResponse({"error": "Expected a multipart/form-data image upload"}, status=415)
+	max_bytes = getattr(settings, "MLAPI_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+	# Leave room for the multipart framing around the one image.
+	error_response = use_image_upload_handler(request, max_bytes, max_total_bytes=max_bytes + 65536)
+	if error_response is None:
+		error_response = upload_error(request)
+	if error_response is not None:
+		return error_response
+
 	file_obj = request.FILES.get("file")
 	if not file_obj:
 		return JsonResponse({"error": "Image file is required"}, status=400)
 
+	options, error_response = _prediction_options(request)
+	if error_response is not None:
+		return error_response
+
+	cache = get_prediction_cache()
+	cache_key = None
+	if cache is not None:
+		cache_key = prediction_cache_key(spec, file_obj)
+		cached = cache.get(cache_key)
+		if cached is not None:
+			return _json_response(predictions.format_prediction(spec, cached, *options))
+
+	def model_failed(error):
+		if not getattr(settings, "MLAPI_FALLBACK_PREDICTIONS", True):
+			return _unavailable_response(spec, error)
+		payload = predictions.fallback_payload(spec, file_obj, error)
+		return _json_response(predictions.format_prediction(spec, payload, *options))
+
 	try:
-		import numpy as np
-		from PIL import Image
+		size = inference.model_input_size(model_name)
+	except Exception as error:
+		return model_failed(error)
 
-		model, (width, height) = _load_flower_model()
-		image = Image.open(file_obj).convert("RGB").resize((width, height))
-		array = np.asarray(image, dtype=np.float32) / 255.0
-		input_batch = np.expand_dims(array, axis=0)
+	# A bad upload is the client's problem, not a model outage: answer 400
+	# rather than a fallback label or a 503 inviting a pointless retry.
+	try:
+		array = preprocess_upload(file_obj, size, spec)
+	except TimeoutError:
+		response = JsonResponse({"error": "Image decoding is busy, try again shortly", "retry_after": 1}, status=503)
+		response["Retry-After"] = "1"
+		return response
+	except Exception as error:
+		return JsonResponse({"error": f"Could not decode image: {error}"}, status=400)
 
-		model_inputs = getattr(model, "inputs", None)
-		if isinstance(model_inputs, (list, tuple)) and len(model_inputs) > 1:
-			model_payload = [input_batch for _ in range(len(model_inputs))]
-		else:
-			model_payload = input_batch
+	def run_model():
+		return predictions.prediction_payload(inference.predict(model_name, array))
 
-		preds = model.predict(model_payload)
-		if isinstance(preds, (list, tuple)):
-			preds = preds[0]
-		preds = np.asarray(preds).reshape(-1)
+	try:
+		# Concurrent uploads of the same image share one model call.
+		flight_key = cache_key or prediction_cache_key(spec, file_obj)
+		payload = get_single_flight("predict").do(flight_key, run_model)
+	except Exception as error:
+		return model_failed(error)
 
-		if preds.size == 0:
-			raise RuntimeError("Model returned no predictions")
+	if cache is not None:
+		cache.set(cache_key, payload)
+	return _json_response(predictions.format_prediction(spec, payload, *options))
 
-		index = int(np.argmax(preds))
-		confidence = float(np.max(preds))
-		label = CLASS_NAMES[index] if index < len(CLASS_NAMES) else str(index)
 
-		probabilities = {
-			name: float(preds[i]) if i < preds.size else 0.0
-			for i, name in enumerate(CLASS_NAMES)
-		}
+@csrf_exempt
+def model_classes(request, model_name):
+	"""Class names in score order, for ``format=compact`` prediction responses."""
+	if request.method != "GET":
+		return JsonResponse({"error": "Method not allowed"}, status=405)
 
-		return JsonResponse(
-			{
-				"label": label,
-				"confidence": confidence,
-				"probabilities": probabilities,
-			}
-		)
-	except (FileNotFoundError, ImportError, Exception):
-		label, confidence, probabilities = _fallback_flower_prediction(file_obj)
-		return JsonResponse(
-			{
-				"label": label,
-				"confidence": confidence,
-				"probabilities": probabilities,
-			}
-		)
+	spec = get_registry().spec(model_name)
+	if spec is None:
+		return JsonResponse({"error": f"Unknown model '{model_name}'"}, status=404)
+
+	names = predictions.build_class_names(spec.class_names, spec.fallback_count())
+	version = predictions.classes_version(names)
+	etag = f'"{version}"'
+	if request.headers.get("If-None-Match") == etag:
+		response = HttpResponse(status=304)
+	else:
+		response = JsonResponse({"model": spec.name, "classes_version": version, "classes": names})
+	response["ETag"] = etag
+	response["Cache-Control"] = "public, max-age=3600"
+	return response
 
 
 @csrf_exempt
-def predict_animal(request):
+@admission.admit("batch", controller="inference", priority=admission.BULK)
+def predict_batch(request, model_name):
+	"""Classify many images in one request, streaming NDJSON results per chunk."""
 	if request.method != "POST":
 		return JsonResponse({"error": "Method not allowed"}, status=405)
 
-	file_obj = request.FILES.get("file")
-	if not file_obj:
-		return JsonResponse({"error": "Image file is required"}, status=400)
+	spec = get_registry().spec(model_name)
+	if spec is None:
+		return JsonResponse({"error": f"Unknown model '{model_name}'"}, status=404)
+
+	max_files = getattr(settings, "MLAPI_BATCH_MAX_FILES", 100)
+	max_file_bytes = getattr(settings, "MLAPI_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+	max_total_bytes = getattr(settings, "MLAPI_BATCH_MAX_BYTES", 200 * 1024 * 1024)
+	if request.content_type == "multipart/form-data":
+		error_response = use_image_upload_handler(
+			request, max_file_bytes, max_total_bytes=max_total_bytes, allow_archives=True
+		)
+		if error_response is None:
+			error_response = upload_error(request)
+		if error_response is not None:
+			return error_response
 
 	try:
-		import numpy as np
-		from PIL import Image
+		uploads = []
+		for upload in iter_batch_uploads(request, max_file_bytes, max_total_bytes):
+			uploads.append(upload)
+			if len(uploads) > max_files:
+				return JsonResponse(
+					{"error": f"At most {max_files} images per batch"}, status=413
+				)
+	except UploadTooLarge as error:
+		return JsonResponse({"error": str(error)}, status=413)
+	except Exception as error:
+		return JsonResponse({"error": f"Could not read upload: {error}"}, status=400)
 
-		model, (width, height) = _load_animal_model()
-		image = Image.open(file_obj).convert("RGB").resize((width, height))
-		array = np.asarray(image, dtype=np.float32) / 255.0
-		input_batch = np.expand_dims(array, axis=0)
+	if not uploads:
+		return JsonResponse({"error": "At least one image file is required"}, status=400)
 
-		model_inputs = getattr(model, "inputs", None)
-		if isinstance(model_inputs, (list, tuple)) and len(model_inputs) > 1:
-			model_payload = [input_batch for _ in range(len(model_inputs))]
-		else:
-			model_payload = input_batch
+	options, error_response = _prediction_options(request)
+	if error_response is not None:
+		return error_response
 
-		preds = model.predict(model_payload)
-		if isinstance(preds, (list, tuple)):
-			preds = preds[0]
-		preds = np.asarray(preds).reshape(-1)
+	fallback = getattr(settings, "MLAPI_FALLBACK_PREDICTIONS", True)
+	try:
+		size = inference.model_input_size(model_name)
+		size_error = None
+	except Exception as error:
+		if not fallback:
+			return _unavailable_response(spec, error)
+		size, size_error = None, error
 
-		if preds.size == 0:
-			raise RuntimeError("Model returned no predictions")
+	def results():
+		for index, result in predictions.classify_uploads(spec, uploads, size, size_error):
+			payload = result if "error" in result else predictions.format_prediction(spec, result, *options)
+			yield _dumps({"index": index, "name": uploads[index][0], **payload}) + b"\n"
 
-		resolved_names = _build_class_names(ANIMAL_CLASS_NAMES, preds.size)
-		index = int(np.argmax(preds))
-		confidence = float(np.max(preds))
-		label = (
-			resolved_names[index] if index < len(resolved_names) else str(index)
-		)
+	return StreamingHttpResponse(results(), content_type="application/x-ndjson")
 
-		probabilities = {
-			name: float(preds[i]) if i < preds.size else 0.0
-			for i, name in enumerate(resolved_names)
-		}
 
-		return JsonResponse(
-			{
-				"label": label,
-				"confidence": confidence,
-				"probabilities": probabilities,
-			}
-		)
-	except (FileNotFoundError, ImportError, Exception):
-		label, confidence, probabilities = _fallback_prediction(
-			file_obj, ANIMAL_CLASS_NAMES, default_count=5
-		)
-		return JsonResponse(
-			{
-				"label": label,
-				"confidence": confidence,
-				"probabilities": probabilities,
-			}
+@csrf_exempt
+@admission.admit("jobs")
+def create_job(request):
+	"""Queue images for the job worker; answers 202 with the job id right away.
+
+	Takes the same uploads as ``predict/batch/`` plus ``model`` and an optional
+	``callback_url`` (query or form fields) and the usual ``format``/``top_k``.
+	"""
+	if request.method != "POST":
+		return JsonResponse({"error": "Method not allowed"}, status=405)
+
+	model_name = request.GET.get("model", "")
+	if model_name and get_registry().spec(model_name) is None:
+		return JsonResponse({"error": f"Unknown model '{model_name}'"}, status=404)
+
+	options, error_response = _prediction_options(request)
+	if error_response is not None:
+		return error_response
+
+	max_files = getattr(settings, "MLAPI_JOB_MAX_FILES", 1000)
+	max_file_bytes = getattr(settings, "MLAPI_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+	max_total_bytes = getattr(settings, "MLAPI_JOB_MAX_BYTES", 200 * 1024 * 1024)
+	if request.content_type == "multipart/form-data":
+		error_response = use_image_upload_handler(
+			request, max_file_bytes, max_total_bytes=max_total_bytes, allow_archives=True
 		)
-	
+		if error_response is None:
+			error_response = upload_error(request)
+		if error_response is not None:
+			return error_response
+		model_name = model_name or request.POST.get("model", "")
+
+	spec = get_registry().spec(model_name) if model_name else None
+	if spec is None:
+		message = f"Unknown model '{model_name}'" if model_name else "model is required"
+		return JsonResponse({"error": message}, status=404 if model_name else 400)
+
+	callback_url = (request.GET.get("callback_url") or request.POST.get("callback_url", "")).strip()
+	if callback_url:
+		problem = jobs.check_callback_url(callback_url)
+		if problem:
+			return JsonResponse({"error": problem}, status=400)
+
+	try:
+		uploads = []
+		for upload in iter_batch_uploads(request, max_file_bytes, max_total_bytes):
+			uploads.append(upload)
+			if len(uploads) > max_files:
+				return JsonResponse({"error": f"At most {max_files} images per job"}, status=413)
+	except UploadTooLarge as error:
+		return JsonResponse({"error": str(error)}, status=413)
+	except Exception as error:
+		return JsonResponse({"error": f"Could not read upload: {error}"}, status=400)
+
+	if not uploads:
+		return JsonResponse({"error": "At least one image file is required"}, status=400)
+
+	job = jobs.submit(spec, uploads, options, callback_url)
+	poll_url = request.build_absolute_uri(reverse("job_status", args=[job.id]))
+	response = JsonResponse(
+		{"id": str(job.id), "model": spec.name, "status": job.status, "images": len(uploads), "poll": poll_url},
+		status=202,
+	)
+	response["Location"] = poll_url
+	return response
+
+
+@csrf_exempt
+def job_status(request, job_id):
+	"""Poll a job; finished jobs include one result per image in upload order."""
+	if request.method != "GET":
+		return JsonResponse({"error": "Method not allowed"}, status=405)
 
+	job = PredictionJob.objects.filter(pk=job_id).first()
+	if job is None:
+		return JsonResponse({"error": "Job not found"}, status=404)
 
-	
-	
-	
+	response = _json_response(jobs.job_document(job))
+	if job.status in (PredictionJob.QUEUED, PredictionJob.RUNNING):
+		response["Retry-After"] = str(max(math.ceil(getattr(settings, "MLAPI_JOB_POLL_INTERVAL", 1.0)), 1))
+	return response
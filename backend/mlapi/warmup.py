@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+_STATE_LOCK = threading.Lock()
+_STATE = {
+	"started": False,
+	"ready": False,
+	"models": {},
+}
+
+
+def preload_models(warmup=True):
+	"""Load every registered model and optionally run a dummy batch through it.
+
+	Returns a dict of ``{name: {"ok", "load_seconds", "warmup_seconds", "error"}}``.
+	Once every model has been attempted the process reports ready, unless a
+	model failed and has not loaded since (see :func:`readiness`).
+	"""
+	import numpy as np
+
+	from .inference import predict_batch
+	from .registry import get_registry
+
+	with _STATE_LOCK:
+		_STATE["started"] = True
+		_STATE["ready"] = False
+
+	registry = get_registry()
+	report = {}
+	for name in registry.names():
+		entry = {"ok": False, "load_seconds": None, "warmup_seconds": None, "error": None}
+		try:
+			started = time.perf_counter()
+			model, (width, height) = registry.get(name)
+			entry["load_seconds"] = round(time.perf_counter() - started, 3)
+
+			if warmup:
+				started = time.perf_counter()
+				dummy = np.zeros((1, height, width, 3), dtype=np.float32)
+				predict_batch(model, dummy)
+				entry["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+			entry["ok"] = True
+			logger.info(
+				"Preloaded %s model in %.3fs (warm-up %s)",
+				name,
+				entry["load_seconds"],
+				f"{entry['warmup_seconds']:.3f}s" if warmup else "skipped",
+			)
+		except Exception as exc:
+			entry["error"] = str(exc)
+			logger.warning("Could not preload %s model: %s", name, exc)
+
+		report[name] = entry
+		with _STATE_LOCK:
+			_STATE["models"][name] = entry
+
+	with _STATE_LOCK:
+		_STATE["ready"] = True
+	return report
+
+
+def start_preload(background=True, warmup=True):
+	"""Kick off :func:`preload_models`, reporting not-ready until it finishes."""
+	with _STATE_LOCK:
+		if _STATE["started"]:
+			return
+		_STATE["started"] = True
+
+	if not background:
+		preload_models(warmup=warmup)
+		return
+
+	threading.Thread(
+		target=preload_models,
+		kwargs={"warmup": warmup},
+		name="mlapi-preload",
+		daemon=True,
+	).start()
+
+
+def preload_for_server():
+	"""Start preloading if ``MLAPI_PRELOAD_MODELS`` is set.
+
+	Called from the WSGI/ASGI entry points rather than ``AppConfig.ready()``,
+	so management commands such as ``migrate`` or ``shell`` never load models.
+	"""
+	from django.conf import settings
+
+	# With a shared inference process the models live there, not here.
+	if getattr(settings, "MLAPI_INFERENCE_SOCKET", ""):
+		return
+	if getattr(settings, "MLAPI_PRELOAD_MODELS", False):
+		start_preload(
+			background=getattr(settings, "MLAPI_PRELOAD_BACKGROUND", True),
+			warmup=getattr(settings, "MLAPI_PRELOAD_WARMUP", True),
+		)
+
+
+def readiness():
+	"""Return ``(is_ready, details)`` for the readiness endpoint.
+
+	Without preloading, models load lazily and the process is always ready.
+	With it, the process is not ready until preloading has finished, nor
+	while any model that failed to preload is still not loaded: such a
+	worker could only answer with fallbacks.
+	"""
+	from .registry import get_registry
+
+	with _STATE_LOCK:
+		if not _STATE["started"]:
+			return True, {"preload": False, "models": {}}
+		done = _STATE["ready"]
+		models = {name: dict(entry) for name, entry in _STATE["models"].items()}
+
+	registry = get_registry()
+	failed = sorted(
+		name for name, entry in models.items() if not entry["ok"] and not registry.is_loaded(name)
+	)
+	return done and not failed, {"preload": True, "models": models, "failed": failed}
@@ -1,5 +1,44 @@
 import { useState, useRef, useEffect } from 'react';
 
+// Stream replies token by token over Server-Sent Events (set VITE_CHAT_STREAMING=false to disable)
+const STREAM_CHAT = import.meta.env.VITE_CHAT_STREAMING !== 'false';
+
+// Parse a text/event-stream body, calling onEvent(eventName, data) for each event
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let eventName = 'message';
+      const dataLines = [];
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+      });
+      if (!dataLines.length) continue;
+
+      let data = null;
+      try {
+        data = JSON.parse(dataLines.join('\n'));
+      } catch (error) {
+        continue;
+      }
+      onEvent(eventName, data);
+    }
+  }
+};
+
 const ChatSidebar = () => {
   const [isOpen, setIsOpen] = useState(false);
   const [messages, setMessages] = useState(() => {
@@ -30,6 +69,18 @@ const ChatSidebar = () => {
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef(null);
   const lastMathResultRef = useRef(null);
+  // Server-side conversation id: once known, only the new message is sent
+  const conversationIdRef = useRef(sessionStorage.getItem('synexis.chat.conversation'));
+
+  const rememberConversation = (conversationId) => {
+    if (!conversationId || conversationIdRef.current === conversationId) return;
+    conversationIdRef.current = conversationId;
+    try {
+      sessionStorage.setItem('synexis.chat.conversation', conversationId);
+    } catch (error) {
+      // ignore storage errors
+    }
+  };
 
   const formatMathResult = (value) => {
     if (!Number.isFinite(value)) return null;
@@ -279,8 +330,9 @@ const ChatSidebar = () => {
     }
   }, [messages]);
 
-  // Call backend chat endpoint (backend uses same URL + API key)
-  const getAIResponse = async (userMessage, conversation, clientCache) => {
+  // Call backend chat endpoint (backend uses same URL + API key).
+  // When streaming, onToken receives each text chunk as it arrives.
+  const getAIResponse = async (userMessage, conversation, clientCache, onToken) => {
     let response;
     
     // Get selected language from localStorage
@@ -291,21 +343,63 @@ const ChatSidebar = () => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(STREAM_CHAT ? { Accept: 'text/event-stream' } : {}),
+          // Server-side conversations belong to the signed-in user's token.
+          ...(sessionStorage.getItem('authToken')
+            ? { Authorization: `Bearer ${sessionStorage.getItem('authToken')}` }
+            : {}),
         },
         body: JSON.stringify({
           message: userMessage,
-          messages: conversation.map((item) => ({
-            role: item.role,
-            content: item.content,
-          })),
+          conversation: true,
+          conversation_id: conversationIdRef.current || undefined,
+          // History is only sent to seed a new server-side conversation
+          messages: conversationIdRef.current
+            ? undefined
+            : conversation.map((item) => ({
+              role: item.role,
+              content: item.content,
+            })),
           client_cache: clientCache || null,
           language: selectedLanguage,
+          stream: STREAM_CHAT,
         }),
       });
     } catch (error) {
       throw new Error('Network error: Unable to reach the server.');
     }
 
+    if (response.status === 404 && conversationIdRef.current) {
+      // Conversation expired on the server: start a fresh one from local history
+      conversationIdRef.current = null;
+      sessionStorage.removeItem('synexis.chat.conversation');
+      return getAIResponse(userMessage, conversation, clientCache, onToken);
+    }
+    rememberConversation(response.headers.get('X-Conversation-Id'));
+
+    const contentType = response.headers.get('Content-Type') || '';
+    if (response.ok && contentType.includes('text/event-stream')) {
+      let text = '';
+      let streamError = null;
+      await readEventStream(response, (eventName, data) => {
+        if (eventName === 'error') {
+          const details = data?.details ? ` ${data.details}` : '';
+          streamError = `${data?.error || 'Streaming error'}${details}`.trim();
+        } else if (data?.text) {
+          text += data.text;
+          onToken?.(text);
+        }
+      });
+
+      if (streamError) {
+        throw new Error(streamError);
+      }
+      if (!text) {
+        throw new Error('Empty response from server.');
+      }
+      return text;
+    }
+
     let data = null;
     try {
       data = await response.json();
@@ -357,18 +451,24 @@ const ChatSidebar = () => {
         last_user_message: lastUserMessage || null,
       };
 
-      const aiResponse = await getAIResponse(messageText, nextMessages, clientCache);
-      
-      const assistantMessage = {
-        role: 'model',
-        content: aiResponse,
-        timestamp: new Date()
+      const streamId = `stream-${Date.now()}`;
+
+      // Insert the reply on the first chunk, then update it in place
+      const showReply = (text) => {
+        setMessages(prev => (
+          prev.some((item) => item.streamId === streamId)
+            ? prev.map((item) => (item.streamId === streamId ? { ...item, content: text } : item))
+            : [...prev, { role: 'model', content: text, timestamp: new Date(), streamId }]
+        ));
       };
+
+      const aiResponse = await getAIResponse(messageText, nextMessages, clientCache, showReply);
+      
       const possibleNumber = Number(aiResponse);
       if (!Number.isNaN(possibleNumber)) {
         lastMathResultRef.current = possibleNumber;
       }
-      setMessages(prev => [...prev, assistantMessage]);
+      showReply(aiResponse);
     } catch (error) {
       console.error('Error:', error);
       const errorMessage = {
@@ -395,6 +495,8 @@ const ChatSidebar = () => {
 
   const clearChat = () => {
     lastMathResultRef.current = null;
+    conversationIdRef.current = null;
+    sessionStorage.removeItem('synexis.chat.conversation');
     setMessages([{
       role: 'model',
       content: 'Hello! I\'m Gojo. Ask me anything about your Synexis ML projects.',
@@ -85,6 +85,9 @@ const Login = () => {
 
       const data = await result.json();
       sessionStorage.setItem('isAuthenticated', 'true');
+      if (data?.token) {
+        sessionStorage.setItem('authToken', data.token);
+      }
       if (data?.user) {
         sessionStorage.setItem('userEmail', data.user.email);
         sessionStorage.setItem('userName', data.user.name);
@@ -178,6 +181,9 @@ const Login = () => {
 
               const data = await result.json();
               sessionStorage.setItem('isAuthenticated', 'true');
+              if (data?.token) {
+                sessionStorage.setItem('authToken', data.token);
+              }
               if (data?.user) {
                 sessionStorage.setItem('userEmail', data.user.email);
                 sessionStorage.setItem('userName', data.user.name);
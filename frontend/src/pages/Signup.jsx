@@ -69,6 +69,9 @@ const Signup = () => {
 
       const data = await result.json();
       sessionStorage.setItem('isAuthenticated', 'true');
+      if (data?.token) {
+        sessionStorage.setItem('authToken', data.token);
+      }
       if (data?.user) {
         sessionStorage.setItem('userEmail', data.user.email);
         sessionStorage.setItem('userName', data.user.name);